@@ -0,0 +1,144 @@
+'''Actualización incremental del catálogo de SCIMAGO.
+
+Cada revista obtenida por el scrapper queda sellada con el momento en que se obtuvo y un hash
+de su registro, en un archivo junto al catálogo (revistas_scimago_final.sellos.json). Con
+--refrescar los scrappers procesan primero los títulos nuevos de revistas.json y después las
+revistas del catálogo de la más antigua a la más reciente, hasta agotar un presupuesto de
+peticiones o de tiempo; la siguiente ejecución sigue por donde quedó. Al compactar la bitácora
+solo se reescriben las revistas cuyo registro cambió.'''
+import hashlib
+import json
+import os
+import threading
+import time
+import leer_csv
+
+EXTENSION_SELLOS = ".sellos.json"
+
+def ruta_sellos(catalogo):
+    """Archivo de sellos de un catálogo (revistas_scimago_final.json -> revistas_scimago_final.sellos.json)"""
+    return os.path.splitext(catalogo)[0] + EXTENSION_SELLOS
+
+def hash_registro(registro):
+    """SHA-256 del registro serializado con las claves en orden (no depende del orden de los campos)"""
+    contenido = json.dumps(registro, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+def cargar_sellos(ruta):
+    """
+    Lee los sellos de las revistas.
+
+    Returns:
+        dict: {titulo: {"obtenido": marca de tiempo, "hash": hash_registro}}; vacío si no existe o está dañado
+    """
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            sellos = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return sellos if isinstance(sellos, dict) else {}
+
+def guardar_sellos(sellos, ruta):
+    """Escribe los sellos de forma atómica"""
+    leer_csv.guardar_como_json(sellos, ruta, 'compacto')
+
+def sellar(sellos, titulo, registro, obtenido=None):
+    """
+    Registra que una revista se acaba de obtener.
+
+    Returns:
+        bool: True si el registro es distinto del sellado anteriormente (o no había sello)
+    """
+    nuevo = hash_registro(registro)
+    anterior = sellos.get(titulo, {}).get("hash")
+    sellos[titulo] = {"obtenido": obtenido or time.time(), "hash": nuevo}
+    return anterior != nuevo
+
+def planificar(titulos, catalogo, sellos, terminados=(), refrescar=False, incompleta=None):
+    """
+    Ordena los títulos a procesar en una ejecución.
+
+    Primero van los títulos que no están en el catálogo (y los incompletos, si se da incompleta),
+    en el orden de revistas.json. Con refrescar, después van las revistas del catálogo de la
+    obtenida hace más tiempo a la más reciente; las que nunca obtuvo el scrapper (p. ej. las
+    importadas con importar_scimago.py) no tienen sello y van primero.
+
+    Args:
+        titulos (iterable): Títulos de revistas.json
+        catalogo (Mapping): Catálogo {titulo: datos}
+        sellos (dict): Sellos de cargar_sellos
+        terminados (set): Títulos que ya están en la bitácora (se saltan)
+        refrescar (bool): Incluir las revistas que ya están en el catálogo
+        incompleta (callable): incompleta(datos) indica si un registro del catálogo hay que completarlo
+
+    Returns:
+        list: Títulos en el orden en que se procesan
+    """
+    nuevas, conocidas = [], []
+    for titulo in titulos:
+        if titulo in terminados:
+            continue
+        if titulo not in catalogo or incompleta is not None and incompleta(catalogo[titulo]):
+            nuevas.append(titulo)
+        elif refrescar:
+            conocidas.append(titulo)
+    conocidas.sort(key=lambda titulo: sellos.get(titulo, {}).get("obtenido", 0))
+    return nuevas + conocidas
+
+def resumen_plan(orden, catalogo, sellos):
+    """Texto con cuántas revistas del plan son nuevas y la antigüedad de las del catálogo"""
+    conocidas = [sellos.get(titulo, {}).get("obtenido") for titulo in orden if titulo in catalogo]
+    texto = f"{len(orden) - len(conocidas)} nuevas o incompletas, {len(conocidas)} del catálogo"
+    if conocidas:
+        sin_sello = sum(obtenido is None for obtenido in conocidas)
+        selladas = [obtenido for obtenido in conocidas if obtenido is not None]
+        texto += f" ({sin_sello} sin sello"
+        if selladas:
+            texto += f", la más antigua obtenida hace {(time.time() - min(selladas)) / 86400:.1f} días"
+        texto += ")"
+    return texto
+
+class PresupuestoAgotado(Exception):
+    """No queda presupuesto para otra petición; la revista en curso queda para la siguiente ejecución."""
+
+class Presupuesto:
+    """
+    Límite de peticiones HTTP y de tiempo de una ejecución; las revistas que no alcanzan quedan para la siguiente.
+
+    Cada petición (incluidos reintentos y revalidaciones) reserva una unidad antes de hacerse,
+    así el límite se cumple aunque haya muchas revistas en curso a la vez.
+    """
+
+    def __init__(self, peticiones=None, segundos=None):
+        """
+        Args:
+            peticiones (int): Peticiones HTTP máximas (incluidos reintentos y 304); None sin límite
+            segundos (float): Duración máxima; None sin límite
+        """
+        self.peticiones = peticiones
+        self.segundos = segundos
+        self.inicio = time.monotonic()
+        self.reservadas = 0
+        self.lock = threading.Lock()
+
+    def usadas(self):
+        """Peticiones reservadas desde que se creó el presupuesto"""
+        return self.reservadas
+
+    def reservar(self):
+        """
+        Reserva una petición.
+
+        Raises:
+            PresupuestoAgotado: Si ya no quedan peticiones o se acabó el tiempo
+        """
+        with self.lock:
+            if self.agotado():
+                raise PresupuestoAgotado()
+            self.reservadas += 1
+
+    def agotado(self):
+        """Indica si ya no hay que empezar más revistas ni hacer más peticiones"""
+        if self.peticiones is not None and self.reservadas >= self.peticiones:
+            return True
+        return self.segundos is not None and time.monotonic() - self.inicio >= self.segundos
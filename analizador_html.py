@@ -0,0 +1,187 @@
+'''Análisis del HTML de SCIMAGO para el web scrapper.
+
+Usa el analizador más rápido que esté instalado (lxml) y, si no, el html.parser de siempre.
+Además solo construye los subárboles que leen los extractores: el bloque de resultados en
+las búsquedas y los bloques de datos y widget en la página de cada revista. El resto de la
+página (menús, scripts, pie) se descarta mientras se analiza.
+
+Ejecutado como programa compara, sobre las páginas grabadas en datos/fixtures/html (y, si se
+pide, las de la caché), lo que se extrae con el análisis rápido y con el análisis completo con
+html.parser, y en las grabadas también con el enlace y el registro que indica su indice.json.'''
+import argparse
+import time
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.builder import builder_registry
+from metricas import metricas
+
+# En orden de preferencia; html.parser viene con Python y siempre está disponible
+ANALIZADORES_PREFERIDOS = ("lxml", "html.parser")
+
+# Subárboles que usan buscar_enlace_en_soup y extraer_datos_de_soup
+OBJETIVOS = {
+    'busqueda': SoupStrainer('div', class_='journaldescription colblock'),
+    'revista': SoupStrainer('div', class_=['background', 'dashboard']),
+}
+
+def elegir_analizador():
+    """Devuelve el primer analizador de ANALIZADORES_PREFERIDOS instalado"""
+    for nombre in ANALIZADORES_PREFERIDOS:
+        if builder_registry.lookup(nombre) is not None:
+            return nombre
+    return "html.parser"
+
+ANALIZADOR = elegir_analizador()
+
+def analizar(contenido, objetivo=None, analizador=None):
+    """
+    Analiza una página de SCIMAGO.
+
+    Args:
+        contenido (bytes | str): HTML de la página (los bytes se decodifican como UTF-8, igual que antes)
+        objetivo (str): 'busqueda' o 'revista' para construir solo los subárboles necesarios;
+            None para analizar la página completa
+        analizador (str): Analizador de BeautifulSoup; por defecto el más rápido instalado
+
+    Returns:
+        BeautifulSoup: Documento (o subárboles) analizado
+    """
+    with metricas.medir('analisis_html', objetivo=objetivo or 'completo'):
+        if isinstance(contenido, bytes):
+            contenido = str(contenido, 'utf-8')
+        return BeautifulSoup(contenido, analizador or ANALIZADOR, parse_only=OBJETIVOS.get(objetivo))
+
+def comparar_pagina(contenido, extraer_enlace, extraer_datos, titulo=None):
+    """
+    Compara el resultado de los extractores con el análisis rápido y con el completo (html.parser).
+
+    Args:
+        contenido (bytes): HTML de una página de búsqueda o de revista
+        extraer_enlace (callable): buscar_enlace_en_soup(soup, titulo)
+        extraer_datos (callable): extraer_datos_de_soup(soup, nombre, datos)
+        titulo (str): Título buscado; por defecto el primero de la página de búsqueda
+
+    Returns:
+        tuple: (tipo de página, resultado completo, resultado rápido); en una búsqueda el enlace,
+            en una revista el registro
+    """
+    referencia = BeautifulSoup(str(contenido, 'utf-8'), "html.parser")
+    if referencia.find('div', class_='search_results') is not None:
+        if titulo is None:
+            # Se busca el primer título de la página, el caso en que el extractor devuelve un enlace
+            span = referencia.find('span', class_='jrnlname')
+            titulo = span.text.strip() if span else ""
+        return ('busqueda', extraer_enlace(referencia, titulo),
+                extraer_enlace(analizar(contenido, 'busqueda'), titulo))
+
+    nombre = titulo or "revista"
+    completo, rapido = {}, {}
+    extraer_datos(referencia, nombre, completo)
+    extraer_datos(analizar(contenido, 'revista'), nombre, rapido)
+    return 'revista', completo.get(nombre), rapido.get(nombre)
+
+def paginas_de_fixtures(fixtures):
+    """
+    Páginas grabadas con lo que se espera extraer de cada una.
+
+    Args:
+        fixtures (list): Entradas de indice.json con el contenido cargado (benchmark.cargar_fixtures)
+
+    Yields:
+        tuple: (archivo, contenido, titulo, enlace o registro esperado)
+    """
+    for entrada in fixtures:
+        yield entrada["busqueda"]["archivo"], entrada["busqueda"]["contenido"], entrada["titulo"], entrada["enlace"]
+        if entrada.get("revista") is not None:
+            yield entrada["revista"]["archivo"], entrada["revista"]["contenido"], entrada["titulo"], entrada["registro"]
+
+def verificar_paridad(paginas, extraer_enlace, extraer_datos):
+    """
+    Verifica que el análisis rápido extrae exactamente lo mismo que el completo.
+
+    Args:
+        paginas (iterable): Tuplas (nombre, contenido en bytes, titulo, esperado); titulo y
+            esperado son None si la página no tiene un resultado conocido (p. ej. las de la caché)
+        extraer_enlace (callable): buscar_enlace_en_soup
+        extraer_datos (callable): extraer_datos_de_soup
+
+    Returns:
+        tuple: (número de páginas revisadas, lista de páginas con diferencias)
+    """
+    revisadas = 0
+    diferentes = []
+    for nombre, contenido, titulo, esperado in paginas:
+        _, completo, rapido = comparar_pagina(contenido, extraer_enlace, extraer_datos, titulo)
+        revisadas += 1
+        if completo != rapido or (esperado is not None and rapido != esperado):
+            diferentes.append(nombre)
+    return revisadas, diferentes
+
+def medir(paginas, repeticiones=3):
+    """
+    Mide el tiempo medio de análisis por página con html.parser completo y con el análisis rápido.
+
+    Args:
+        paginas (list): Pares (objetivo, contenido en bytes)
+        repeticiones (int): Veces que se analiza cada página
+
+    Returns:
+        dict: Milisegundos por página de cada variante
+    """
+    variantes = {
+        'html.parser completo': lambda contenido, objetivo: analizar(contenido, None, "html.parser"),
+        f'{ANALIZADOR} con subárboles': lambda contenido, objetivo: analizar(contenido, objetivo),
+    }
+    tiempos = {}
+    for nombre, funcion in variantes.items():
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            for objetivo, contenido in paginas:
+                funcion(contenido, objetivo)
+        tiempos[nombre] = (time.perf_counter() - inicio) * 1000 / max(1, repeticiones * len(paginas))
+    return tiempos
+
+def main():
+    # El scrapper se importa aquí para que importar este módulo no configure su logging
+    import benchmark
+    import cache_http
+    import web_scrapper_mejorado as scrapper
+
+    parser = argparse.ArgumentParser(description="Paridad y velocidad del análisis rápido de HTML")
+    parser.add_argument("--fixtures", default=benchmark.CARPETA_FIXTURES,
+                        help="Carpeta de las páginas grabadas (con su indice.json)")
+    parser.add_argument("--cache", default=None, help="Revisar también las páginas de esta caché SQLite")
+    parser.add_argument("--limite", type=int, default=None, help="Número máximo de páginas de la caché a revisar")
+    args = parser.parse_args()
+
+    try:
+        paginas = list(paginas_de_fixtures(benchmark.cargar_fixtures(args.fixtures)))
+    except FileNotFoundError:
+        paginas = []
+    if args.cache is not None:
+        cache = cache_http.CacheSQLite(args.cache, ttl=None, limite_bytes=None)
+        paginas += [(url, contenido, None, None) for url, contenido in cache.iterar_paginas(args.limite)]
+    if not paginas:
+        print(f"No hay páginas en {args.fixtures}" + (f" ni en {args.cache}" if args.cache else ""))
+        exit(1)
+
+    revisadas, diferentes = verificar_paridad(paginas, scrapper.buscar_enlace_en_soup, scrapper.extraer_datos_de_soup)
+    print(f"Analizador rápido: {ANALIZADOR}")
+    print(f"Paridad: {revisadas - len(diferentes)}/{revisadas} páginas con el mismo resultado")
+    for nombre in diferentes:
+        print(f"  Diferencia en {nombre}")
+
+    objetivos = [('busqueda' if b'search_results' in contenido else 'revista', contenido) for _, contenido, *_ in paginas]
+    # Por tipo de página: en las revistas se conserva el panel con las tablas de los gráficos
+    for objetivo, etiqueta in (('busqueda', "Búsquedas"), ('revista', "Revistas")):
+        grupo = [par for par in objetivos if par[0] == objetivo]
+        if not grupo:
+            continue
+        tiempos = medir(grupo)
+        completo, rapido = tiempos.values()
+        print(f"{etiqueta} ({len(grupo)}): " + ", ".join(f"{nombre} {ms:.2f} ms" for nombre, ms in tiempos.items())
+              + f" por página ({completo / rapido:.1f} veces más rápido)")
+    if diferentes:
+        exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+'''Benchmarks sin conexión de la lectura de los CSV, de la extracción de SCIMAGO y de la caché.
+
+Las páginas de búsqueda y de revista están grabadas en datos/fixtures/html/ (con el índice
+indice.json, que también guarda el enlace y el registro que se esperan de cada una), así que
+no se hace ninguna petición: las páginas se cargan en una caché temporal antes de medir.
+
+Los resultados se comparan con una base guardada (benchmark_base.json); un caso cuya mediana
+supera la de la base en más del umbral cuenta como regresión y el programa termina con 1.'''
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+import leer_csv
+import cache_http
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+CARPETA_CSV = os.path.join(RAIZ, "datos", "csv")
+CARPETA_FIXTURES = os.path.join(RAIZ, "datos", "fixtures", "html")
+ARCHIVO_INDICE = "indice.json"
+ARCHIVO_BASE = "benchmark_base.json"
+URL_SCIMAGO = "https://www.scimagojr.com/"
+UMBRAL = 0.20
+# Segundos máximos por caso: los casos lentos (el corpus x100) se repiten menos veces
+PRESUPUESTO_CASO = 30.0
+ESCALAS = (1, 10, 100)
+PAGINAS_CACHE = 500
+GRUPOS = ("csv", "scrapper", "cache")
+
+def medir(funcion, repeticiones, preparar=None):
+    """
+    Ejecuta funcion varias veces y devuelve la duración de cada una.
+
+    Siempre hay al menos una ejecución; las siguientes solo mientras no se pase PRESUPUESTO_CASO.
+
+    Args:
+        funcion (callable): Lo que se mide
+        repeticiones (int): Número máximo de ejecuciones
+        preparar (callable): Se llama antes de cada ejecución, fuera de la medición
+
+    Returns:
+        list: Segundos de cada ejecución
+    """
+    tiempos = []
+    while len(tiempos) < repeticiones and (not tiempos or sum(tiempos) < PRESUPUESTO_CASO):
+        if preparar is not None:
+            preparar()
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return tiempos
+
+def resumir(tiempos, bytes_procesados=None):
+    """Mediana, mínimo y número de ejecuciones de un caso"""
+    resultado = {"mediana": statistics.median(tiempos), "minimo": min(tiempos), "repeticiones": len(tiempos)}
+    if bytes_procesados is not None:
+        resultado["bytes"] = bytes_procesados
+    return resultado
+
+def corpus_sintetico(carpeta_base, destino, escala):
+    """
+    Copia la estructura de carpetas de los CSV repitiendo cada archivo escala veces.
+
+    Las copias llevan un prefijo numérico en el título para que sean revistas distintas. Se
+    trabaja con los bytes para conservar la codificación de cada archivo.
+
+    Args:
+        carpeta_base (str): Carpeta con las subcarpetas de CSV (datos/csv)
+        destino (str): Carpeta donde se crea el corpus
+        escala (int): Veces que se repite cada archivo
+
+    Returns:
+        int: Bytes escritos
+    """
+    total = 0
+    for _, _, origen in leer_csv.listar_archivos_csv(carpeta_base):
+        salida = os.path.join(destino, os.path.relpath(origen, carpeta_base))
+        os.makedirs(os.path.dirname(salida), exist_ok=True)
+        with open(origen, 'rb') as f:
+            cabecera, *lineas = f.read().splitlines(keepends=True)
+        with open(salida, 'wb') as f:
+            f.write(cabecera)
+            f.writelines(lineas)
+            for copia in range(1, escala):
+                prefijo = b"%d " % copia
+                f.writelines(b'"' + prefijo + linea[1:] if linea.startswith(b'"') else prefijo + linea
+                             for linea in lineas if linea.strip())
+        total += os.path.getsize(salida)
+    return total
+
+def casos_csv(escalas, repeticiones, temporal):
+    """Mide crear_diccionario_revistas sobre los CSV incluidos y sobre corpus escala veces más grandes"""
+    resultados = {}
+    for escala in escalas:
+        if escala == 1:
+            carpeta = CARPETA_CSV
+            tamano = sum(os.path.getsize(archivo) for _, _, archivo in leer_csv.listar_archivos_csv(carpeta))
+        else:
+            carpeta = os.path.join(temporal, f"csv_x{escala}")
+            tamano = corpus_sintetico(CARPETA_CSV, carpeta, escala)
+
+        def leer():
+            # leer_csv_seguro escribe una línea por archivo
+            with contextlib.redirect_stdout(io.StringIO()):
+                leer_csv.crear_diccionario_revistas(carpeta)
+        resultados[f"crear_diccionario_revistas x{escala}"] = resumir(medir(leer, repeticiones), tamano)
+        if escala != 1:
+            shutil.rmtree(carpeta)
+    return resultados
+
+def cargar_fixtures(carpeta=CARPETA_FIXTURES):
+    """
+    Lee el índice de las páginas grabadas y el contenido de cada una.
+
+    Returns:
+        list: Entradas del índice, con "contenido" (bytes) en "busqueda" y en "revista"
+    """
+    with open(os.path.join(carpeta, ARCHIVO_INDICE), 'r', encoding='utf-8') as f:
+        indice = json.load(f)
+    for entrada in indice:
+        for pagina in (entrada["busqueda"], entrada.get("revista")):
+            if pagina is not None:
+                with open(os.path.join(carpeta, pagina["archivo"]), 'rb') as f:
+                    pagina["contenido"] = f.read()
+    return indice
+
+def importar_scrapper():
+    """Importa el scrapper sin los mensajes de cada revista y sin permitirle salir a la red"""
+    import web_scrapper_mejorado as scrapper
+    logging.getLogger().setLevel(logging.WARNING)
+
+    def sin_conexion(url, cancelado=None, validadores=None):
+        raise RuntimeError(f"{url} no está en las páginas grabadas (el benchmark no hace peticiones)")
+    scrapper.descargar = sin_conexion
+    return scrapper
+
+def casos_scrapper(fixtures, repeticiones):
+    """
+    Mide extraer_enlace_optimizado y extraer_datos_finales sobre las páginas grabadas.
+
+    En frío (análisis del HTML) se vacían los resultados guardados y la tabla de resolución
+    antes de cada ejecución; con resultado guardado se mide el camino de las ejecuciones
+    siguientes, que no analizan el HTML. Debe llamarse con una carpeta temporal como
+    directorio actual, donde quedan cache.sqlite y resoluciones.sqlite.
+    """
+    import resolucion
+    scrapper = importar_scrapper()
+    cache = cache_http.abrir_cache()
+    mapa = resolucion.abrir_mapa()
+    for entrada in fixtures:
+        for pagina in (entrada["busqueda"], entrada.get("revista")):
+            if pagina is not None:
+                cache.guardar(URL_SCIMAGO + pagina["ruta"], pagina["contenido"])
+    revistas = [entrada for entrada in fixtures if entrada.get("revista") is not None]
+
+    def enlaces():
+        for entrada in fixtures:
+            enlace = scrapper.extraer_enlace_optimizado(URL_SCIMAGO + entrada["busqueda"]["ruta"], entrada["titulo"])
+            if enlace != entrada["enlace"]:
+                raise AssertionError(f"Enlace de {entrada['titulo']}: {enlace!r} en lugar de {entrada['enlace']!r}")
+
+    def registros():
+        for entrada in revistas:
+            datos = scrapper.extraer_datos_finales(URL_SCIMAGO + entrada["revista"]["ruta"], entrada["titulo"], {})
+            if datos is None or datos[entrada["titulo"]] != entrada["registro"]:
+                raise AssertionError(f"El registro de {entrada['titulo']} no coincide con el grabado")
+
+    def en_frio():
+        cache.purgar_resultados()
+        mapa.vaciar()
+
+    bytes_busqueda = sum(len(entrada["busqueda"]["contenido"]) for entrada in fixtures)
+    bytes_revista = sum(len(entrada["revista"]["contenido"]) for entrada in revistas)
+    resultados = {
+        "extraer_enlace_optimizado (análisis)": resumir(medir(enlaces, repeticiones, en_frio), bytes_busqueda),
+        "extraer_datos_finales (análisis)": resumir(medir(registros, repeticiones, en_frio), bytes_revista),
+    }
+    # Ahora los resultados quedan guardados de la última ejecución
+    enlaces()
+    registros()
+    mapa.vaciar()
+    resultados["extraer_enlace_optimizado (resultado guardado)"] = resumir(medir(enlaces, repeticiones, mapa.vaciar))
+    resultados["extraer_datos_finales (resultado guardado)"] = resumir(medir(registros, repeticiones))
+    return resultados
+
+def casos_cache(fixtures, repeticiones, temporal, paginas=PAGINAS_CACHE):
+    """Mide la escritura y la lectura de páginas en CacheSQLite (con compresión)"""
+    contenidos = [pagina["contenido"] for entrada in fixtures
+                  for pagina in (entrada["busqueda"], entrada.get("revista")) if pagina is not None]
+    urls = [f"{URL_SCIMAGO}benchmark?p={i}" for i in range(paginas)]
+    total = sum(len(contenidos[i % len(contenidos)]) for i in range(paginas))
+    estado = {}
+
+    def nueva_cache():
+        if "cache" in estado:
+            estado["cache"].cerrar()
+        ruta = os.path.join(temporal, f"benchmark_{len(estado)}_{time.monotonic_ns()}.sqlite")
+        estado["cache"] = cache_http.CacheSQLite(ruta)
+
+    def escribir():
+        for i, url in enumerate(urls):
+            estado["cache"].guardar(url, contenidos[i % len(contenidos)])
+
+    def leer():
+        for url in urls:
+            if estado["cache"].leer(url) is None:
+                raise AssertionError(f"{url} no está en la caché")
+
+    resultados = {"cache escritura": resumir(medir(escribir, repeticiones, nueva_cache), total)}
+    resultados["cache lectura"] = resumir(medir(leer, repeticiones), total)
+    estado["cache"].cerrar()
+    return resultados
+
+def ejecutar(grupos, escalas, repeticiones, fixtures):
+    """
+    Ejecuta los casos de los grupos pedidos en una carpeta temporal.
+
+    Returns:
+        dict: Resultados con el sistema, la fecha y {caso: resumen}
+    """
+    casos = {}
+    directorio = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="benchmark_") as temporal:
+        os.chdir(temporal)
+        try:
+            if "csv" in grupos:
+                casos.update(casos_csv(escalas, repeticiones, temporal))
+            if "scrapper" in grupos:
+                casos.update(casos_scrapper(fixtures, repeticiones))
+            if "cache" in grupos:
+                casos.update(casos_cache(fixtures, repeticiones, temporal))
+        finally:
+            os.chdir(directorio)
+    return {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "sistema": {"python": platform.python_version(), "plataforma": platform.platform(),
+                    "procesador": platform.machine(), "cpus": os.cpu_count()},
+        "casos": casos,
+    }
+
+def comparar(resultados, base, umbral=UMBRAL):
+    """
+    Compara cada caso con la base.
+
+    Returns:
+        list: Filas (caso, mediana base o None, mediana actual, cambio o None, es regresión)
+    """
+    filas = []
+    for caso, actual in resultados["casos"].items():
+        anterior = base.get("casos", {}).get(caso)
+        if anterior is None:
+            filas.append((caso, None, actual["mediana"], None, False))
+            continue
+        cambio = actual["mediana"] / anterior["mediana"] - 1
+        filas.append((caso, anterior["mediana"], actual["mediana"], cambio, cambio > umbral))
+    return filas
+
+def tabla(resultados, filas):
+    """Tabla de texto con los tiempos, el rendimiento y la comparación con la base"""
+    encabezado = ("Caso", "n", "mediana ms", "mín ms", "MB/s", "base ms", "cambio", "")
+    lineas = [encabezado]
+    for caso, anterior, mediana, cambio, regresion in filas:
+        resumen = resultados["casos"][caso]
+        rendimiento = f"{resumen['bytes'] / resumen['mediana'] / 1e6:.1f}" if "bytes" in resumen else ""
+        lineas.append((caso, str(resumen["repeticiones"]), f"{mediana * 1000:.1f}", f"{resumen['minimo'] * 1000:.1f}",
+                       rendimiento, "" if anterior is None else f"{anterior * 1000:.1f}",
+                       "" if cambio is None else f"{cambio:+.1%}", "REGRESIÓN" if regresion else ""))
+    anchos = [max(len(linea[i]) for linea in lineas) for i in range(len(encabezado))]
+    return "\n".join("  ".join(valor.ljust(anchos[0]) if i == 0 else valor.rjust(anchos[i]) for i, valor in enumerate(linea))
+                     for linea in lineas)
+
+def grabar(url_base, titulos, carpeta=CARPETA_FIXTURES):
+    """
+    Descarga la página de búsqueda y la de la revista de cada título y las guarda como fixtures.
+
+    El enlace y el registro que extrae el scrapper de cada página se guardan en el índice
+    para comprobar en cada ejecución del benchmark que la extracción sigue siendo la misma.
+
+    Args:
+        url_base (str): URL de SCIMAGO (o de un servidor local con la misma estructura)
+        titulos (list): Títulos de revistas
+        carpeta (str): Carpeta de las fixtures
+
+    Returns:
+        list: Entradas del índice
+    """
+    import web_scrapper_mejorado as scrapper
+    os.makedirs(carpeta, exist_ok=True)
+    indice = []
+    for numero, titulo in enumerate(titulos, 1):
+        ruta_busqueda = "journalsearch.php?q=+" + titulo.replace(" ", "+").lower()
+        respuesta = scrapper.descargar(url_base + ruta_busqueda)
+        if respuesta is None:
+            print(f"No se pudo descargar la búsqueda de {titulo}")
+            continue
+        entrada = {"titulo": titulo, "busqueda": {"archivo": f"busqueda_{numero}.html", "ruta": ruta_busqueda}}
+        with open(os.path.join(carpeta, entrada["busqueda"]["archivo"]), 'wb') as f:
+            f.write(respuesta[0])
+        entrada["enlace"] = scrapper.enlace_de_pagina(respuesta[0], titulo)[0]
+        if entrada["enlace"] is not None:
+            respuesta = scrapper.descargar(url_base + entrada["enlace"])
+            if respuesta is None:
+                print(f"No se pudo descargar la página de {titulo}")
+                continue
+            entrada["revista"] = {"archivo": f"revista_{numero}.html", "ruta": entrada["enlace"]}
+            with open(os.path.join(carpeta, entrada["revista"]["archivo"]), 'wb') as f:
+                f.write(respuesta[0])
+            entrada["registro"] = scrapper.revista_de_pagina(respuesta[0], titulo)[1]
+        indice.append(entrada)
+    with open(os.path.join(carpeta, ARCHIVO_INDICE), 'w', encoding='utf-8') as f:
+        json.dump(indice, f, ensure_ascii=False, indent=2)
+    return indice
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks sin conexión del proyecto")
+    sub = parser.add_subparsers(dest="accion", required=True)
+    correr = sub.add_parser("ejecutar", help="Ejecutar los benchmarks y compararlos con la base")
+    correr.add_argument("--casos", nargs="+", choices=GRUPOS, default=list(GRUPOS), help="Grupos de casos a ejecutar")
+    correr.add_argument("--escalas", nargs="+", type=int, default=list(ESCALAS),
+                        help="Tamaños del corpus de CSV (1 = los CSV incluidos)")
+    correr.add_argument("--repeticiones", type=int, default=5, help="Ejecuciones de cada caso")
+    correr.add_argument("--base", default=ARCHIVO_BASE, help="Archivo con los resultados de referencia")
+    correr.add_argument("--guardar-base", action="store_true", help="Guardar estos resultados como la nueva base")
+    correr.add_argument("--umbral", type=float, default=UMBRAL,
+                        help="Aumento de la mediana que cuenta como regresión (0.2 = 20%%)")
+    correr.add_argument("--fixtures", default=CARPETA_FIXTURES, help="Carpeta de las páginas grabadas")
+    grabar_parser = sub.add_parser("grabar", help="Grabar las páginas de búsqueda y de revista de unos títulos")
+    grabar_parser.add_argument("titulos", nargs="+", help="Títulos de revistas")
+    grabar_parser.add_argument("--url-base", default=URL_SCIMAGO, help="URL del sitio")
+    grabar_parser.add_argument("--fixtures", default=CARPETA_FIXTURES, help="Carpeta donde se guardan")
+    args = parser.parse_args()
+
+    if args.accion == "grabar":
+        indice = grabar(args.url_base, args.titulos, args.fixtures)
+        print(f"{len(indice)} títulos grabados en {args.fixtures}")
+        return
+
+    fixtures = cargar_fixtures(args.fixtures) if {"scrapper", "cache"} & set(args.casos) else []
+    resultados = ejecutar(args.casos, args.escalas, args.repeticiones, fixtures)
+    base = {}
+    if os.path.exists(args.base):
+        with open(args.base, 'r', encoding='utf-8') as f:
+            base = json.load(f)
+    filas = comparar(resultados, base, args.umbral)
+    print(tabla(resultados, filas))
+    if base:
+        print(f"Base del {base.get('fecha')} ({base.get('sistema', {}).get('plataforma')}), umbral {args.umbral:.0%}")
+    if args.guardar_base:
+        # Los casos que no se ejecutaron esta vez conservan su valor anterior
+        resultados["casos"] = {**base.get("casos", {}), **resultados["casos"]}
+        leer_csv.guardar_como_json(resultados, args.base)
+        print(f"Base guardada en {args.base}")
+    regresiones = [fila[0] for fila in filas if fila[4]]
+    if regresiones:
+        print(f"{len(regresiones)} regresiones: {', '.join(regresiones)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
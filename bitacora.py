@@ -0,0 +1,273 @@
+'''Bitácora de avance del web scrapper: un archivo JSONL al que solo se añaden líneas.
+
+Cada revista terminada (encontrada, no encontrada o con error) añade una línea, y el archivo
+se sincroniza con el disco por lotes, así el costo de guardar el avance es el mismo para la
+primera revista que para la número 20000. Para continuar una ejecución interrumpida basta
+con saltar los títulos que ya están en la bitácora; al terminar, la bitácora se compacta
+dentro de revistas_scimago_final.json (ver actualizacion.py para los sellos de cada revista).'''
+import argparse
+import json
+import logging
+import os
+import time
+import leer_csv
+import catalogo_mapeado
+import actualizacion
+
+ARCHIVO_BITACORA = "revistas_scimago.bitacora.jsonl"
+ARCHIVO_CATALOGO = "revistas_scimago_final.json"
+# Estados que no hace falta repetir al continuar (los errores sí se reintentan)
+ESTADOS_TERMINADOS = ('encontrada', 'no_encontrada')
+
+def recortar_linea_incompleta(ruta):
+    """
+    Quita del final de la bitácora una línea a medio escribir (corte durante una escritura).
+
+    Sin esto, la primera línea nueva se pegaría a ella y también se perdería al leer.
+
+    Args:
+        ruta (str): Archivo JSONL
+
+    Returns:
+        int: Bytes descartados
+    """
+    try:
+        archivo = open(ruta, 'rb+')
+    except FileNotFoundError:
+        return 0
+    with archivo:
+        tamano = archivo.seek(0, os.SEEK_END)
+        if tamano == 0:
+            return 0
+        final = tamano
+        # Se lee hacia atrás por bloques hasta el último salto de línea
+        while final > 0:
+            inicio = max(0, final - 8192)
+            archivo.seek(inicio)
+            bloque = archivo.read(final - inicio)
+            if final == tamano and bloque.endswith(b"\n"):
+                return 0
+            salto = bloque.rfind(b"\n")
+            if salto != -1:
+                final = inicio + salto + 1
+                break
+            final = inicio
+        archivo.truncate(final)
+    logging.warning(f"Se descartó una línea incompleta ({tamano - final} bytes) al final de {ruta}")
+    return tamano - final
+
+class Bitacora:
+    """Escritor de la bitácora; las líneas se sincronizan con el disco cada lote o cada intervalo."""
+
+    def __init__(self, ruta=ARCHIVO_BITACORA, lote=50, intervalo=5.0):
+        """
+        Args:
+            ruta (str): Archivo JSONL
+            lote (int): Líneas escritas entre sincronizaciones con el disco
+            intervalo (float): Segundos máximos entre sincronizaciones
+        """
+        self.ruta = ruta
+        self.lote = lote
+        self.intervalo = intervalo
+        recortar_linea_incompleta(ruta)
+        self.archivo = open(ruta, 'a', encoding='utf-8')
+        self.pendientes = 0
+        self.ultima_sincronizacion = time.monotonic()
+
+    def agregar(self, titulo, estado, datos=None, obtenido=None):
+        """
+        Añade el resultado de una revista.
+
+        Args:
+            titulo (str): Título de la revista
+            estado (str): 'encontrada', 'no_encontrada' o 'error'
+            datos: Registro de la revista si se encontró, o el mensaje del error
+            obtenido (float): Marca de tiempo en que se obtuvo la página de la revista (descarga o
+                respuesta 304, también si salió de la caché); por defecto, ahora
+        """
+        linea = {"titulo": titulo, "estado": estado, "obtenido": obtenido or time.time()}
+        if datos is not None:
+            linea["datos"] = datos if estado == 'encontrada' else str(datos)
+        self.archivo.write(json.dumps(linea, ensure_ascii=False) + "\n")
+        self.pendientes += 1
+        if self.pendientes >= self.lote or time.monotonic() - self.ultima_sincronizacion >= self.intervalo:
+            self.sincronizar()
+
+    def sincronizar(self):
+        """Lleva al disco las líneas pendientes"""
+        self.archivo.flush()
+        os.fsync(self.archivo.fileno())
+        self.pendientes = 0
+        self.ultima_sincronizacion = time.monotonic()
+
+    def cerrar(self):
+        """Sincroniza y cierra el archivo"""
+        if not self.archivo.closed:
+            self.sincronizar()
+            self.archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
+def leer_bitacora(ruta=ARCHIVO_BITACORA):
+    """
+    Recorre las líneas de la bitácora.
+
+    Una última línea incompleta (corte a mitad de escritura) se ignora.
+
+    Args:
+        ruta (str): Archivo JSONL
+
+    Yields:
+        dict: {"titulo": ..., "estado": ..., "datos": ...}
+    """
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            for numero, linea in enumerate(f, 1):
+                try:
+                    yield json.loads(linea)
+                except json.JSONDecodeError:
+                    logging.warning(f"Línea {numero} de {ruta} incompleta, se ignora")
+    except FileNotFoundError:
+        return
+
+def titulos_terminados(ruta=ARCHIVO_BITACORA):
+    """
+    Títulos que ya no hace falta procesar al continuar (encontrados o no encontrados).
+
+    Returns:
+        set: Títulos terminados
+    """
+    return {linea["titulo"] for linea in leer_bitacora(ruta) if linea["estado"] in ESTADOS_TERMINADOS}
+
+def combinar_catalogo(catalogo, nuevos):
+    """
+    Recorre el catálogo existente con los registros nuevos encima, sin crear un diccionario combinado.
+
+    Produce los mismos pares y en el mismo orden que {**catalogo, **nuevos}.
+
+    Args:
+        catalogo (dict): Catálogo existente
+        nuevos (dict): Registros nuevos o actualizados
+
+    Yields:
+        tuple: Pares (titulo, datos)
+    """
+    for titulo, datos in catalogo.items():
+        yield titulo, nuevos.get(titulo, datos)
+    for titulo, datos in nuevos.items():
+        if titulo not in catalogo:
+            yield titulo, datos
+
+def cargar_catalogo(ruta=ARCHIVO_CATALOGO):
+    """
+    Abre el catálogo de SCIMAGO ya obtenido.
+
+    Un catálogo mapeado (catalogo_mapeado.EXTENSION) se abre sin leerlo: las comprobaciones
+    `titulo in catalogo` solo tocan el índice de títulos.
+
+    Args:
+        ruta (str): JSON, NDJSON o catálogo mapeado
+
+    Returns:
+        Mapping: Catálogo {titulo: datos}; vacío si el archivo no existe o está vacío
+    """
+    if not os.path.exists(ruta):
+        logging.info(f"No existe {ruta}, se creará al terminar")
+        return {}
+    if catalogo_mapeado.es_catalogo_mapeado(ruta):
+        return catalogo_mapeado.CatalogoMapeado(ruta)
+    try:
+        return dict(leer_csv.iterar_json(ruta))
+    except json.JSONDecodeError as e:
+        logging.error(f"Error al leer el archivo {ruta}: {e}")
+        return {}
+
+def incorporar(nuevos, salida=ARCHIVO_CATALOGO, catalogo=None):
+    """
+    Escribe el catálogo con los registros nuevos encima, de forma atómica.
+
+    Si salida tiene la extensión de catalogo_mapeado, se escribe en ese formato.
+
+    Args:
+        nuevos (dict): Registros nuevos o actualizados {titulo: datos}
+        salida (str): Catálogo (JSON o catálogo mapeado)
+        catalogo (Mapping): Catálogo ya cargado; por defecto se lee de salida
+    """
+    if catalogo is None and not os.path.exists(salida):
+        catalogo = {}
+    if catalogo_mapeado.es_catalogo_mapeado(salida):
+        if catalogo is None:
+            catalogo = catalogo_mapeado.CatalogoMapeado(salida)
+        abiertos = [catalogo] if isinstance(catalogo, catalogo_mapeado.CatalogoMapeado) else []
+        catalogo_mapeado.guardar_catalogo(combinar_catalogo(catalogo, nuevos), salida, abiertos)
+    else:
+        if catalogo is None:
+            catalogo = dict(leer_csv.iterar_json(salida))
+        leer_csv.guardar_como_json(combinar_catalogo(catalogo, nuevos), salida)
+
+def compactar(ruta=ARCHIVO_BITACORA, salida=ARCHIVO_CATALOGO, catalogo=None, sellos=None):
+    """
+    Incorpora las revistas encontradas de la bitácora al catálogo y elimina la bitácora.
+
+    El catálogo se escribe de forma atómica; la bitácora solo se elimina después, así una
+    interrupción nunca pierde resultados.
+
+    Args:
+        ruta (str): Archivo JSONL de la bitácora
+        salida (str): Catálogo (JSON o catálogo mapeado)
+        catalogo (Mapping): Catálogo ya cargado; por defecto se lee de salida
+        sellos (str): Archivo de sellos (actualizacion.ruta_sellos); si se da, cada revista se
+            sella y solo se reescriben las que cambiaron
+
+    Returns:
+        int: Número de revistas incorporadas
+    """
+    # Si una revista aparece varias veces (p. ej. al reintentar), gana la última línea
+    encontradas = {linea["titulo"]: linea for linea in leer_bitacora(ruta) if linea["estado"] == 'encontrada'}
+    nuevos = {titulo: linea["datos"] for titulo, linea in encontradas.items()}
+    registro_sellos = None
+    if sellos is not None and encontradas:
+        if catalogo is None:
+            catalogo = cargar_catalogo(salida)
+        registro_sellos = actualizacion.cargar_sellos(sellos)
+        for titulo, linea in encontradas.items():
+            if titulo in catalogo and titulo not in registro_sellos:
+                # Revista sin sello (importada u obtenida antes de los sellos): se compara con el catálogo
+                registro_sellos[titulo] = {"hash": actualizacion.hash_registro(catalogo[titulo])}
+            cambio = actualizacion.sellar(registro_sellos, titulo, linea["datos"], linea.get("obtenido"))
+            if not cambio and titulo in catalogo:
+                del nuevos[titulo]
+        logging.info(f"{len(encontradas) - len(nuevos)} revistas sin cambios, {len(nuevos)} nuevas o cambiadas")
+    if nuevos:
+        incorporar(nuevos, salida, catalogo)
+    if registro_sellos is not None:
+        actualizacion.guardar_sellos(registro_sellos, sellos)
+    if os.path.exists(ruta):
+        os.remove(ruta)
+    return len(nuevos)
+
+def main():
+    parser = argparse.ArgumentParser(description="Bitácora de avance del web scrapper")
+    parser.add_argument("--bitacora", default=ARCHIVO_BITACORA, help="Archivo JSONL de la bitácora")
+    sub = parser.add_subparsers(dest="accion", required=True)
+    sub.add_parser("resumen", help="Contar las revistas de la bitácora por estado")
+    compactar_parser = sub.add_parser("compactar", help="Incorporar la bitácora al catálogo y eliminarla")
+    compactar_parser.add_argument("--salida", default=ARCHIVO_CATALOGO,
+                                  help=f"Catálogo: JSON o catálogo mapeado ({catalogo_mapeado.EXTENSION})")
+    args = parser.parse_args()
+
+    if args.accion == "compactar":
+        incorporadas = compactar(args.bitacora, args.salida, sellos=actualizacion.ruta_sellos(args.salida))
+        print(f"{incorporadas} revistas incorporadas a {args.salida}")
+    else:
+        estados = {}
+        for linea in leer_bitacora(args.bitacora):
+            estados[linea["estado"]] = estados.get(linea["estado"], 0) + 1
+        print(estados or f"{args.bitacora} está vacía o no existe")
+
+if __name__ == "__main__":
+    main()
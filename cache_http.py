@@ -0,0 +1,518 @@
+'''Almacenes de caché para las páginas descargadas por el web scrapper.
+
+CacheSQLite guarda todas las páginas en un solo archivo SQLite, comprimidas con zlib, con
+caducidad (TTL) y un presupuesto de bytes: al superarlo se descartan las páginas usadas
+hace más tiempo (LRU). Una página caducada no se descarta al leerla: se revalida con una
+petición condicional (ETag / Last-Modified) y, si el servidor responde 304, se renueva sin
+descargarla de nuevo. CacheArchivos es el formato anterior (un archivo .html por URL) y
+sirve para seguir usando o migrar una carpeta de caché existente.
+
+La caché tiene dos niveles: las respuestas tal como llegaron (bytes y cabeceras) y los
+resultados ya extraídos de ellas (enlace de la revista, registro de la revista). Los
+resultados llevan la versión del extractor que los produjo; al cambiarla solo se descarta
+ese segundo nivel y las páginas se vuelven a analizar sin descargarlas.'''
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+ARCHIVO_CACHE = "cache.sqlite"
+# Las páginas de SCIMAGO cambian poco: se conservan 30 días y hasta 500 MB comprimidos
+TTL_CACHE = 30 * 24 * 3600
+LIMITE_BYTES_CACHE = 500 * 1024 * 1024
+# Al desalojar se baja hasta este porcentaje del límite para no desalojar en cada escritura
+FRACCION_TRAS_DESALOJO = 0.9
+# El último acceso solo se actualiza si es más antiguo que esto (menos escrituras en las lecturas)
+RESOLUCION_ACCESO = 60.0
+
+# Cabeceras de la respuesta guardada -> cabeceras de la petición condicional
+VALIDADORES = (("etag", "If-None-Match"), ("last-modified", "If-Modified-Since"))
+
+def validadores(cabeceras):
+    """
+    Cabeceras para revalidar una página guardada con una petición condicional.
+
+    Args:
+        cabeceras (dict): Cabeceras guardadas con la página
+
+    Returns:
+        dict: If-None-Match y/o If-Modified-Since; vacío si la respuesta no traía ETag ni Last-Modified
+    """
+    minusculas = {nombre.lower(): valor for nombre, valor in (cabeceras or {}).items()}
+    return {peticion: minusculas[respuesta] for respuesta, peticion in VALIDADORES if respuesta in minusculas}
+
+def clave_url(url):
+    """Clave de una URL en la caché (el mismo hash que usaba la caché por archivos)"""
+    return hashlib.md5(url.encode()).hexdigest()
+
+class CacheArchivos:
+    """Caché anterior: un archivo <md5>.html sin comprimir por URL dentro de una carpeta."""
+
+    def __init__(self, carpeta="cache"):
+        self.carpeta = carpeta
+
+    def ruta(self, url):
+        """Devuelve la ruta del archivo de caché de una URL"""
+        return os.path.join(self.carpeta, f"{clave_url(url)}.html")
+
+    def leer(self, url):
+        """Devuelve el contenido guardado para una URL, o None si no existe"""
+        try:
+            with open(self.ruta(url), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def leer_respuesta(self, url):
+        """Devuelve (contenido, cabeceras); este formato no guarda cabeceras"""
+        contenido = self.leer(url)
+        return None if contenido is None else (contenido, {})
+
+    def leer_caducada(self, url):
+        """Este formato no caduca: nunca hay páginas que revalidar"""
+        return None
+
+    def renovar(self, url, cabeceras=None, guardado_anterior=None):
+        """Este formato no caduca: no hay nada que renovar"""
+
+    def guardar(self, url, datos, cabeceras=None):
+        """Guarda el contenido (bytes) de una URL; las cabeceras se descartan"""
+        os.makedirs(self.carpeta, exist_ok=True)
+        with open(self.ruta(url), 'wb') as f:
+            f.write(datos)
+
+    def obtenido(self, url):
+        """Marca de tiempo en que se guardó la página de una URL (la del archivo), o None si no existe"""
+        try:
+            return os.path.getmtime(self.ruta(url))
+        except FileNotFoundError:
+            return None
+
+    def leer_resultado(self, clave, tipo, version):
+        """Este formato no tiene segundo nivel: nunca hay resultados guardados"""
+        return None
+
+    def leer_resultado_de_pagina(self, url, tipo, version):
+        """Este formato no tiene segundo nivel: nunca hay resultados guardados"""
+        return None
+
+    def guardar_resultado(self, clave, tipo, version, valor):
+        """Este formato no tiene segundo nivel: no guarda nada"""
+
+    def estadisticas(self):
+        """Número de páginas y bytes ocupados"""
+        archivos = glob.glob(os.path.join(self.carpeta, "*.html"))
+        return {'paginas': len(archivos), 'bytes': sum(os.path.getsize(a) for a in archivos)}
+
+class CacheSQLite:
+    """
+    Caché de páginas en un solo archivo SQLite.
+
+    Cada hilo usa su propia conexión y la base está en modo WAL, así varios hilos (o procesos)
+    pueden leer y escribir a la vez; las escrituras esperan su turno en lugar de fallar.
+    El total de bytes se mantiene con triggers para no recorrer la tabla en cada escritura.
+    """
+
+    def __init__(self, ruta=ARCHIVO_CACHE, ttl=TTL_CACHE, limite_bytes=LIMITE_BYTES_CACHE, nivel_compresion=6):
+        """
+        Args:
+            ruta (str): Archivo de la base de datos
+            ttl (float): Segundos que una página se considera vigente; None para no caducar
+            limite_bytes (int): Bytes comprimidos máximos; None para no limitar
+            nivel_compresion (int): Nivel de zlib (1 rápido - 9 más compacto)
+        """
+        self.ruta = ruta
+        self.ttl = ttl
+        self.limite_bytes = limite_bytes
+        self.nivel_compresion = nivel_compresion
+        self.local = threading.local()
+        self._crear_tablas()
+
+    def _conexion(self):
+        conexion = getattr(self.local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=60, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self.local.conexion = conexion
+        return conexion
+
+    def _crear_tablas(self):
+        self._conexion().executescript("""
+            CREATE TABLE IF NOT EXISTS paginas (
+                clave TEXT PRIMARY KEY,
+                url TEXT,
+                contenido BLOB NOT NULL,
+                tamano INTEGER NOT NULL,
+                guardado REAL NOT NULL,
+                ultimo_acceso REAL NOT NULL,
+                cabeceras TEXT
+            );
+            CREATE TABLE IF NOT EXISTS resultados (
+                clave TEXT NOT NULL,
+                tipo TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                valor TEXT NOT NULL,
+                guardado REAL NOT NULL,
+                PRIMARY KEY (clave, tipo)
+            );
+            CREATE INDEX IF NOT EXISTS paginas_acceso ON paginas(ultimo_acceso);
+            CREATE TABLE IF NOT EXISTS totales (nombre TEXT PRIMARY KEY, valor INTEGER NOT NULL);
+            INSERT OR IGNORE INTO totales VALUES ('bytes', 0);
+            CREATE TRIGGER IF NOT EXISTS paginas_insertar AFTER INSERT ON paginas BEGIN
+                UPDATE totales SET valor = valor + NEW.tamano WHERE nombre = 'bytes';
+            END;
+            CREATE TRIGGER IF NOT EXISTS paginas_borrar AFTER DELETE ON paginas BEGIN
+                UPDATE totales SET valor = valor - OLD.tamano WHERE nombre = 'bytes';
+            END;
+            CREATE TRIGGER IF NOT EXISTS paginas_actualizar AFTER UPDATE OF tamano ON paginas BEGIN
+                UPDATE totales SET valor = valor - OLD.tamano + NEW.tamano WHERE nombre = 'bytes';
+            END;
+        """)
+        # Bases creadas antes de guardar las cabeceras
+        columnas = {fila[1] for fila in self._conexion().execute("PRAGMA table_info(paginas)")}
+        if "cabeceras" not in columnas:
+            self._conexion().execute("ALTER TABLE paginas ADD COLUMN cabeceras TEXT")
+
+    def cerrar(self):
+        """Cierra la conexión del hilo actual"""
+        conexion = getattr(self.local, "conexion", None)
+        if conexion is not None:
+            conexion.close()
+            self.local.conexion = None
+
+    def _vigente(self, guardado, ahora):
+        return self.ttl is None or ahora - guardado <= self.ttl
+
+    def leer(self, url):
+        """
+        Devuelve el contenido guardado para una URL.
+
+        Args:
+            url (str): URL de la página
+
+        Returns:
+            bytes: Contenido descomprimido, o None si no existe o ya caducó
+        """
+        respuesta = self.leer_respuesta(url)
+        return None if respuesta is None else respuesta[0]
+
+    def leer_respuesta(self, url):
+        """
+        Devuelve la respuesta guardada para una URL, con sus cabeceras.
+
+        Args:
+            url (str): URL de la página
+
+        Returns:
+            tuple: (contenido en bytes, dict de cabeceras), o None si no existe o ya caducó
+        """
+        clave = clave_url(url)
+        conexion = self._conexion()
+        fila = conexion.execute("SELECT contenido, cabeceras, guardado, ultimo_acceso FROM paginas WHERE clave = ?",
+                                (clave,)).fetchone()
+        if fila is None:
+            return None
+        contenido, cabeceras, guardado, ultimo_acceso = fila
+        ahora = time.time()
+        if not self._vigente(guardado, ahora):
+            return None
+        if ahora - ultimo_acceso > RESOLUCION_ACCESO:
+            conexion.execute("UPDATE paginas SET ultimo_acceso = ? WHERE clave = ?", (ahora, clave))
+        return zlib.decompress(contenido), json.loads(cabeceras) if cabeceras else {}
+
+    def leer_caducada(self, url):
+        """
+        Devuelve la respuesta guardada para una URL aunque ya no esté vigente, para revalidarla.
+
+        Returns:
+            tuple: (contenido en bytes, dict de cabeceras, marca de tiempo de guardado), o None si no existe
+        """
+        fila = self._conexion().execute("SELECT contenido, cabeceras, guardado FROM paginas WHERE clave = ?",
+                                        (clave_url(url),)).fetchone()
+        if fila is None:
+            return None
+        contenido, cabeceras, guardado = fila
+        return zlib.decompress(contenido), json.loads(cabeceras) if cabeceras else {}, guardado
+
+    def renovar(self, url, cabeceras=None, guardado_anterior=None):
+        """
+        Marca como vigente una página que el servidor confirmó sin cambios (respuesta 304).
+
+        También se renuevan los resultados extraídos de esa URL que son de la misma versión de la
+        página (guardados después que ella), así no hace falta volver a analizarla.
+
+        Args:
+            url (str): URL de la página
+            cabeceras (dict): Cabeceras de la respuesta 304; se actualizan ETag y Last-Modified
+            guardado_anterior (float): Marca de tiempo de la página antes de renovarla
+        """
+        ahora = time.time()
+        clave = clave_url(url)
+        nuevos = {nombre: valor for nombre, valor in (cabeceras or {}).items() if nombre.lower() in dict(VALIDADORES)}
+        reemplazadas = {nombre.lower() for nombre in nuevos}
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            if nuevos:
+                fila = conexion.execute("SELECT cabeceras FROM paginas WHERE clave = ?", (clave,)).fetchone()
+                guardadas = {nombre: valor for nombre, valor in (json.loads(fila[0]) if fila and fila[0] else {}).items()
+                             if nombre.lower() not in reemplazadas}
+                conexion.execute("UPDATE paginas SET cabeceras = ? WHERE clave = ?",
+                                 (json.dumps({**guardadas, **nuevos}), clave))
+            conexion.execute("UPDATE paginas SET guardado = ?, ultimo_acceso = ? WHERE clave = ?", (ahora, ahora, clave))
+            if guardado_anterior is not None:
+                conexion.execute("UPDATE resultados SET guardado = ? WHERE clave = ? AND guardado >= ?",
+                                 (ahora, url, guardado_anterior))
+            conexion.execute("COMMIT")
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+
+    def guardar(self, url, datos, cabeceras=None, guardado=None, clave=None):
+        """
+        Guarda (o reemplaza) el contenido de una URL y desaloja páginas si se supera el límite.
+
+        Args:
+            url (str): URL de la página (None si solo se conoce la clave)
+            datos (bytes): Contenido sin comprimir, tal como llegó
+            cabeceras (dict): Cabeceras de la respuesta
+            guardado (float): Marca de tiempo de la descarga; por defecto, ahora
+            clave (str): Clave a usar en lugar del hash de la URL (para migraciones)
+        """
+        ahora = time.time()
+        comprimido = zlib.compress(datos, self.nivel_compresion)
+        conexion = self._conexion()
+        conexion.execute("BEGIN IMMEDIATE")
+        try:
+            conexion.execute(
+                "INSERT INTO paginas (clave, url, contenido, tamano, guardado, ultimo_acceso, cabeceras) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT(clave) DO UPDATE SET "
+                "url = COALESCE(excluded.url, url), contenido = excluded.contenido, tamano = excluded.tamano, "
+                "guardado = excluded.guardado, ultimo_acceso = excluded.ultimo_acceso, cabeceras = excluded.cabeceras",
+                (clave or clave_url(url), url, comprimido, len(comprimido), guardado or ahora, ahora,
+                 json.dumps(dict(cabeceras)) if cabeceras else None))
+            self._desalojar(conexion, ahora)
+            conexion.execute("COMMIT")
+        except BaseException:
+            conexion.execute("ROLLBACK")
+            raise
+
+    def _total_bytes(self, conexion):
+        return conexion.execute("SELECT valor FROM totales WHERE nombre = 'bytes'").fetchone()[0]
+
+    def _desalojar(self, conexion, ahora):
+        # Se llama dentro de la transacción de escritura: nadie más modifica la tabla mientras tanto
+        if self.limite_bytes is None or self._total_bytes(conexion) <= self.limite_bytes:
+            return
+        if self.ttl is not None:
+            conexion.execute("DELETE FROM paginas WHERE guardado < ?", (ahora - self.ttl,))
+        sobrante = self._total_bytes(conexion) - int(self.limite_bytes * FRACCION_TRAS_DESALOJO)
+        if sobrante <= 0:
+            return
+        claves = []
+        for clave, tamano in conexion.execute("SELECT clave, tamano FROM paginas ORDER BY ultimo_acceso"):
+            claves.append((clave,))
+            sobrante -= tamano
+            if sobrante <= 0:
+                break
+        conexion.executemany("DELETE FROM paginas WHERE clave = ?", claves)
+
+    def iterar_paginas(self, limite=None):
+        """
+        Recorre las páginas guardadas, vigentes o no.
+
+        Args:
+            limite (int): Número máximo de páginas; None para todas
+
+        Yields:
+            tuple: (url, o la clave si la URL no se conoce; contenido en bytes)
+        """
+        consulta = "SELECT COALESCE(url, clave), contenido FROM paginas ORDER BY clave"
+        parametros = ()
+        if limite is not None:
+            consulta += " LIMIT ?"
+            parametros = (limite,)
+        for url, contenido in self._conexion().execute(consulta, parametros):
+            yield url, zlib.decompress(contenido)
+
+    def obtenido(self, url):
+        """
+        Marca de tiempo en que se obtuvo del servidor la copia guardada de una página.
+
+        Es la de la descarga o la de la última respuesta 304 que la renovó, no la de su lectura.
+        Si la página ya se desalojó, se usa la del resultado más reciente extraído de ella.
+
+        Args:
+            url (str): URL de la página
+
+        Returns:
+            float: Marca de tiempo, o None si no queda nada de esa URL en la caché
+        """
+        conexion = self._conexion()
+        fila = conexion.execute("SELECT guardado FROM paginas WHERE clave = ?", (clave_url(url),)).fetchone()
+        if fila is None:
+            fila = conexion.execute("SELECT MAX(guardado) FROM resultados WHERE clave = ?", (url,)).fetchone()
+        return fila[0]
+
+    def leer_resultado(self, clave, tipo, version):
+        """
+        Devuelve un resultado de extracción guardado (segundo nivel).
+
+        Args:
+            clave (str): Lo que identifica al resultado (p. ej. la URL de la que se extrajo)
+            tipo (str): Clase de resultado ('enlace', 'revista'...)
+            version (int): Versión del extractor; un resultado de otra versión no sirve
+
+        Returns:
+            tuple: (valor,) con el valor guardado (que puede ser None), o None si no hay resultado vigente
+        """
+        fila = self._conexion().execute("SELECT valor, version, guardado FROM resultados WHERE clave = ? AND tipo = ?",
+                                        (clave, tipo)).fetchone()
+        if fila is None or fila[1] != version or not self._vigente(fila[2], time.time()):
+            return None
+        return (json.loads(fila[0]),)
+
+    def leer_resultado_de_pagina(self, url, tipo, version):
+        """
+        Devuelve el resultado extraído de la copia guardada de una página, aunque haya caducado.
+
+        Sirve después de una respuesta 304: el resultado es válido si se extrajo de la copia
+        actual de la página (o se renovó con ella), es decir, si no es anterior a la página.
+
+        Returns:
+            tuple: (valor,) o None, como leer_resultado
+        """
+        fila = self._conexion().execute(
+            "SELECT r.valor FROM resultados r JOIN paginas p ON p.clave = ? "
+            "WHERE r.clave = ? AND r.tipo = ? AND r.version = ? AND r.guardado >= p.guardado",
+            (clave_url(url), url, tipo, version)).fetchone()
+        return None if fila is None else (json.loads(fila[0]),)
+
+    def guardar_resultado(self, clave, tipo, version, valor):
+        """
+        Guarda un resultado de extracción (segundo nivel).
+
+        Args:
+            clave (str): Lo que identifica al resultado
+            tipo (str): Clase de resultado
+            version (int): Versión del extractor que lo produjo
+            valor: Valor serializable a JSON (None incluido, p. ej. "no se encontró")
+        """
+        self._conexion().execute("INSERT OR REPLACE INTO resultados VALUES (?, ?, ?, ?, ?)",
+                                 (clave, tipo, version, json.dumps(valor, ensure_ascii=False), time.time()))
+
+    def purgar_caducadas(self):
+        """
+        Elimina las páginas y resultados caducados.
+
+        Returns:
+            int: Número de páginas y resultados eliminados
+        """
+        if self.ttl is None:
+            return 0
+        limite = time.time() - self.ttl
+        conexion = self._conexion()
+        eliminados = conexion.execute("DELETE FROM paginas WHERE guardado < ?", (limite,)).rowcount
+        return eliminados + conexion.execute("DELETE FROM resultados WHERE guardado < ?", (limite,)).rowcount
+
+    def purgar_resultados(self, version=None):
+        """
+        Elimina los resultados de extracción, o solo los de versiones distintas de la indicada.
+
+        Returns:
+            int: Número de resultados eliminados
+        """
+        if version is None:
+            return self._conexion().execute("DELETE FROM resultados").rowcount
+        return self._conexion().execute("DELETE FROM resultados WHERE version != ?", (version,)).rowcount
+
+    def estadisticas(self):
+        """Número de páginas, bytes comprimidos ocupados y número de resultados"""
+        conexion = self._conexion()
+        paginas = conexion.execute("SELECT COUNT(*) FROM paginas").fetchone()[0]
+        resultados = conexion.execute("SELECT COUNT(*) FROM resultados").fetchone()[0]
+        return {'paginas': paginas, 'bytes': self._total_bytes(conexion), 'resultados': resultados}
+
+    def migrar_carpeta(self, carpeta, borrar=False):
+        """
+        Copia a este almacén una carpeta de la caché anterior (archivos <md5>.html).
+
+        Los archivos no guardan la URL, pero su nombre es el mismo hash que usa clave_url,
+        así las páginas migradas se encuentran igual. Se conserva la fecha de modificación
+        del archivo como fecha de descarga.
+
+        Args:
+            carpeta (str): Carpeta de la caché anterior
+            borrar (bool): Borrar cada archivo después de migrarlo
+
+        Returns:
+            int: Número de páginas migradas
+        """
+        migradas = 0
+        for archivo in sorted(glob.glob(os.path.join(carpeta, "*.html"))):
+            with open(archivo, 'rb') as f:
+                datos = f.read()
+            clave = os.path.splitext(os.path.basename(archivo))[0]
+            self.guardar(None, datos, guardado=os.path.getmtime(archivo), clave=clave)
+            migradas += 1
+            if borrar:
+                os.remove(archivo)
+        return migradas
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+def abrir_cache(ruta=ARCHIVO_CACHE):
+    """
+    Devuelve el almacén de caché de una ruta, reutilizando el mismo objeto en todo el proceso.
+
+    Una ruta terminada en .sqlite o .db usa CacheSQLite; cualquier otra se trata como una
+    carpeta con el formato anterior (CacheArchivos).
+
+    Args:
+        ruta (str): Archivo SQLite o carpeta de caché
+
+    Returns:
+        CacheSQLite | CacheArchivos: Almacén de caché
+    """
+    with _caches_lock:
+        if ruta not in _caches:
+            if os.path.splitext(ruta)[1] in (".sqlite", ".db"):
+                _caches[ruta] = CacheSQLite(ruta)
+            else:
+                _caches[ruta] = CacheArchivos(ruta)
+        return _caches[ruta]
+
+def main():
+    parser = argparse.ArgumentParser(description="Administración de la caché de páginas del web scrapper")
+    parser.add_argument("--cache", default=ARCHIVO_CACHE, help="Archivo SQLite de la caché")
+    sub = parser.add_subparsers(dest="accion", required=True)
+    migrar = sub.add_parser("migrar", help="Migrar una carpeta de la caché anterior")
+    migrar.add_argument("carpeta", nargs="?", default="cache", help="Carpeta con los archivos .html")
+    migrar.add_argument("--borrar", action="store_true", help="Borrar los archivos ya migrados")
+    sub.add_parser("estadisticas", help="Mostrar páginas y bytes ocupados")
+    sub.add_parser("purgar", help="Eliminar las páginas y resultados caducados")
+    sub.add_parser("purgar-resultados", help="Eliminar los resultados extraídos (se vuelven a extraer de las páginas)")
+    args = parser.parse_args()
+
+    cache = CacheSQLite(args.cache)
+    if args.accion == "migrar":
+        inicio = time.perf_counter()
+        migradas = cache.migrar_carpeta(args.carpeta, args.borrar)
+        print(f"{migradas} páginas migradas en {time.perf_counter() - inicio:.2f} s")
+    elif args.accion == "purgar":
+        print(f"{cache.purgar_caducadas()} páginas y resultados caducados eliminados")
+    elif args.accion == "purgar-resultados":
+        print(f"{cache.purgar_resultados()} resultados eliminados")
+    estadisticas = cache.estadisticas()
+    print(f"Caché {args.cache}: {estadisticas['paginas']} páginas, {estadisticas['bytes'] / 1024 / 1024:.1f} MB, "
+          f"{estadisticas['resultados']} resultados")
+
+if __name__ == "__main__":
+    main()
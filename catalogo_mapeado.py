@@ -0,0 +1,273 @@
+'''Catálogo de SCIMAGO en un archivo de solo lectura mapeado en memoria.
+
+El archivo guarda los registros de las revistas (JSON compacto, uno tras otro) seguidos de un
+índice de títulos ordenados con la posición de cada registro. Al abrirlo no se lee nada: el
+sistema operativo trae del disco solo las páginas que se tocan, así comprobar si una revista
+está, leer un registro o recorrer un rango de títulos no analiza el catálogo completo, y el
+tiempo de apertura y la memoria no crecen con el número de revistas.
+
+Formato (enteros little-endian sin signo de 64 bits salvo la versión):
+    cabecera    MAGIA, versión (32 bits), n, inicio de los títulos, inicio de la tabla
+    registros   JSON UTF-8 de cada revista, en el orden en que se escribieron
+    títulos     títulos UTF-8 ordenados, concatenados
+    tabla       n + 1 inicios de título (relativos a los títulos) y n pares (inicio, fin) de registro'''
+import argparse
+import bisect
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+from collections.abc import Mapping
+import leer_csv
+
+MAGIA = b"RVSC"
+VERSION_FORMATO = 1
+EXTENSION = ".catalogo"
+CABECERA = struct.Struct("<4sIQQQ")
+ENTERO = struct.Struct("<Q")
+PAR = struct.Struct("<QQ")
+# Uno de cada tantos títulos se guarda en memoria para acotar la búsqueda binaria en el archivo
+PASO_MUESTRA = 64
+
+def es_catalogo_mapeado(ruta):
+    """Indica si una ruta usa este formato (por su extensión)"""
+    return os.path.splitext(ruta)[1].lower() == EXTENSION
+
+class CatalogoMapeado(Mapping):
+    """
+    Catálogo de solo lectura sobre un archivo mapeado en memoria.
+
+    Se usa como un diccionario {titulo: datos}: `titulo in catalogo`, `catalogo[titulo]`,
+    `catalogo.get(...)`, `len`. Las búsquedas son binarias sobre los títulos ordenados y solo
+    se decodifica el registro pedido. Al recorrerlo los títulos salen en orden.
+    """
+
+    def __init__(self, ruta):
+        """
+        Args:
+            ruta (str): Archivo del catálogo
+
+        Raises:
+            ValueError: Si el archivo no tiene este formato o es de otra versión
+        """
+        self.ruta = ruta
+        with open(ruta, 'rb') as f:
+            self.mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.mapa) < CABECERA.size:
+            self.mapa.close()
+            raise ValueError(f"{ruta} no es un catálogo mapeado")
+        magia, version, self.n, self.inicio_titulos, self.inicio_tabla = CABECERA.unpack_from(self.mapa)
+        if magia != MAGIA or version != VERSION_FORMATO:
+            self.mapa.close()
+            raise ValueError(f"{ruta} no es un catálogo mapeado de la versión {VERSION_FORMATO}")
+        self.inicio_registros = self.inicio_tabla + ENTERO.size * (self.n + 1)
+        self.muestra = None
+
+    def __len__(self):
+        return self.n
+
+    def _titulo(self, i):
+        """Título i (en orden) como bytes UTF-8"""
+        inicio, fin = PAR.unpack_from(self.mapa, self.inicio_tabla + ENTERO.size * i)
+        return self.mapa[self.inicio_titulos + inicio:self.inicio_titulos + fin]
+
+    def _posicion(self, titulo):
+        """Primera posición cuyo título es >= titulo (como bisect_left)"""
+        buscado = titulo.encode('utf-8')
+        if self.muestra is None:
+            # n / PASO_MUESTRA títulos: unos cientos para el catálogo completo
+            self.muestra = [self._titulo(i) for i in range(0, self.n, PASO_MUESTRA)]
+        # La búsqueda en la muestra (en C) deja un tramo de PASO_MUESTRA títulos
+        tramo = bisect.bisect_left(self.muestra, buscado)
+        bajo = max(0, (tramo - 1) * PASO_MUESTRA)
+        alto = min(self.n, tramo * PASO_MUESTRA)
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            if self._titulo(medio) < buscado:
+                bajo = medio + 1
+            else:
+                alto = medio
+        return bajo
+
+    def _indice(self, titulo):
+        """Posición del título, o None si no está"""
+        if not isinstance(titulo, str):
+            return None
+        i = self._posicion(titulo)
+        if i < self.n and self._titulo(i) == titulo.encode('utf-8'):
+            return i
+        return None
+
+    def _registro(self, i):
+        inicio, fin = PAR.unpack_from(self.mapa, self.inicio_registros + PAR.size * i)
+        return json.loads(self.mapa[inicio:fin])
+
+    def __contains__(self, titulo):
+        # No decodifica el registro, solo compara títulos
+        return self._indice(titulo) is not None
+
+    def __getitem__(self, titulo):
+        i = self._indice(titulo)
+        if i is None:
+            raise KeyError(titulo)
+        return self._registro(i)
+
+    def __iter__(self):
+        for i in range(self.n):
+            yield str(self._titulo(i), 'utf-8')
+
+    def items(self):
+        """Pares (titulo, datos) en orden de título, decodificando un registro cada vez"""
+        for i in range(self.n):
+            yield str(self._titulo(i), 'utf-8'), self._registro(i)
+
+    def rango(self, desde=None, hasta=None):
+        """
+        Recorre las revistas con desde <= titulo < hasta, en orden.
+
+        Args:
+            desde (str): Primer título (incluido); None para empezar por el primero
+            hasta (str): Título final (excluido); None para llegar al último
+
+        Yields:
+            tuple: Pares (titulo, datos)
+        """
+        i = 0 if desde is None else self._posicion(desde)
+        final = self.n if hasta is None else self._posicion(hasta)
+        for j in range(i, final):
+            yield str(self._titulo(j), 'utf-8'), self._registro(j)
+
+    def cerrar(self):
+        """Libera el mapeo (necesario en Windows antes de reemplazar el archivo)"""
+        if not self.mapa.closed:
+            self.mapa.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
+def guardar_catalogo(datos, ruta, abiertos=()):
+    """
+    Escribe un catálogo mapeado.
+
+    Los registros se escriben en flujo a medida que llegan; en memoria solo quedan los títulos
+    y las posiciones. Igual que guardar_como_json, se escribe en un archivo temporal que se
+    renombra al final.
+
+    Args:
+        datos (dict): Diccionario {titulo: datos}, o iterable de pares (titulo, datos); si un
+            título se repite, gana el último
+        ruta (str): Archivo del catálogo
+        abiertos (iterable): Catálogos mapeados abiertos sobre ruta, que se cierran justo antes
+            de reemplazarla (pueden ser el origen de datos)
+
+    Returns:
+        int: Número de revistas escritas
+    """
+    pares = datos.items() if isinstance(datos, Mapping) else datos
+    carpeta = os.path.dirname(os.path.abspath(ruta))
+    descriptor, temporal = tempfile.mkstemp(prefix=".tmp_", suffix=EXTENSION, dir=carpeta)
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            f.write(bytes(CABECERA.size))
+            posiciones = {}
+            posicion = CABECERA.size
+            for titulo, registro in pares:
+                contenido = json.dumps(registro, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+                f.write(contenido)
+                posiciones[titulo.encode('utf-8')] = (posicion, posicion + len(contenido))
+                posicion += len(contenido)
+
+            titulos = sorted(posiciones)
+            inicio_titulos = posicion
+            inicios = [0]
+            for titulo in titulos:
+                f.write(titulo)
+                inicios.append(inicios[-1] + len(titulo))
+            # La tabla queda alineada a 8 bytes
+            relleno = -(inicio_titulos + inicios[-1]) % ENTERO.size
+            f.write(bytes(relleno))
+            inicio_tabla = inicio_titulos + inicios[-1] + relleno
+            f.write(struct.pack(f"<{len(inicios)}Q", *inicios))
+            for titulo in titulos:
+                f.write(PAR.pack(*posiciones[titulo]))
+
+            f.seek(0)
+            f.write(CABECERA.pack(MAGIA, VERSION_FORMATO, len(titulos), inicio_titulos, inicio_tabla))
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temporal, 0o666 & ~leer_csv._UMASK)
+        for catalogo in abiertos:
+            catalogo.cerrar()
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.remove(temporal)
+        raise
+    return len(titulos)
+
+def medir(ruta_json, ruta_catalogo, titulos):
+    """
+    Compara cargar el JSON completo con abrir el catálogo mapeado y buscar en él.
+
+    Args:
+        ruta_json (str): Catálogo en JSON
+        ruta_catalogo (str): El mismo catálogo en formato mapeado
+        titulos (list): Títulos a comprobar (`titulo in catalogo`) y leer
+
+    Returns:
+        dict: Milisegundos de apertura y de búsqueda de cada variante
+    """
+    tiempos = {}
+    for nombre, abrir in (('json', lambda: dict(leer_csv.iterar_json(ruta_json))),
+                          ('mapeado', lambda: CatalogoMapeado(ruta_catalogo))):
+        inicio = time.perf_counter()
+        catalogo = abrir()
+        abierto = time.perf_counter()
+        for titulo in titulos:
+            if titulo in catalogo:
+                catalogo[titulo]
+        fin = time.perf_counter()
+        tiempos[nombre] = {'apertura_ms': (abierto - inicio) * 1000, 'busquedas_ms': (fin - abierto) * 1000}
+    return tiempos
+
+def main():
+    parser = argparse.ArgumentParser(description="Catálogo de SCIMAGO mapeado en memoria")
+    sub = parser.add_subparsers(dest="accion", required=True)
+    convertir = sub.add_parser("convertir", help="Convertir un catálogo JSON al formato mapeado")
+    convertir.add_argument("json", help="Catálogo JSON (o NDJSON)")
+    convertir.add_argument("catalogo", help=f"Archivo de salida (extensión {EXTENSION})")
+    consultar = sub.add_parser("consultar", help="Mostrar el registro de una revista")
+    consultar.add_argument("catalogo")
+    consultar.add_argument("titulo")
+    rango = sub.add_parser("rango", help="Listar los títulos entre dos valores")
+    rango.add_argument("catalogo")
+    rango.add_argument("desde", nargs="?")
+    rango.add_argument("hasta", nargs="?")
+    comparar = sub.add_parser("medir", help="Comparar el tiempo de carga del JSON y del catálogo mapeado")
+    comparar.add_argument("json")
+    comparar.add_argument("catalogo")
+    args = parser.parse_args()
+
+    if args.accion == "convertir":
+        print(f"{guardar_catalogo(leer_csv.iterar_json(args.json), args.catalogo)} revistas escritas en {args.catalogo}")
+    elif args.accion == "consultar":
+        with CatalogoMapeado(args.catalogo) as catalogo:
+            registro = catalogo.get(args.titulo)
+            print(json.dumps(registro, ensure_ascii=False, indent=2) if registro is not None else "No está en el catálogo")
+    elif args.accion == "rango":
+        with CatalogoMapeado(args.catalogo) as catalogo:
+            for titulo, _ in catalogo.rango(args.desde, args.hasta):
+                print(titulo)
+    else:
+        with CatalogoMapeado(args.catalogo) as catalogo:
+            titulos = list(catalogo)
+        for nombre, tiempos in medir(args.json, args.catalogo, titulos).items():
+            print(f"{nombre}: apertura {tiempos['apertura_ms']:.2f} ms, "
+                  f"{len(titulos)} búsquedas {tiempos['busquedas_ms']:.2f} ms")
+
+if __name__ == "__main__":
+    main()
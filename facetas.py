@@ -0,0 +1,337 @@
+'''Conteos por faceta de las revistas, precalculados con NumPy.
+
+Las facetas son las áreas y catálogos de revistas.json y, del catálogo de SCIMAGO, las áreas
+y categorías de "Subject Area and Category", las editoriales y los tipos de publicación. La
+pertenencia se guarda como matriz de incidencia dispersa (para cada valor, la lista ordenada
+de revistas que lo tienen) junto con el total de cada valor y la tabla de coocurrencia de
+cada par de facetas, en un archivo .npz que se genera con `facetas.py construir` después de
+generar revistas.json con leer_csv.py.
+
+Al cargarlo, cada valor se convierte en un conjunto de bits empaquetado (un bit por revista);
+un conteo filtrado ("editoriales de las revistas de SCOPUS en Medicine") es un AND de los
+conjuntos del filtro y un conteo de bits por fila, sin recorrer las revistas.'''
+import argparse
+import json
+import os
+import time
+import numpy as np
+import bitacora
+import indice_busqueda
+
+# Cambiar si cambia el formato del archivo guardado o la forma de obtener los valores
+VERSION_FACETAS = 1
+ARCHIVO_FACETAS = "facetas.npz"
+FACETAS = ("areas", "catalogos", "areas_scimago", "categorias", "editoriales", "tipos")
+
+if hasattr(np, "bitwise_count"):
+    def _contar_bits(bits):
+        return np.bitwise_count(bits).sum(axis=-1, dtype=np.int64)
+else:
+    # NumPy anterior a 2.0: bits encendidos de cada byte por tabla
+    _BITS_POR_BYTE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _contar_bits(bits):
+        return _BITS_POR_BYTE[np.ascontiguousarray(bits).view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
+def _lista(valor):
+    if not valor:
+        return []
+    return [valor] if isinstance(valor, str) else list(valor)
+
+def valores_de(info, datos):
+    """
+    Valores de cada faceta de una revista.
+
+    Args:
+        info (dict): Entrada de revistas.json ({"areas", "catalogos"}), o None
+        datos (dict): Registro del catálogo de SCIMAGO, o None
+
+    Returns:
+        dict: {faceta: [valores]}
+    """
+    info, datos = info or {}, datos or {}
+    areas_categorias = datos.get("Subject Area and Category") or {}
+    if not isinstance(areas_categorias, dict):
+        areas_categorias = {}
+    return {
+        "areas": _lista(info.get("areas")),
+        "catalogos": _lista(info.get("catalogos")),
+        "areas_scimago": list(areas_categorias),
+        "categorias": [categoria for categorias in areas_categorias.values() for categoria in _lista(categorias)],
+        "editoriales": _lista(datos.get("Publisher")),
+        "tipos": _lista(datos.get("Publication type")),
+    }
+
+def _conjuntos_de_bits(inicios, ids, palabras):
+    # Una fila por valor con un bit por revista (palabras de 64 bits)
+    bits = np.zeros((len(inicios) - 1, palabras), dtype=np.uint64)
+    filas = np.repeat(np.arange(len(inicios) - 1), np.diff(inicios))
+    np.bitwise_or.at(bits, (filas, ids >> 6), np.left_shift(np.uint64(1), (ids & 63).astype(np.uint64)))
+    return bits
+
+class Facetas:
+    """
+    Matriz de incidencia revistas × valores por faceta, con totales y coocurrencias precalculados.
+
+    Igual que el índice de búsqueda, las listas de revistas de cada valor van concatenadas en
+    un solo arreglo (ids) con sus posiciones de inicio (inicios).
+    """
+
+    def __init__(self, titulos, nombres, inicios, ids, coocurrencias):
+        """
+        Args:
+            titulos (list): Títulos en orden alfabético (su posición es el número de la revista)
+            nombres (dict): {faceta: [valores en orden alfabético]}
+            inicios (dict): {faceta: arreglo de inicios de cada valor en ids}
+            ids (dict): {faceta: números de revista de cada valor, concatenados}
+            coocurrencias (dict): {(faceta, otra): matriz valores × valores de otra}, solo para faceta < otra en FACETAS
+        """
+        self.titulos = titulos
+        self.nombres = nombres
+        self.posicion = {faceta: {nombre: i for i, nombre in enumerate(lista)} for faceta, lista in nombres.items()}
+        self.inicios = inicios
+        self.ids = ids
+        self.coocurrencias = coocurrencias
+        self.totales = {faceta: np.diff(inicios[faceta]) for faceta in FACETAS}
+        palabras = -(-len(titulos) // 64)
+        self.bits = {faceta: _conjuntos_de_bits(inicios[faceta], ids[faceta], palabras) for faceta in FACETAS}
+        # Las facetas de SCIMAGO solo tienen bits en las palabras de las revistas del catálogo:
+        # para contar basta con esas columnas
+        self.palabras = {faceta: np.flatnonzero(np.bitwise_or.reduce(self.bits[faceta], axis=0)) for faceta in FACETAS}
+        self.compactas = {faceta: self.bits[faceta][:, self.palabras[faceta]] for faceta in FACETAS}
+        # Revistas que existen (los bits de relleno de la última palabra quedan apagados)
+        self.todas = np.zeros(palabras, dtype=np.uint64)
+        completas, resto = divmod(len(titulos), 64)
+        self.todas[:completas] = np.uint64(2 ** 64 - 1)
+        if resto:
+            self.todas[completas] = np.uint64((1 << resto) - 1)
+
+    def __len__(self):
+        return len(self.titulos)
+
+    @classmethod
+    def construir(cls, revistas, catalogo=None):
+        """
+        Construye las facetas de las revistas de revistas.json y del catálogo de SCIMAGO.
+
+        Args:
+            revistas (dict): Diccionario con el formato de revistas.json
+            catalogo (Mapping): Catálogo de SCIMAGO {titulo: datos}; sin él solo hay áreas y catálogos
+
+        Returns:
+            Facetas: Facetas listas para contar
+        """
+        catalogo = catalogo or {}
+        titulos = sorted(set(revistas).union(catalogo))
+        apariciones = {faceta: {} for faceta in FACETAS}
+        # Recorrer en orden alfabético deja cada lista de revistas ya ordenada
+        for numero, titulo in enumerate(titulos):
+            for faceta, valores in valores_de(revistas.get(titulo), catalogo.get(titulo)).items():
+                for valor in dict.fromkeys(valores):
+                    apariciones[faceta].setdefault(valor, []).append(numero)
+
+        nombres, inicios, ids = {}, {}, {}
+        for faceta in FACETAS:
+            nombres[faceta] = sorted(apariciones[faceta])
+            tamanos = np.fromiter((len(apariciones[faceta][n]) for n in nombres[faceta]), dtype=np.int64,
+                                  count=len(nombres[faceta]))
+            inicios[faceta] = np.zeros(len(nombres[faceta]) + 1, dtype=np.int64)
+            np.cumsum(tamanos, out=inicios[faceta][1:])
+            ids[faceta] = np.fromiter((numero for n in nombres[faceta] for numero in apariciones[faceta][n]),
+                                      dtype=np.int64, count=int(inicios[faceta][-1]))
+        facetas = cls(titulos, nombres, inicios, ids, {})
+        facetas.coocurrencias = facetas._calcular_coocurrencias()
+        return facetas
+
+    def _calcular_coocurrencias(self):
+        coocurrencias = {}
+        for i, faceta in enumerate(FACETAS):
+            for otra in FACETAS[i + 1:]:
+                tabla = np.zeros((len(self.nombres[faceta]), len(self.nombres[otra])), dtype=np.int32)
+                for fila, bits in enumerate(self.bits[faceta]):
+                    tabla[fila] = _contar_bits(self.bits[otra] & bits)
+                coocurrencias[faceta, otra] = tabla
+        return coocurrencias
+
+    def guardar(self, ruta):
+        """
+        Guarda las facetas en un archivo .npz sin comprimir (carga rápida).
+
+        Los conjuntos de bits no se guardan: se rehacen al cargar a partir de las listas.
+
+        Args:
+            ruta (str): Ruta del archivo
+        """
+        arreglos = {"version": np.array(VERSION_FACETAS), "titulos": indice_busqueda.unir_cadenas(self.titulos)}
+        for faceta in FACETAS:
+            arreglos[f"nombres_{faceta}"] = indice_busqueda.unir_cadenas(self.nombres[faceta])
+            arreglos[f"inicios_{faceta}"] = self.inicios[faceta]
+            arreglos[f"ids_{faceta}"] = self.ids[faceta].astype(np.int32)
+        for (faceta, otra), tabla in self.coocurrencias.items():
+            arreglos[f"coocurrencia_{faceta}_{otra}"] = tabla
+        with open(ruta, "wb") as f:
+            np.savez(f, **arreglos)
+
+    @classmethod
+    def cargar(cls, ruta):
+        """
+        Carga las facetas guardadas con guardar.
+
+        Args:
+            ruta (str): Ruta del archivo
+
+        Returns:
+            Facetas: Facetas listas para contar
+
+        Raises:
+            ValueError: Si el archivo es de otra versión
+        """
+        with np.load(ruta, allow_pickle=False) as datos:
+            if int(datos["version"]) != VERSION_FACETAS:
+                raise ValueError(f"Las facetas de {ruta} son de otra versión; vuelve a generarlas")
+            nombres = {faceta: indice_busqueda.separar_cadenas(datos[f"nombres_{faceta}"]) for faceta in FACETAS}
+            inicios = {faceta: datos[f"inicios_{faceta}"] for faceta in FACETAS}
+            ids = {faceta: datos[f"ids_{faceta}"].astype(np.int64) for faceta in FACETAS}
+            coocurrencias = {(faceta, otra): datos[f"coocurrencia_{faceta}_{otra}"]
+                             for i, faceta in enumerate(FACETAS) for otra in FACETAS[i + 1:]}
+            return cls(indice_busqueda.separar_cadenas(datos["titulos"]), nombres, inicios, ids, coocurrencias)
+
+    def miembros(self, faceta):
+        """Número de pares (revista, valor) de una faceta; entre el número de revistas da el promedio por revista"""
+        return len(self.ids[faceta])
+
+    def coocurrencia(self, faceta, otra):
+        """
+        Tabla de revistas que tienen a la vez cada valor de faceta y cada valor de otra.
+
+        Returns:
+            numpy.ndarray: Matriz len(nombres[faceta]) × len(nombres[otra])
+
+        Raises:
+            KeyError: Si las dos facetas son la misma o no existen
+        """
+        if (faceta, otra) in self.coocurrencias:
+            return self.coocurrencias[faceta, otra]
+        return self.coocurrencias[otra, faceta].T
+
+    def mascara(self, filtros):
+        """
+        Conjunto de bits de las revistas que tienen todos los valores del filtro.
+
+        Args:
+            filtros (dict): {faceta: [valores]}
+
+        Returns:
+            numpy.ndarray: Palabras de 64 bits, un bit por revista
+
+        Raises:
+            KeyError: Si alguna faceta o valor no existe
+        """
+        mascara = self.todas.copy()
+        for faceta, valores in filtros.items():
+            for valor in valores:
+                mascara &= self.bits[faceta][self.posicion[faceta][valor]]
+        return mascara
+
+    def contar(self, faceta, filtros=None):
+        """
+        Revistas por valor de una faceta, entre las que cumplen un filtro.
+
+        Sin filtro se usan los totales y con un solo valor de otra faceta la tabla de
+        coocurrencia; en los demás casos se intersectan los conjuntos de bits.
+
+        Por ejemplo, editoriales de las revistas de SCOPUS del área Medicine:
+        contar("editoriales", {"catalogos": ["SCOPUS_RADGRIDEXPORT"], "areas_scimago": ["Medicine"]})
+
+        Args:
+            faceta (str): Faceta a contar
+            filtros (dict): {faceta: [valores]} que deben tener todas las revistas contadas
+
+        Returns:
+            dict: {valor: revistas}, de mayor a menor y sin los valores con 0
+
+        Raises:
+            KeyError: Si alguna faceta o valor no existe
+        """
+        pares = [(otra, valor) for otra, valores in (filtros or {}).items() for valor in valores]
+        if not pares:
+            cuentas = self.totales[faceta]
+        elif len(pares) == 1 and pares[0][0] != faceta:
+            otra, valor = pares[0]
+            cuentas = self.coocurrencia(otra, faceta)[self.posicion[otra][valor]]
+        else:
+            mascara = self.mascara(filtros)[self.palabras[faceta]]
+            # Los filtros suelen dejar pocas palabras con bits encendidos: solo se cuentan esas
+            activas = np.flatnonzero(mascara)
+            if len(activas) < len(mascara) // 2:
+                cuentas = _contar_bits(self.compactas[faceta][:, activas] & mascara[activas])
+            else:
+                cuentas = _contar_bits(self.compactas[faceta] & mascara)
+        orden = np.argsort(-cuentas, kind="stable")
+        orden = orden[cuentas[orden] > 0]
+        nombres = self.nombres[faceta]
+        return {nombres[i]: int(cuentas[i]) for i in orden.tolist()}
+
+    def total(self, filtros=None):
+        """Número de revistas que cumplen un filtro"""
+        return int(_contar_bits(self.mascara(filtros or {})))
+
+    def revistas(self, filtros):
+        """Títulos de las revistas que cumplen un filtro, en orden alfabético"""
+        bits = np.unpackbits(self.mascara(filtros).astype("<u8").view(np.uint8), bitorder="little")[:len(self.titulos)]
+        return [self.titulos[i] for i in np.flatnonzero(bits).tolist()]
+
+def catalogo_si_existe(ruta):
+    """Catálogo de SCIMAGO (JSON o mapeado) para las facetas; vacío si no existe"""
+    return bitacora.cargar_catalogo(ruta) if ruta and os.path.exists(ruta) else {}
+
+def leer_filtros(textos):
+    """Convierte ["catalogos=SCOPUS_RADGRIDEXPORT", ...] en {faceta: [valores]}"""
+    filtros = {}
+    for texto in textos or ():
+        faceta, _, valor = texto.partition("=")
+        filtros.setdefault(faceta, []).append(valor)
+    return filtros
+
+def main():
+    parser = argparse.ArgumentParser(description="Conteos por faceta de las revistas")
+    parser.add_argument("--facetas", default=ARCHIVO_FACETAS, help="Archivo de las facetas")
+    sub = parser.add_subparsers(dest="accion", required=True)
+    construir = sub.add_parser("construir", help="Generar el archivo de facetas")
+    construir.add_argument("--revistas", default="revistas.json", help="JSON generado por leer_csv.py")
+    construir.add_argument("--catalogo", default="revistas_scimago.json",
+                           help="Catálogo de SCIMAGO: JSON o catálogo mapeado (.catalogo)")
+    contar = sub.add_parser("contar", help="Contar las revistas por valor de una faceta")
+    contar.add_argument("faceta", choices=FACETAS, help="Faceta a contar")
+    contar.add_argument("--filtro", action="append", metavar="FACETA=VALOR",
+                        help="Valor que deben tener las revistas (se puede repetir)")
+    contar.add_argument("--limite", type=int, default=20, help="Valores a mostrar")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    if args.accion == "construir":
+        with open(args.revistas, 'r', encoding='utf-8') as f:
+            revistas = json.load(f)
+        facetas = Facetas.construir(revistas, catalogo_si_existe(args.catalogo))
+        facetas.guardar(args.facetas)
+        print(f"Facetas de {len(facetas)} revistas construidas en {time.perf_counter() - inicio:.3f} s "
+              f"({os.path.getsize(args.facetas) / 1024:.0f} KB)")
+        for faceta in FACETAS:
+            print(f"- {faceta}: {len(facetas.nombres[faceta])} valores")
+        return
+
+    facetas = Facetas.cargar(args.facetas)
+    print(f"Facetas de {len(facetas)} revistas cargadas en {time.perf_counter() - inicio:.3f} s")
+    filtros = leer_filtros(args.filtro)
+    inicio = time.perf_counter()
+    try:
+        cuentas = facetas.contar(args.faceta, filtros)
+        total = facetas.total(filtros)
+    except KeyError as e:
+        print(f"No existe el valor o la faceta {e}")
+        return
+    print(f"Conteo en {(time.perf_counter() - inicio) * 1000:.3f} ms; {total} revistas cumplen el filtro")
+    print(json.dumps(dict(list(cuentas.items())[:args.limite]), ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+'''Importación del ranking de SCIMAGO descargado (scimagojr AAAA.csv) sin hacer scraping.
+
+El CSV de "Download data" de SCIMAGO ya trae casi todo lo que el scrapper extrae de cada
+página: identificador, tipo, ISSN, índice H, editorial, categorías y áreas. Este programa lo
+cruza con revistas.json por título normalizado (y por identificador o ISSN cuando ya se
+conocen) y genera registros con la misma forma que los del scrapper. Lo que el CSV no trae
+(la página web de la revista, o las áreas de una categoría desconocida) lo completa después
+el scrapper con --completar.'''
+import argparse
+import csv
+import json
+import re
+import time
+import leer_csv
+import resolucion
+import bitacora
+import catalogo_mapeado
+
+URL_SCIMAGO = "https://www.scimagojr.com/"
+# Tipo del CSV -> texto de la página de la revista
+TIPOS_PUBLICACION = {
+    'journal': 'Journals',
+    'book series': 'Book Series',
+    'conference and proceedings': 'Conferences and Proceedings',
+    'trade journal': 'Trade Journals',
+}
+
+def leer_exportacion(ruta):
+    """
+    Recorre las filas del CSV de SCIMAGO (separado por ';').
+
+    Args:
+        ruta (str): Archivo CSV
+
+    Yields:
+        dict: Fila con los nombres de columna del CSV
+    """
+    with open(ruta, 'r', encoding=leer_csv.detectar_codificacion(ruta), newline='') as f:
+        for fila in csv.DictReader(f, delimiter=';'):
+            # Un BOM no detectado queda pegado al nombre de la primera columna
+            yield {clave.lstrip('﻿').strip(): (valor or '').strip() for clave, valor in fila.items() if clave}
+
+def separar_categorias(texto):
+    """Categorías de la columna Categories sin el cuartil ('Oncology (Q1); Hematology (Q2)')"""
+    return [re.sub(r'\s*\(Q[1-4]\)$', '', parte.strip()) for parte in texto.split(';') if parte.strip()]
+
+def areas_de_fila(fila):
+    """Áreas de la columna Areas de una fila"""
+    return [area.strip() for area in fila.get("Areas", "").split(';') if area.strip()]
+
+def areas_de_categorias(filas, catalogo):
+    """
+    Aprende a qué área pertenece cada categoría.
+
+    El CSV trae las categorías y las áreas por separado; cuando una revista tiene varias
+    áreas hace falta saber de cuál es cada categoría. Se toma de las filas con una sola área
+    y de los registros ya obtenidos con el scrapper.
+
+    Args:
+        filas (iterable): Filas de leer_exportacion
+        catalogo (Mapping): Catálogo {titulo: datos}
+
+    Returns:
+        dict: Categoría -> área (solo las que aparecen siempre en la misma área)
+    """
+    areas = {}
+    for fila in filas:
+        areas_fila = areas_de_fila(fila)
+        if len(areas_fila) == 1:
+            for categoria in separar_categorias(fila.get("Categories", "")):
+                areas.setdefault(categoria, set()).add(areas_fila[0])
+    for datos in catalogo.values():
+        for area, categorias in datos.get("Subject Area and Category", {}).items():
+            for categoria in categorias:
+                areas.setdefault(categoria, set()).add(area)
+    return {categoria: next(iter(conjunto)) for categoria, conjunto in areas.items() if len(conjunto) == 1}
+
+def agrupar_categorias(categorias, areas, area_de):
+    """
+    Arma el campo "Subject Area and Category" ({area: [categorias]}, ordenado como en la página).
+
+    Returns:
+        dict: Áreas con sus categorías, o None si alguna categoría no se puede asignar a un área
+    """
+    if not areas:
+        return None
+    grupos = {area: [] for area in areas}
+    for categoria in categorias:
+        area = areas[0] if len(areas) == 1 else area_de.get(categoria)
+        if area not in grupos:
+            return None
+        grupos[area].append(categoria)
+    return {area: sorted(grupos[area]) for area in sorted(grupos)}
+
+def widget(id_scimago):
+    """Campo "Widget" de una revista, igual al que muestra su página"""
+    imagen = f"{URL_SCIMAGO}journal_img.php?id={id_scimago}"
+    return {
+        "Imagen": imagen,
+        "HTML Code": f'<a href="{URL_SCIMAGO}journalsearch.php?q={id_scimago}&amp;tip=sid&amp;exact=no" '
+                     f'title="SCImago Journal &amp; Country Rank"><img border="0" src="{imagen}" '
+                     f'alt="SCImago Journal &amp; Country Rank"  /></a>',
+    }
+
+def registro_de_fila(fila, area_de):
+    """
+    Convierte una fila del CSV en un registro con la forma de extraer_datos_de_soup.
+
+    Args:
+        fila (dict): Fila de leer_exportacion
+        area_de (dict): Categoría -> área (areas_de_categorias)
+
+    Returns:
+        dict: Registro; sin "Subject Area and Category" si las categorías no se pudieron agrupar
+    """
+    registro = {}
+    grupos = agrupar_categorias(separar_categorias(fila.get("Categories", "")), areas_de_fila(fila), area_de)
+    if grupos is not None:
+        registro["Subject Area and Category"] = grupos
+    registro["Publisher"] = [fila["Publisher"]] if fila.get("Publisher") else []
+    registro["H-Index"] = fila.get("H index", "")
+    tipo = fila.get("Type", "")
+    registro["Publication type"] = [TIPOS_PUBLICACION.get(tipo.lower(), tipo.title())] if tipo else []
+    registro["ISSN"] = ", ".join(sorted(resolucion.separar_issn(fila.get("Issn"))))
+    registro["Widget"] = widget(fila["Sourceid"])
+    return registro
+
+def importar(filas, titulos, catalogo=None, mapa=None):
+    """
+    Cruza las filas del CSV con los títulos de revistas.json.
+
+    Cada título se busca por su forma normalizada (leer_csv.plegar_texto); si no coincide, por el
+    identificador de SCIMAGO que ya tenga en la tabla de resolución, y después por los ISSN de su
+    registro en el catálogo.
+
+    Args:
+        filas (iterable): Filas de leer_exportacion
+        titulos (iterable): Títulos de revistas.json
+        catalogo (Mapping): Catálogo existente (ISSN conocidos y áreas de las categorías)
+        mapa (MapaResoluciones): Tabla de resolución; si se da, se registran las revistas importadas
+
+    Returns:
+        tuple: ({titulo: registro}, {forma de coincidencia: número de títulos})
+    """
+    catalogo = catalogo if catalogo is not None else {}
+    filas = [fila for fila in filas if fila.get("Sourceid") and fila.get("Title")]
+    por_titulo, por_id, por_issn = {}, {}, {}
+    for fila in filas:
+        por_titulo.setdefault(leer_csv.plegar_texto(fila["Title"]), fila)
+        por_id[fila["Sourceid"]] = fila
+        for issn in resolucion.separar_issn(fila.get("Issn")):
+            por_issn.setdefault(issn, fila)
+
+    area_de = areas_de_categorias(filas, catalogo)
+    importados = {}
+    cuenta = {'titulo': 0, 'id': 0, 'issn': 0, 'sin_coincidencia': 0, 'sin_areas': 0}
+    for titulo in titulos:
+        forma = 'titulo'
+        fila = por_titulo.get(leer_csv.plegar_texto(titulo))
+        if fila is None and mapa is not None:
+            conocida = mapa.consultar(titulo)
+            if conocida and conocida[0] in por_id:
+                forma, fila = 'id', por_id[conocida[0]]
+        if fila is None and titulo in catalogo:
+            issn = [i for i in resolucion.separar_issn(catalogo[titulo].get("ISSN")) if i in por_issn]
+            if issn:
+                forma, fila = 'issn', por_issn[issn[0]]
+        if fila is None:
+            cuenta['sin_coincidencia'] += 1
+            continue
+        cuenta[forma] += 1
+        registro = registro_de_fila(fila, area_de)
+        if "Subject Area and Category" not in registro:
+            cuenta['sin_areas'] += 1
+        importados[titulo] = registro
+        if mapa is not None:
+            mapa.registrar(resolucion.enlace_de_id(fila["Sourceid"]), titulo, resolucion.separar_issn(fila.get("Issn")))
+    return importados, cuenta
+
+def completar_registros(importados, catalogo):
+    """
+    Combina lo importado con el catálogo: lo que ya se obtuvo con el scrapper se conserva y
+    el CSV solo añade las revistas y los campos que faltan.
+
+    Returns:
+        dict: Registros a escribir en el catálogo {titulo: datos}
+    """
+    nuevos = {}
+    for titulo, registro in importados.items():
+        existente = catalogo.get(titulo)
+        if existente is None:
+            nuevos[titulo] = registro
+        elif any(campo not in existente for campo in registro):
+            nuevos[titulo] = {**registro, **existente}
+    return nuevos
+
+def verificar(importados, referencia):
+    """
+    Compara los registros importados con los obtenidos por el scrapper, campo por campo.
+
+    Args:
+        importados (dict): Registros de importar
+        referencia (Mapping): Catálogo obtenido con el scrapper
+
+    Returns:
+        tuple: (número de revistas comparadas, lista de (titulo, campo) distintos)
+    """
+    comparadas = 0
+    diferencias = []
+    for titulo, registro in importados.items():
+        if titulo not in referencia:
+            continue
+        comparadas += 1
+        esperado = referencia[titulo]
+        diferencias.extend((titulo, campo) for campo, valor in registro.items() if esperado.get(campo) != valor)
+    return comparadas, diferencias
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa el CSV de rankings de SCIMAGO sin hacer scraping")
+    parser.add_argument("exportacion", help="CSV descargado de SCIMAGO (scimagojr AAAA.csv)")
+    parser.add_argument("--revistas", default="revistas.json", help="JSON con las revistas a buscar")
+    parser.add_argument("--salida", default=bitacora.ARCHIVO_CATALOGO,
+                        help=f"Catálogo: JSON o catálogo mapeado ({catalogo_mapeado.EXTENSION})")
+    parser.add_argument("--verificar", metavar="CATALOGO",
+                        help="En lugar de escribir, comparar lo importado con un catálogo obtenido con el scrapper")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    with open(args.revistas, 'r', encoding='utf-8') as f:
+        titulos = list(json.load(f))
+    if args.verificar:
+        referencia = dict(leer_csv.iterar_json(args.verificar))
+        importados, cuenta = importar(leer_exportacion(args.exportacion), titulos, referencia)
+        comparadas, diferencias = verificar(importados, referencia)
+        print(f"{len(importados)} revistas importadas de {len(titulos)} ({cuenta})")
+        print(f"Iguales al scrapper: {comparadas - len({t for t, _ in diferencias})}/{comparadas}")
+        for titulo, campo in diferencias:
+            print(f"  {titulo}: {campo}")
+        if diferencias:
+            exit(1)
+        return
+
+    catalogo = bitacora.cargar_catalogo(args.salida)
+    importados, cuenta = importar(leer_exportacion(args.exportacion), titulos, catalogo, resolucion.abrir_mapa())
+    nuevos = completar_registros(importados, catalogo)
+    if nuevos:
+        bitacora.incorporar(nuevos, args.salida, catalogo)
+    print(f"{len(importados)} revistas encontradas en el CSV de {len(titulos)}: {cuenta}")
+    print(f"{len(nuevos)} revistas nuevas o completadas en {args.salida} ({time.perf_counter() - inicio:.2f} s)")
+    print("La página web (Homepage) no viene en el CSV: se completa con web_scrapper_mejorado.py --completar")
+
+if __name__ == "__main__":
+    main()
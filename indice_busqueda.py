@@ -0,0 +1,233 @@
+'''Índice de búsqueda de títulos de revistas tolerante a acentos, puntuación y errores de escritura.
+
+Se construye a partir de revistas.json y revistas_scimago.json, se guarda en un archivo .npz
+y se carga en milisegundos en lugar de reconstruirse en cada inicio.'''
+import argparse
+import json
+import time
+import numpy as np
+import leer_csv
+
+# Cambiar si cambia el formato del archivo guardado o la forma de plegar los títulos
+VERSION_INDICE = 1
+TAMANO_NGRAMA = 3
+ARCHIVO_INDICE_BUSQUEDA = "indice_busqueda.npz"
+
+def ngramas(texto_plegado):
+    """
+    Obtiene los trigramas de un texto ya plegado, con un espacio de relleno en los extremos.
+
+    Args:
+        texto_plegado (str): Texto normalizado con leer_csv.plegar_texto
+
+    Returns:
+        set: Trigramas distintos del texto
+    """
+    relleno = f" {texto_plegado} "
+    return {relleno[i:i + TAMANO_NGRAMA] for i in range(len(relleno) - TAMANO_NGRAMA + 1)}
+
+def unir_cadenas(cadenas):
+    """Guarda una lista de cadenas (sin saltos de línea) en un arreglo de bytes UTF-8 para un .npz"""
+    return np.frombuffer("\n".join(cadenas).encode("utf-8"), dtype=np.uint8)
+
+def separar_cadenas(arreglo):
+    """Recupera la lista de cadenas guardada con unir_cadenas"""
+    texto = arreglo.tobytes().decode("utf-8")
+    return texto.split("\n") if texto else []
+
+class IndiceBusqueda:
+    """
+    Índice invertido de trigramas sobre los títulos plegados.
+
+    Las listas de apariciones se guardan concatenadas en un solo arreglo (ids) con sus
+    posiciones de inicio (inicios), de modo que cargar el índice no crea un objeto por entrada.
+    """
+
+    def __init__(self, titulos, plegados, ngramas_indice, inicios, ids, longitudes):
+        self.titulos = titulos
+        self.plegados = plegados
+        self.posicion_ngrama = {ngrama: i for i, ngrama in enumerate(ngramas_indice)}
+        self.ngramas = ngramas_indice
+        self.inicios = inicios
+        self.ids = ids
+        self.longitudes = longitudes
+
+    def __len__(self):
+        return len(self.titulos)
+
+    @classmethod
+    def construir(cls, titulos):
+        """
+        Construye el índice para una lista de títulos.
+
+        Args:
+            titulos (iterable): Títulos tal como aparecen en los JSON (claves)
+
+        Returns:
+            IndiceBusqueda: Índice listo para buscar
+        """
+        titulos = list(dict.fromkeys(titulos))
+        plegados = [leer_csv.plegar_texto(titulo) for titulo in titulos]
+
+        apariciones = {}
+        longitudes = np.zeros(len(titulos), dtype=np.int32)
+        for numero, plegado in enumerate(plegados):
+            propios = ngramas(plegado)
+            longitudes[numero] = len(propios)
+            for ngrama in propios:
+                apariciones.setdefault(ngrama, []).append(numero)
+
+        ngramas_indice = sorted(apariciones)
+        tamanos = np.fromiter((len(apariciones[n]) for n in ngramas_indice), dtype=np.int64, count=len(ngramas_indice))
+        inicios = np.zeros(len(ngramas_indice) + 1, dtype=np.int64)
+        np.cumsum(tamanos, out=inicios[1:])
+        ids = np.fromiter((numero for n in ngramas_indice for numero in apariciones[n]),
+                          dtype=np.int32, count=int(inicios[-1]))
+        return cls(titulos, plegados, ngramas_indice, inicios, ids, longitudes)
+
+    @classmethod
+    def desde_archivos(cls, rutas):
+        """
+        Construye el índice con los títulos de uno o varios JSON (revistas.json, revistas_scimago.json...).
+
+        Los archivos que no existan se omiten.
+
+        Args:
+            rutas (iterable): Rutas a los archivos JSON
+
+        Returns:
+            IndiceBusqueda: Índice con la unión de los títulos
+        """
+        titulos = []
+        for ruta in rutas:
+            try:
+                titulos.extend(titulo for titulo, _ in leer_csv.iterar_json(ruta))
+            except FileNotFoundError:
+                print(f"No se encontró {ruta}, se omite")
+        return cls.construir(titulos)
+
+    def guardar(self, ruta):
+        """
+        Guarda el índice en un archivo .npz sin comprimir (carga rápida).
+
+        Args:
+            ruta (str): Ruta del archivo
+        """
+        with open(ruta, "wb") as f:
+            np.savez(f, version=np.array(VERSION_INDICE), titulos=unir_cadenas(self.titulos),
+                     plegados=unir_cadenas(self.plegados), ngramas=unir_cadenas(self.ngramas),
+                     inicios=self.inicios, ids=self.ids, longitudes=self.longitudes)
+
+    @classmethod
+    def cargar(cls, ruta):
+        """
+        Carga un índice guardado con guardar.
+
+        Args:
+            ruta (str): Ruta del archivo
+
+        Returns:
+            IndiceBusqueda: Índice cargado
+
+        Raises:
+            ValueError: Si el archivo es de otra versión del índice
+        """
+        with np.load(ruta, allow_pickle=False) as datos:
+            if int(datos["version"]) != VERSION_INDICE:
+                raise ValueError(f"El índice {ruta} es de otra versión; vuelve a construirlo")
+            return cls(separar_cadenas(datos["titulos"]), separar_cadenas(datos["plegados"]), separar_cadenas(datos["ngramas"]),
+                       datos["inicios"], datos["ids"], datos["longitudes"])
+
+    def buscar(self, consulta, limite=10):
+        """
+        Busca títulos parecidos a la consulta, ordenados por relevancia.
+
+        La puntuación combina el coeficiente de Dice entre trigramas (tolera errores de
+        escritura) con un bono si la consulta aparece completa en el título o al inicio.
+
+        Args:
+            consulta (str): Texto a buscar
+            limite (int): Número máximo de resultados
+
+        Returns:
+            list: Tuplas (titulo, puntuacion) de mayor a menor puntuación
+        """
+        plegada = leer_csv.plegar_texto(consulta)
+        if not plegada or not self.titulos:
+            return []
+
+        propios = [self.posicion_ngrama[n] for n in ngramas(plegada) if n in self.posicion_ngrama]
+        if not propios:
+            return []
+
+        # Trigramas compartidos con cada título, contados de forma vectorizada
+        listas = [self.ids[self.inicios[i]:self.inicios[i + 1]] for i in propios]
+        comunes = np.bincount(np.concatenate(listas), minlength=len(self.titulos))
+
+        # Los candidatos son los que más trigramas comparten; sobre ellos se afina la puntuación
+        total_consulta = len(ngramas(plegada))
+        num_candidatos = min(len(self.titulos), max(limite * 20, 200))
+        candidatos = np.argpartition(-comunes, num_candidatos - 1)[:num_candidatos]
+        candidatos = candidatos[comunes[candidatos] > 0]
+        dice = 2.0 * comunes[candidatos] / (total_consulta + self.longitudes[candidatos])
+
+        resultados = []
+        for numero, puntuacion in zip(candidatos.tolist(), dice.tolist()):
+            plegado = self.plegados[numero]
+            if plegado == plegada:
+                puntuacion += 2.0
+            elif plegado.startswith(plegada):
+                puntuacion += 1.0
+            elif plegada in plegado:
+                puntuacion += 0.5
+            resultados.append((puntuacion, numero))
+
+        resultados.sort(key=lambda r: (-r[0], self.titulos[r[1]]))
+        return [(self.titulos[numero], round(puntuacion, 4)) for puntuacion, numero in resultados[:limite]]
+
+def cargar_o_construir(ruta_indice, fuentes):
+    """
+    Carga el índice guardado o lo construye (y lo guarda) si no existe o es de otra versión.
+
+    Args:
+        ruta_indice (str): Ruta del archivo .npz
+        fuentes (list): Archivos JSON de los que tomar los títulos si hay que construirlo
+
+    Returns:
+        IndiceBusqueda: Índice listo para buscar
+    """
+    try:
+        return IndiceBusqueda.cargar(ruta_indice)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Construyendo índice de búsqueda ({e})")
+    indice = IndiceBusqueda.desde_archivos(fuentes)
+    indice.guardar(ruta_indice)
+    return indice
+
+def main():
+    parser = argparse.ArgumentParser(description="Índice de búsqueda de títulos de revistas")
+    parser.add_argument("consulta", nargs="?", help="Texto a buscar")
+    parser.add_argument("--construir", action="store_true", help="Reconstruir el índice aunque ya exista")
+    parser.add_argument("--indice", default=ARCHIVO_INDICE_BUSQUEDA, help="Archivo del índice")
+    parser.add_argument("--fuentes", nargs="+", default=["revistas.json", "revistas_scimago.json"],
+                        help="Archivos JSON con los títulos")
+    parser.add_argument("--limite", type=int, default=10, help="Número de resultados")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    if args.construir:
+        indice = IndiceBusqueda.desde_archivos(args.fuentes)
+        indice.guardar(args.indice)
+        print(f"Índice construido con {len(indice)} títulos en {time.perf_counter() - inicio:.3f} s")
+    else:
+        indice = cargar_o_construir(args.indice, args.fuentes)
+        print(f"Índice cargado con {len(indice)} títulos en {time.perf_counter() - inicio:.3f} s")
+
+    if args.consulta:
+        inicio = time.perf_counter()
+        resultados = indice.buscar(args.consulta, args.limite)
+        print(f"Búsqueda en {(time.perf_counter() - inicio) * 1000:.2f} ms")
+        print(json.dumps(resultados, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,131 @@
 '''Programa para la lectura de archivos CVS y conventirlo en un archivo JSON'''
 import os
 import pandas as pd
+import numpy as np
 import json
 import glob
+import hashlib
+import re
+import unicodedata
+import tempfile
+import time
+import argparse
 import chardet
+from concurrent.futures import ProcessPoolExecutor
+
+# Manifiesto (dentro de la carpeta base) con la codificación conocida de cada archivo
+ARCHIVO_CACHE_CODIFICACIONES = ".codificaciones.json"
+# Cambiarla invalida las entradas del manifiesto elegidas con otra regla de detección
+VERSION_CODIFICACIONES = 2
+# Manifiesto de fuentes del modo incremental (junto a revistas.json)
+ARCHIVO_MANIFIESTO_REVISTAS = "revistas.manifiesto.json"
+# Índice invertido por catálogo y área (junto a revistas.json)
+ARCHIVO_INDICE_REVISTAS = "indice_revistas.json"
+# Revistas agrupadas por clave canónica, con las áreas y catálogos de todas sus variantes (junto a revistas.json)
+ARCHIVO_REVISTAS_CANONICAS = "revistas_canonicas.json"
+
+# Máscara de permisos del proceso, para que los JSON escritos vía archivo temporal tengan los permisos habituales
+_UMASK = os.umask(0)
+os.umask(_UMASK)
 
 def detectar_codificacion(archivo):
     """
     Detecta la codificación de un archivo.
     
+    Se analiza el archivo completo: con una muestra del inicio el detector puede elegir otra
+    codificación (p. ej. cp850 en lugar de cp857) y los títulos cambian.
+    
     Args:
         archivo (str): Ruta al archivo
     
     Returns:
         str: Codificación detectada
     """
+    detector = chardet.UniversalDetector()
     with open(archivo, 'rb') as f:
-        resultado = chardet.detect(f.read())
+        for bloque in iter(lambda: f.read(64 * 1024), b''):
+            detector.feed(bloque)
+            # El detector ya tiene una respuesta segura, no hace falta seguir leyendo
+            if detector.done:
+                break
+    resultado = detector.close()
     
     # Codificación detectada o utf-8 como respaldo
     return resultado['encoding'] or 'utf-8'
 
-def leer_csv_seguro(archivo):
+def cargar_cache_codificaciones(ruta):
+    """
+    Carga el manifiesto de codificaciones conocidas.
+    
+    Args:
+        ruta (str): Ruta al archivo del manifiesto
+    
+    Returns:
+        dict: Ruta absoluta de cada CSV -> {"tamano", "mtime", "codificacion"}
+    """
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def guardar_cache_codificaciones(cache, ruta):
+    """
+    Guarda el manifiesto de codificaciones conocidas.
+    
+    Args:
+        cache (dict): Manifiesto a guardar
+        ruta (str): Ruta al archivo del manifiesto
+    """
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+
+def codificacion_en_cache(cache, archivo):
+    """
+    Devuelve la codificación guardada para un archivo si no ha cambiado desde entonces.
+    
+    Args:
+        cache (dict): Manifiesto de codificaciones
+        archivo (str): Ruta al archivo CSV
+    
+    Returns:
+        str: Codificación conocida, o None si no hay entrada válida
+    """
+    entrada = cache.get(os.path.abspath(archivo))
+    if not entrada or entrada.get("version") != VERSION_CODIFICACIONES:
+        return None
+    estado = os.stat(archivo)
+    if entrada.get("tamano") != estado.st_size or entrada.get("mtime") != estado.st_mtime_ns:
+        return None
+    return entrada.get("codificacion")
+
+def registrar_codificacion(cache, archivo, codificacion):
+    """
+    Registra en el manifiesto la codificación con la que se leyó un archivo.
+    
+    Args:
+        cache (dict): Manifiesto de codificaciones
+        archivo (str): Ruta al archivo CSV
+        codificacion (str): Codificación usada
+    """
+    estado = os.stat(archivo)
+    cache[os.path.abspath(archivo)] = {
+        "tamano": estado.st_size,
+        "mtime": estado.st_mtime_ns,
+        "codificacion": codificacion,
+        "version": VERSION_CODIFICACIONES
+    }
+
+def leer_csv_seguro(archivo, cache_codificaciones=None):
     """
     Lee un archivo CSV probando diferentes codificaciones.
     
+    La codificación usada queda en df.attrs['codificacion'].
+    
     Args:
         archivo (str): Ruta al archivo CSV
+        cache_codificaciones (dict): Manifiesto de codificaciones conocidas; si el archivo no
+            ha cambiado se usa directamente su codificación, y se actualiza tras la lectura
     
     Returns:
         pandas.DataFrame: DataFrame con los datos del CSV, o None si falla
@@ -34,22 +133,35 @@ def leer_csv_seguro(archivo):
     # Lista de codificaciones a probar, en orden de preferencia
     codificaciones = ['utf-8', 'latin1', 'ISO-8859-1', 'cp1252', 'windows-1252']
     
-    # Intentar detectar automáticamente la codificación
-    try:
-        codificacion_detectada = detectar_codificacion(archivo)
-        if codificacion_detectada and codificacion_detectada.lower() not in [c.lower() for c in codificaciones]:
-            # Añadir la codificación detectada al principio de la lista
-            codificaciones.insert(0, codificacion_detectada)
-    except Exception as e:
-        print(f"Error al detectar codificación: {e}")
+    codificacion_conocida = None
+    if cache_codificaciones is not None:
+        codificacion_conocida = codificacion_en_cache(cache_codificaciones, archivo)
+    if codificacion_conocida:
+        # Archivo sin cambios: se lee una sola vez con la codificación que funcionó la última vez
+        codificaciones = [codificacion_conocida] + [c for c in codificaciones if c.lower() != codificacion_conocida.lower()]
     
     # Probar cada codificación
+    detectada = codificacion_conocida is not None
     for encoding in codificaciones:
         try:
             df = pd.read_csv(archivo, encoding=encoding)
             print(f"Archivo leído con codificación: {encoding} - {archivo}")
+            df.attrs['codificacion'] = encoding
+            if cache_codificaciones is not None:
+                registrar_codificacion(cache_codificaciones, archivo, encoding)
             return df
         except UnicodeDecodeError:
+            if detectada:
+                continue
+            # utf-8 no sirvió: se detecta la codificación (solo hace falta en este caso)
+            detectada = True
+            try:
+                codificacion_detectada = detectar_codificacion(archivo)
+                if codificacion_detectada.lower() not in [c.lower() for c in codificaciones]:
+                    # Probar la codificación detectada antes que el resto de la lista
+                    codificaciones.insert(codificaciones.index(encoding) + 1, codificacion_detectada)
+            except Exception as e:
+                print(f"Error al detectar codificación: {e}")
             continue
         except Exception as e:
             print(f"Error al leer {archivo} con codificación {encoding}: {e}")
@@ -58,15 +170,87 @@ def leer_csv_seguro(archivo):
     print(f"ERROR: No se pudo leer el archivo {archivo} con ninguna codificación probada")
     return None
 
-def crear_diccionario_revistas(carpeta_base):
+def plegar_texto(texto):
     """
-    Crea un diccionario de revistas leyendo archivos CSV de las subcarpetas 'areas' y 'catalogos'.
+    Normaliza un texto para búsquedas: sin acentos, en minúsculas y sin puntuación.
+    
+    Args:
+        texto (str): Texto a normalizar
+    
+    Returns:
+        str: Texto plegado, con las palabras separadas por un solo espacio
+    """
+    if texto.isascii():
+        # La mayoría de los títulos: no hay acentos que quitar
+        sin_acentos = texto
+    else:
+        descompuesto = unicodedata.normalize('NFKD', texto)
+        sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(re.sub(r'[\W_]+', ' ', sin_acentos.casefold()).split())
+
+def clave_canonica(titulo):
+    """
+    Clave que comparten las variantes de un mismo título en los distintos CSV.
+    
+    Además de lo que quita plegar_texto (acentos, mayúsculas, puntuación, espacios repetidos),
+    trata "&" como "and" y descarta un "the" inicial: "The Journal of X & Y" y
+    "journal of x and y." dan la misma clave.
+    
+    Args:
+        titulo (str): Título de la revista
+    
+    Returns:
+        str: Clave canónica
+    """
+    clave = plegar_texto(titulo.replace('&', ' and '))
+    return clave[4:] if clave.startswith('the ') else clave
+
+def agrupar_variantes(titulos):
+    """
+    Agrupa los títulos por clave canónica.
+    
+    Args:
+        titulos (iterable): Títulos de revistas
+    
+    Returns:
+        dict: {clave: [titulos en el orden en que aparecen]}
+    """
+    grupos = {}
+    for titulo in titulos:
+        grupos.setdefault(clave_canonica(titulo), []).append(titulo)
+    return grupos
+
+def crear_revistas_canonicas(revistas):
+    """
+    Une las variantes de cada revista conservando las áreas y catálogos de todas ellas.
+    
+    revistas.json no cambia (cada variante sigue con lo que aportaron sus CSV, lo que
+    necesita el modo incremental); esta vista es la que usa una revista por clave.
+    
+    Args:
+        revistas (dict): Diccionario con el formato de revistas.json
+    
+    Returns:
+        dict: {clave: {"titulos": [...], "areas": [...], "catalogos": [...]}}
+    """
+    canonicas = {}
+    for clave, titulos in agrupar_variantes(revistas).items():
+        entrada = {"titulos": titulos, "areas": [], "catalogos": []}
+        for titulo in titulos:
+            for tipo in ("areas", "catalogos"):
+                entrada[tipo].extend(nombre for nombre in revistas[titulo][tipo] if nombre not in entrada[tipo])
+        canonicas[clave] = entrada
+    return canonicas
+
+def listar_archivos_csv(carpeta_base):
+    """
+    Lista los archivos CSV de las subcarpetas 'areas' y 'catalogos' en el orden en que se procesan.
     
     Args:
         carpeta_base (str): Ruta a la carpeta base que contiene las subcarpetas 'areas' y 'catalogos'
     
     Returns:
-        dict: Diccionario con títulos de revistas como claves y diccionarios de áreas y catálogos como valores
+        list: Tuplas (tipo, nombre, archivo) donde tipo es 'areas' o 'catalogos'
     """
     # Verificar que la estructura de carpetas exista
     carpeta_areas = os.path.join(carpeta_base, 'areas')
@@ -75,8 +259,29 @@ def crear_diccionario_revistas(carpeta_base):
     if not os.path.isdir(carpeta_areas) or not os.path.isdir(carpeta_catalogos):
         raise ValueError(f"Las carpetas 'areas' y 'catalogos' deben existir dentro de {carpeta_base}")
     
+    fuentes = []
+    for tipo, carpeta in (('areas', carpeta_areas), ('catalogos', carpeta_catalogos)):
+        for archivo in glob.glob(os.path.join(carpeta, "*.csv")):
+            nombre = os.path.splitext(os.path.basename(archivo))[0].upper()
+            fuentes.append((tipo, nombre, archivo))
+    return fuentes
+
+def crear_diccionario_revistas(carpeta_base):
+    """
+    Crea un diccionario de revistas leyendo archivos CSV de las subcarpetas 'areas' y 'catalogos'.
+    
+    Args:
+        carpeta_base (str): Ruta a la carpeta base que contiene las subcarpetas 'areas' y 'catalogos'
+    
+    Returns:
+        dict: Diccionario con títulos de revistas como claves y diccionarios de áreas y catálogos como valores
+    """
+    fuentes = listar_archivos_csv(carpeta_base)
+    ruta_cache = os.path.join(carpeta_base, ARCHIVO_CACHE_CODIFICACIONES)
+    cache_codificaciones = cargar_cache_codificaciones(ruta_cache)
+    
     # Leer archivos CSV de áreas
-    archivos_areas = glob.glob(os.path.join(carpeta_areas, "*.csv"))
+    archivos_areas = [archivo for tipo, _, archivo in fuentes if tipo == 'areas']
     
     # Diccionario para almacenar la información de revistas
     revistas = {}
@@ -84,7 +289,7 @@ def crear_diccionario_revistas(carpeta_base):
     # Procesar archivos de áreas
     for archivo in archivos_areas:
         nombre_area = os.path.splitext(os.path.basename(archivo))[0].upper()
-        df = leer_csv_seguro(archivo)
+        df = leer_csv_seguro(archivo, cache_codificaciones)
         
         if df is not None and not df.empty:
             # Verificar que el DataFrame tenga al menos una columna
@@ -99,11 +304,11 @@ def crear_diccionario_revistas(carpeta_base):
                             revistas[titulo]["areas"].append(nombre_area)
     
     # Procesar archivos de catálogos
-    archivos_catalogos = glob.glob(os.path.join(carpeta_catalogos, "*.csv"))
+    archivos_catalogos = [archivo for tipo, _, archivo in fuentes if tipo == 'catalogos']
     
     for archivo in archivos_catalogos:
         nombre_catalogo = os.path.splitext(os.path.basename(archivo))[0].upper()
-        df = leer_csv_seguro(archivo)
+        df = leer_csv_seguro(archivo, cache_codificaciones)
         
         if df is not None and not df.empty:
             # Verificar que el DataFrame tenga al menos una columna
@@ -118,42 +323,459 @@ def crear_diccionario_revistas(carpeta_base):
                         if nombre_catalogo not in revistas[titulo]["catalogos"]:
                             revistas[titulo]["catalogos"].append(nombre_catalogo)
     
+    guardar_cache_codificaciones(cache_codificaciones, ruta_cache)
+    return revistas
+
+def leer_titulos_fuente(tipo, nombre, archivo, cache_codificaciones=None):
+    """
+    Lee un archivo CSV y devuelve sus títulos normalizados etiquetados con su fuente.
+    
+    Args:
+        tipo (str): 'areas' o 'catalogos'
+        nombre (str): Nombre del área o catálogo (nombre del archivo en mayúsculas)
+        archivo (str): Ruta al archivo CSV
+        cache_codificaciones (dict): Manifiesto de codificaciones conocidas
+    
+    Returns:
+        pandas.DataFrame: Columnas 'titulo', 'tipo' y 'fuente', en el orden del archivo.
+            La codificación usada queda en attrs['codificacion'].
+    """
+    df = leer_csv_seguro(archivo, cache_codificaciones)
+    
+    if df is None or df.empty or df.shape[1] == 0:
+        tabla = pd.DataFrame({'titulo': [], 'tipo': [], 'fuente': []}, dtype=object)
+    else:
+        # Misma normalización que crear_diccionario_revistas, aplicada a toda la columna
+        titulos = df.iloc[:, 0].astype(str).str.lower().str.strip()
+        titulos = titulos[titulos.notna() & (titulos != '')]
+        tabla = pd.DataFrame({'titulo': titulos.to_numpy(dtype=object), 'tipo': tipo, 'fuente': nombre})
+    
+    if df is not None:
+        tabla.attrs['codificacion'] = df.attrs.get('codificacion')
+    return tabla
+
+def crear_diccionario_revistas_paralelo(carpeta_base, max_trabajadores=None, tiempos=None):
+    """
+    Versión paralela de crear_diccionario_revistas: lee los CSV en varios procesos y
+    construye el diccionario con una sola agrupación en lugar de mutarlo fila por fila.
+    
+    El resultado es idéntico (mismo orden de claves y de listas) al de crear_diccionario_revistas.
+    
+    Args:
+        carpeta_base (str): Ruta a la carpeta base que contiene las subcarpetas 'areas' y 'catalogos'
+        max_trabajadores (int): Número de procesos lectores (por defecto, uno por núcleo)
+        tiempos (dict): Si se indica, se llena con la duración en segundos de cada fase
+    
+    Returns:
+        dict: Diccionario con títulos de revistas como claves y diccionarios de áreas y catálogos como valores
+    """
+    if tiempos is None:
+        tiempos = {}
+    inicio = time.perf_counter()
+    fuentes = listar_archivos_csv(carpeta_base)
+    ruta_cache = os.path.join(carpeta_base, ARCHIVO_CACHE_CODIFICACIONES)
+    cache_codificaciones = cargar_cache_codificaciones(ruta_cache)
+    
+    # Fase 1: lectura concurrente; map conserva el orden de las fuentes
+    tablas = []
+    if fuentes:
+        tipos, nombres, archivos = zip(*fuentes)
+        with ProcessPoolExecutor(max_workers=max_trabajadores) as executor:
+            tablas = list(executor.map(leer_titulos_fuente, tipos, nombres, archivos,
+                                       [cache_codificaciones] * len(fuentes)))
+    
+    # Cada proceso trabaja con su copia del manifiesto; se actualiza aquí con lo que reportaron
+    for (_, _, archivo), tabla in zip(fuentes, tablas):
+        if tabla.attrs.get('codificacion'):
+            registrar_codificacion(cache_codificaciones, archivo, tabla.attrs['codificacion'])
+    guardar_cache_codificaciones(cache_codificaciones, ruta_cache)
+    tiempos['lectura'] = time.perf_counter() - inicio
+    
+    # Fase 2: agrupar título -> fuentes, conservando el orden de primera aparición
+    marca = time.perf_counter()
+    revistas = {}
+    if tablas:
+        datos = pd.concat(tablas, ignore_index=True)
+        datos = datos.drop_duplicates(['titulo', 'tipo', 'fuente'])
+        
+        # Clave de grupo (título, tipo); factorize numera los títulos por orden de aparición
+        codigos, titulos = pd.factorize(datos['titulo'])
+        claves = codigos * 2 + (datos['tipo'].to_numpy() == 'catalogos')
+        orden = np.argsort(claves, kind='stable')
+        claves = claves[orden]
+        nombres = datos['fuente'].to_numpy()[orden].tolist()
+        
+        # Límites de cada grupo en el arreglo ordenado
+        cortes = (np.flatnonzero(np.diff(claves)) + 1).tolist()
+        inicios = [0] + cortes
+        fines = cortes + [len(claves)]
+        
+        titulos = titulos.tolist()
+        tipos = ('areas', 'catalogos')
+        revistas = {titulo: {"areas": [], "catalogos": []} for titulo in titulos}
+        for clave, i, j in zip(claves[inicios].tolist(), inicios, fines):
+            revistas[titulos[clave >> 1]][tipos[clave & 1]] = nombres[i:j]
+    tiempos['agrupacion'] = time.perf_counter() - marca
+    tiempos['total'] = time.perf_counter() - inicio
+    
     return revistas
 
-def guardar_como_json(datos:dict, nombre_archivo:str):
+def hash_archivo(archivo):
+    """
+    Calcula el hash SHA-256 del contenido de un archivo.
+    
+    Args:
+        archivo (str): Ruta al archivo
+    
+    Returns:
+        str: Hash en hexadecimal
+    """
+    h = hashlib.sha256()
+    with open(archivo, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+def cargar_manifiesto_revistas(ruta):
+    """
+    Carga el manifiesto de fuentes usado por el modo incremental.
+    
+    Args:
+        ruta (str): Ruta al archivo del manifiesto
+    
+    Returns:
+        dict: Manifiesto, o None si no existe o está dañado
+    """
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            manifiesto = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return manifiesto if isinstance(manifiesto.get("archivos"), dict) else None
+
+def guardar_manifiesto_revistas(manifiesto, ruta):
+    """
+    Guarda el manifiesto de fuentes usado por el modo incremental.
+    
+    Args:
+        manifiesto (dict): Manifiesto a guardar
+        ruta (str): Ruta al archivo del manifiesto
+    """
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False)
+
+def actualizar_revistas_incremental(carpeta_base, revistas=None, manifiesto=None):
+    """
+    Actualiza el diccionario de revistas procesando solo los CSV que cambiaron.
+    
+    El manifiesto guarda, por cada archivo fuente, su tamaño, fecha de modificación, hash
+    y los títulos que aportó. Un archivo nuevo o modificado se vuelve a leer y solo se
+    aplica la diferencia de títulos; un archivo eliminado retira su área o catálogo de
+    todas las revistas que listaba. Las revistas que se quedan sin áreas ni catálogos se eliminan.
+    
+    Sin diccionario o manifiesto previos, aplica todos los archivos sobre un diccionario
+    vacío, lo que da el mismo resultado que crear_diccionario_revistas.
+    
+    Args:
+        carpeta_base (str): Ruta a la carpeta base que contiene las subcarpetas 'areas' y 'catalogos'
+        revistas (dict): Diccionario de revistas existente (se modifica en el lugar)
+        manifiesto (dict): Manifiesto correspondiente a ese diccionario
+    
+    Returns:
+        tuple: (revistas, manifiesto actualizado, resumen con los contadores de cambios)
+    """
+    if revistas is None or manifiesto is None:
+        revistas, manifiesto = {}, {"archivos": {}}
+    anteriores = manifiesto["archivos"]
+    
+    fuentes = listar_archivos_csv(carpeta_base)
+    ruta_cache = os.path.join(carpeta_base, ARCHIVO_CACHE_CODIFICACIONES)
+    cache_codificaciones = cargar_cache_codificaciones(ruta_cache)
+    
+    # Posición de cada fuente, para que las listas queden en el mismo orden que en una reconstrucción
+    posicion = {(tipo, nombre): i for i, (tipo, nombre, _) in enumerate(fuentes)}
+    resumen = {'sin_cambios': 0, 'nuevos': 0, 'modificados': 0, 'eliminados': 0,
+               'titulos_agregados': 0, 'titulos_quitados': 0}
+    
+    def quitar(titulos, tipo, nombre):
+        for titulo in titulos:
+            info = revistas.get(titulo)
+            if info is None or nombre not in info[tipo]:
+                continue
+            info[tipo].remove(nombre)
+            if not info["areas"] and not info["catalogos"]:
+                del revistas[titulo]
+            resumen['titulos_quitados'] += 1
+    
+    def agregar(titulos, tipo, nombre):
+        for titulo in titulos:
+            if titulo not in revistas:
+                revistas[titulo] = {"areas": [], "catalogos": []}
+            lista = revistas[titulo][tipo]
+            if nombre not in lista:
+                lista.append(nombre)
+                lista.sort(key=lambda n: posicion.get((tipo, n), len(posicion)))
+            resumen['titulos_agregados'] += 1
+    
+    actuales = {}
+    for tipo, nombre, archivo in fuentes:
+        clave = os.path.relpath(archivo, carpeta_base)
+        estado = os.stat(archivo)
+        entrada = anteriores.get(clave)
+        
+        # Tamaño y fecha iguales: no hace falta ni calcular el hash
+        if entrada and entrada["tamano"] == estado.st_size and entrada["mtime"] == estado.st_mtime_ns:
+            actuales[clave] = entrada
+            resumen['sin_cambios'] += 1
+            continue
+        
+        hash_actual = hash_archivo(archivo)
+        if entrada and entrada["hash"] == hash_actual:
+            actuales[clave] = dict(entrada, tamano=estado.st_size, mtime=estado.st_mtime_ns)
+            resumen['sin_cambios'] += 1
+            continue
+        
+        # Archivo nuevo o modificado: solo se aplica la diferencia de títulos
+        tabla = leer_titulos_fuente(tipo, nombre, archivo, cache_codificaciones)
+        if tabla.attrs.get('codificacion'):
+            registrar_codificacion(cache_codificaciones, archivo, tabla.attrs['codificacion'])
+        titulos = pd.unique(tabla['titulo']).tolist()
+        
+        previos = set(entrada["titulos"]) if entrada else set()
+        nuevos = set(titulos)
+        quitar([t for t in entrada["titulos"] if t not in nuevos] if entrada else [], tipo, nombre)
+        agregar([t for t in titulos if t not in previos], tipo, nombre)
+        resumen['modificados' if entrada else 'nuevos'] += 1
+        
+        actuales[clave] = {"tipo": tipo, "nombre": nombre, "tamano": estado.st_size,
+                           "mtime": estado.st_mtime_ns, "hash": hash_actual, "titulos": titulos}
+    
+    # Archivos que ya no existen
+    for clave, entrada in anteriores.items():
+        if clave not in actuales:
+            quitar(entrada["titulos"], entrada["tipo"], entrada["nombre"])
+            resumen['eliminados'] += 1
+    
+    guardar_cache_codificaciones(cache_codificaciones, ruta_cache)
+    manifiesto["archivos"] = actuales
+    return revistas, manifiesto, resumen
+
+def crear_indice_invertido(revistas):
+    """
+    Crea un índice invertido por catálogo y por área para navegar sin recorrer todas las revistas.
+    
+    Los títulos se ordenan alfabéticamente y se numeran; cada catálogo y área guarda la lista
+    ordenada de números de sus revistas (lista de apariciones) y su total. Al estar ordenadas,
+    la intersección de dos listas (p. ej. "ING ∩ SCOPUS") se resuelve con un solo recorrido.
+    
+    Args:
+        revistas (dict): Diccionario con el formato de revistas.json
+    
+    Returns:
+        dict: {"titulos": [...], "catalogos": {nombre: {"total", "revistas"}}, "areas": {...}}
+    """
+    titulos = sorted(revistas)
+    indice = {"titulos": titulos, "catalogos": {}, "areas": {}}
+    
+    # Recorrer en orden alfabético deja cada lista de apariciones ya ordenada
+    for numero, titulo in enumerate(titulos):
+        info = revistas[titulo]
+        for tipo in ("catalogos", "areas"):
+            for nombre in info[tipo]:
+                indice[tipo].setdefault(nombre, {"total": 0, "revistas": []})["revistas"].append(numero)
+    
+    for tipo in ("catalogos", "areas"):
+        indice[tipo] = {nombre: {"total": len(entrada["revistas"]), "revistas": entrada["revistas"]}
+                        for nombre, entrada in sorted(indice[tipo].items())}
+    return indice
+
+def interseccion_ordenada(a, b):
+    """
+    Intersección de dos listas de apariciones ordenadas.
+    
+    Args:
+        a (list): Números de revista ordenados
+        b (list): Números de revista ordenados
+    
+    Returns:
+        list: Números presentes en ambas listas, ordenados
+    """
+    resultado = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        if a[i] == b[j]:
+            resultado.append(a[i])
+            i += 1
+            j += 1
+        elif a[i] < b[j]:
+            i += 1
+        else:
+            j += 1
+    return resultado
+
+def _pares(datos):
+    # Acepta un diccionario o cualquier iterable de pares (clave, valor)
+    return datos.items() if isinstance(datos, dict) else datos
+
+def formato_por_extension(nombre_archivo):
+    """
+    Elige el formato de salida según la extensión del archivo.
+    
+    Args:
+        nombre_archivo (str): Nombre del archivo
+    
+    Returns:
+        str: 'ndjson' para .ndjson/.jsonl, 'indentado' en otro caso
+    """
+    return 'ndjson' if os.path.splitext(nombre_archivo)[1].lower() in ('.ndjson', '.jsonl') else 'indentado'
+
+def escribir_json(pares, f, formato='indentado'):
+    """
+    Escribe registros (clave, valor) en un archivo abierto conforme se van produciendo.
+    
+    Nunca se arma el documento completo en memoria: solo se serializa un registro a la vez.
+    
+    Args:
+        pares (iterable): Pares (clave, valor)
+        f (file): Archivo de texto abierto para escritura
+        formato (str): 'indentado' (igual que json.dump con indent=2), 'compacto' (sin
+            espacios ni saltos de línea) o 'ndjson' (un objeto {clave: valor} por línea)
+    
+    Returns:
+        int: Número de registros escritos
+    """
+    if formato not in ('indentado', 'compacto', 'ndjson'):
+        raise ValueError(f"Formato de JSON no soportado: {formato}")
+    
+    escritos = 0
+    if formato == 'ndjson':
+        for clave, valor in pares:
+            f.write(json.dumps({clave: valor}, ensure_ascii=False))
+            f.write('\n')
+            escritos += 1
+        return escritos
+    
+    indentado = formato == 'indentado'
+    f.write('{')
+    for clave, valor in pares:
+        if indentado:
+            f.write(',\n  ' if escritos else '\n  ')
+            f.write(json.dumps(clave, ensure_ascii=False))
+            f.write(': ')
+            # Las cadenas JSON no tienen saltos de línea literales: basta con desplazar cada línea
+            f.write(json.dumps(valor, ensure_ascii=False, indent=2).replace('\n', '\n  '))
+        else:
+            if escritos:
+                f.write(',')
+            f.write(json.dumps(clave, ensure_ascii=False))
+            f.write(':')
+            f.write(json.dumps(valor, ensure_ascii=False, separators=(',', ':')))
+        escritos += 1
+    f.write('\n}' if indentado and escritos else '}')
+    return escritos
+
+def guardar_como_json(datos, nombre_archivo:str, formato=None):
     """
     Guarda un diccionario como archivo JSON.
     
+    La escritura es en flujo y atómica: se escribe en un archivo temporal en la misma carpeta
+    y se renombra al final, así una interrupción nunca deja el archivo a medias.
+    
     Args:
-        datos (dict): Diccionario a guardar
-        carpeta_destino (str): Carpeta donde se guardará el archivo JSON
+        datos (dict): Diccionario a guardar, o iterable de pares (clave, valor)
         nombre_archivo (str): Nombre del archivo JSON
+        formato (str): 'indentado', 'compacto' o 'ndjson'; por defecto según la extensión
     """
+    if formato is None:
+        formato = formato_por_extension(nombre_archivo)
     
-    # Guardar como JSON con formato legible
-    with open(nombre_archivo, 'w', encoding='utf-8') as f:
-        json.dump(datos, f, ensure_ascii=False, indent=2)
+    carpeta = os.path.dirname(os.path.abspath(nombre_archivo))
+    descriptor, temporal = tempfile.mkstemp(prefix=".tmp_", suffix=".json", dir=carpeta)
+    try:
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as f:
+            escribir_json(_pares(datos), f, formato)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temporal, 0o666 & ~_UMASK)
+        os.replace(temporal, nombre_archivo)
+    except BaseException:
+        os.remove(temporal)
+        raise
     
     print("Archivo JSON guardado exitosamente!")
 
+def iterar_json(nombre_archivo):
+    """
+    Recorre los registros (clave, valor) de un archivo guardado con guardar_como_json.
+    
+    Los archivos NDJSON se leen línea por línea; los demás se cargan completos.
+    
+    Args:
+        nombre_archivo (str): Nombre del archivo
+    
+    Yields:
+        tuple: Pares (clave, valor)
+    """
+    if formato_por_extension(nombre_archivo) == 'ndjson':
+        with open(nombre_archivo, 'r', encoding='utf-8') as f:
+            for linea in f:
+                if linea.strip():
+                    yield from json.loads(linea).items()
+    else:
+        with open(nombre_archivo, 'r', encoding='utf-8') as f:
+            yield from json.load(f).items()
+
 def main():
+    parser = argparse.ArgumentParser(description="Genera revistas.json a partir de los CSV de áreas y catálogos")
     # Carpeta base donde se encuentran las subcarpetas 'areas' y 'catalogos'
-    carpeta_base = "datos\csv"
+    parser.add_argument("--carpeta", default=os.path.join("datos", "csv"),
+                        help="Carpeta con las subcarpetas 'areas' y 'catalogos'")
+    parser.add_argument("--modo", choices=["secuencial", "paralelo", "incremental"], default="secuencial",
+                        help="secuencial (original), paralelo (lectura en varios procesos y agrupación vectorizada) "
+                             "o incremental (solo procesa los CSV que cambiaron desde la última ejecución)")
+    parser.add_argument("--trabajadores", type=int, default=None,
+                        help="Procesos lectores en modo paralelo (por defecto, uno por núcleo)")
+    parser.add_argument("--salida", default="revistas.json",
+                        help="Archivo JSON a generar (en modo incremental también se lee)")
+    args = parser.parse_args()
+    
+    carpeta_base = args.carpeta
+    ruta_manifiesto = os.path.join(os.path.dirname(args.salida), ARCHIVO_MANIFIESTO_REVISTAS)
+    ruta_indice = os.path.join(os.path.dirname(args.salida), ARCHIVO_INDICE_REVISTAS)
+    ruta_canonicas = os.path.join(os.path.dirname(args.salida), ARCHIVO_REVISTAS_CANONICAS)
+    manifiesto = None
+    tiempos = {}
     try:
         # Crear el diccionario de revistas
         print("Procesando archivos CSV...")
-        revistas = crear_diccionario_revistas(carpeta_base)
+        if args.modo == "paralelo":
+            revistas = crear_diccionario_revistas_paralelo(carpeta_base, args.trabajadores, tiempos)
+        elif args.modo == "incremental":
+            inicio = time.perf_counter()
+            manifiesto = cargar_manifiesto_revistas(ruta_manifiesto)
+            revistas_previas = None
+            if manifiesto is not None and os.path.exists(args.salida):
+                with open(args.salida, 'r', encoding='utf-8') as f:
+                    revistas_previas = json.load(f)
+            else:
+                print("No hay manifiesto o JSON previo, se reconstruye todo")
+            revistas, manifiesto, resumen = actualizar_revistas_incremental(carpeta_base, revistas_previas, manifiesto)
+            tiempos['total'] = time.perf_counter() - inicio
+            print(f"Archivos sin cambios: {resumen['sin_cambios']}, nuevos: {resumen['nuevos']}, "
+                  f"modificados: {resumen['modificados']}, eliminados: {resumen['eliminados']}")
+            print(f"Títulos agregados: {resumen['titulos_agregados']}, quitados: {resumen['titulos_quitados']}")
+        else:
+            inicio = time.perf_counter()
+            revistas = crear_diccionario_revistas(carpeta_base)
+            tiempos['total'] = time.perf_counter() - inicio
         
         # Mostrar estadísticas
         print(f"\nEstadísticas:")
         print(f"- Total de revistas procesadas: {len(revistas)}")
-        areas_por_revista = {titulo: len(info["areas"]) for titulo, info in revistas.items()}
-        catalogos_por_revista = {titulo: len(info["catalogos"]) for titulo, info in revistas.items()}
-        
-        if areas_por_revista:
-            print(f"- Promedio de áreas por revista: {sum(areas_por_revista.values()) / len(areas_por_revista):.2f}")
-        if catalogos_por_revista:
-            print(f"- Promedio de catálogos por revista: {sum(catalogos_por_revista.values()) / len(catalogos_por_revista):.2f}")
+        if revistas:
+            # Sumas directas, sin diccionarios intermedios por título
+            print(f"- Promedio de áreas por revista: {sum(len(info['areas']) for info in revistas.values()) / len(revistas):.2f}")
+            print(f"- Promedio de catálogos por revista: {sum(len(info['catalogos']) for info in revistas.values()) / len(revistas):.2f}")
         
         # Mostrar ejemplo de algunas revistas
         print("\nEjemplos de revistas procesadas:")
@@ -161,7 +783,32 @@ def main():
             print(f"  {i+1}. '{titulo}': {info}")
         
         # Guardar como JSON
-        guardar_como_json(revistas, "revistas.json")
+        inicio = time.perf_counter()
+        guardar_como_json(revistas, args.salida)
+        # El manifiesto se escribe después del JSON para que nunca describa un archivo que no existe
+        if manifiesto is not None:
+            guardar_manifiesto_revistas(manifiesto, ruta_manifiesto)
+        tiempos['guardado'] = time.perf_counter() - inicio
+        
+        # Índice invertido para navegar por catálogo y área
+        inicio = time.perf_counter()
+        indice = crear_indice_invertido(revistas)
+        guardar_como_json(indice, ruta_indice, formato='compacto')
+        tiempos['indice'] = time.perf_counter() - inicio
+        
+        # Variantes del mismo título unidas en una revista (el scrapper busca una vez por clave)
+        inicio = time.perf_counter()
+        canonicas = crear_revistas_canonicas(revistas)
+        guardar_como_json(canonicas, ruta_canonicas, formato='compacto')
+        tiempos['canonicas'] = time.perf_counter() - inicio
+        variantes = len(revistas) - len(canonicas)
+        print(f"- Variantes de un mismo título: {variantes} títulos se unen a otra revista "
+              f"({len(canonicas)} revistas distintas, {ruta_canonicas})")
+        
+        # Mostrar duración de cada fase
+        print("\nTiempos:")
+        for fase, segundos in tiempos.items():
+            print(f"- {fase}: {segundos:.3f} s")
         
     except Exception as e:
         print(f"Error en el procesamiento: {e}")
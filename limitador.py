@@ -0,0 +1,179 @@
+'''Limitador de peticiones global y adaptativo (cubeta de fichas) para el web scrapper.
+
+Todas las peticiones a SCIMAGO, de cualquier hilo o corrutina, pasan por la misma cubeta.
+La tasa baja a la mitad ante respuestas 429/5xx o errores de red, baja un poco si la latencia
+sube, y crece de forma gradual mientras las respuestas son sanas (aumento aditivo,
+disminución multiplicativa).'''
+import logging
+import random
+import threading
+import time
+
+# Respuestas que indican que el sitio está saturado o limitando
+CODIGOS_SATURACION = {429, 500, 502, 503, 504}
+
+class LimitadorAdaptativo:
+    """Cubeta de fichas compartida cuya tasa se ajusta sola según las respuestas del sitio."""
+
+    def __init__(self, tasa_inicial=2.0, tasa_minima=0.2, tasa_maxima=10.0, capacidad=2.0,
+                 incremento=0.1, respuestas_para_subir=10, factor_latencia=2.0, intervalo_log=30.0):
+        """
+        Args:
+            tasa_inicial (float): Peticiones por segundo al empezar
+            tasa_minima (float): Tasa mínima a la que puede bajar
+            tasa_maxima (float): Tasa máxima a la que puede subir
+            capacidad (float): Fichas acumulables (ráfaga máxima)
+            incremento (float): Peticiones por segundo que se suman en cada subida
+            respuestas_para_subir (int): Respuestas sanas seguidas necesarias para subir la tasa
+            factor_latencia (float): Latencia, en múltiplos de la de referencia, que se considera alta
+            intervalo_log (float): Segundos entre registros periódicos del estado
+        """
+        self.tasa = tasa_inicial
+        self.tasa_minima = tasa_minima
+        self.tasa_maxima = tasa_maxima
+        self.capacidad = capacidad
+        self.incremento = incremento
+        self.respuestas_para_subir = respuestas_para_subir
+        self.factor_latencia = factor_latencia
+        self.intervalo_log = intervalo_log
+
+        self.fichas = capacidad
+        self.ultima_recarga = time.monotonic()
+        self.pausa_hasta = 0.0
+        self.ultima_bajada = float('-inf')
+        self.sanas_seguidas = 0
+        self.latencia_referencia = None
+        self.latencia_media = None
+        self.ultimo_log = 0.0
+        self.contadores = {'peticiones': 0, 'saturaciones': 0, 'errores': 0, 'subidas': 0, 'bajadas': 0}
+        self.lock = threading.Lock()
+
+    def _recargar(self, ahora):
+        self.fichas = min(self.capacidad, self.fichas + (ahora - self.ultima_recarga) * self.tasa)
+        self.ultima_recarga = ahora
+
+    def reservar(self):
+        """
+        Reserva una ficha y devuelve cuánto hay que esperar antes de usarla.
+
+        No bloquea: sirve tanto para hilos (time.sleep) como para corrutinas (asyncio.sleep).
+
+        Returns:
+            float: Segundos de espera
+        """
+        with self.lock:
+            ahora = time.monotonic()
+            self._recargar(ahora)
+            self.fichas -= 1
+            self.contadores['peticiones'] += 1
+            # Con fichas negativas la espera crece con la cola de peticiones ya reservadas
+            espera = max(0.0, -self.fichas / self.tasa, self.pausa_hasta - ahora)
+            self._log_periodico(ahora)
+        # Pequeña variación para no producir un patrón fijo
+        return espera * random.uniform(0.9, 1.1) if espera else 0.0
+
+    def esperar(self, cancelado=None):
+        """
+        Bloquea el hilo actual hasta que le toque hacer su petición.
+
+        Args:
+            cancelado (threading.Event): Si se activa durante la espera, se devuelve la ficha y se deja de esperar
+
+        Returns:
+            bool: True si puede hacer la petición, False si se canceló
+        """
+        espera = self.reservar()
+        if cancelado is None:
+            if espera:
+                time.sleep(espera)
+            return True
+        if cancelado.wait(espera):
+            self.devolver()
+            return False
+        return True
+
+    def devolver(self):
+        """Devuelve una ficha reservada que no se llegó a usar (petición cancelada)"""
+        with self.lock:
+            self.fichas = min(self.capacidad, self.fichas + 1)
+            self.contadores['peticiones'] -= 1
+
+    def registrar(self, estado, latencia=None, retry_after=None):
+        """
+        Informa el resultado de una petición para ajustar la tasa.
+
+        Args:
+            estado (int): Código HTTP de la respuesta, o None si hubo un error de red
+            latencia (float): Duración de la petición en segundos
+            retry_after (str): Valor de la cabecera Retry-After, si la hubo
+        """
+        with self.lock:
+            ahora = time.monotonic()
+            if estado is None or estado in CODIGOS_SATURACION:
+                self.contadores['errores' if estado is None else 'saturaciones'] += 1
+                pausa = self._segundos_retry_after(retry_after)
+                if pausa is None:
+                    pausa = 1.0 / self.tasa
+                self.pausa_hasta = max(self.pausa_hasta, ahora + pausa)
+                self.sanas_seguidas = 0
+                # Varias peticiones en vuelo suelen fallar juntas: se baja una sola vez por ventana
+                if ahora - self.ultima_bajada >= max(1.0, 1.0 / self.tasa):
+                    self.ultima_bajada = ahora
+                    self._cambiar_tasa(self.tasa / 2, f"respuesta {estado or 'sin conexión'}, pausa de {pausa:.1f} s")
+                return
+
+            if latencia is not None:
+                self.latencia_media = latencia if self.latencia_media is None else 0.8 * self.latencia_media + 0.2 * latencia
+                if self.latencia_referencia is None or latencia < self.latencia_referencia:
+                    self.latencia_referencia = latencia
+                if self.latencia_media > self.factor_latencia * self.latencia_referencia:
+                    # Latencia al alza: el sitio empieza a sufrir, se baja sin esperar un error
+                    self.sanas_seguidas = 0
+                    if ahora - self.ultima_bajada >= max(1.0, 1.0 / self.tasa):
+                        self.ultima_bajada = ahora
+                        self._cambiar_tasa(self.tasa * 0.9, f"latencia media {self.latencia_media:.2f} s")
+                        # Olvidar poco a poco la referencia para no quedar atados a un mínimo antiguo
+                        self.latencia_referencia *= 1.05
+                    return
+
+            self.sanas_seguidas += 1
+            if self.sanas_seguidas >= self.respuestas_para_subir:
+                self.sanas_seguidas = 0
+                self._cambiar_tasa(self.tasa + self.incremento, "respuestas sanas")
+
+    def _segundos_retry_after(self, retry_after):
+        try:
+            return max(0.0, float(retry_after))
+        except (TypeError, ValueError):
+            return None
+
+    def _cambiar_tasa(self, nueva, motivo):
+        nueva = min(self.tasa_maxima, max(self.tasa_minima, nueva))
+        if nueva == self.tasa:
+            return
+        self.contadores['subidas' if nueva > self.tasa else 'bajadas'] += 1
+        nivel = logging.INFO if nueva > self.tasa else logging.WARNING
+        logging.log(nivel, f"Limitador: tasa {self.tasa:.2f} -> {nueva:.2f} peticiones/s ({motivo})")
+        self.tasa = nueva
+
+    def _log_periodico(self, ahora):
+        if ahora - self.ultimo_log >= self.intervalo_log:
+            self.ultimo_log = ahora
+            pausa = max(0.0, self.pausa_hasta - ahora)
+            logging.info(f"Limitador: {self.tasa:.2f} peticiones/s, pausa restante {pausa:.1f} s, "
+                         f"{self.contadores['peticiones']} peticiones, {self.contadores['saturaciones']} saturaciones")
+
+    def estado(self):
+        """
+        Devuelve el estado actual del limitador.
+
+        Returns:
+            dict: Tasa, pausa restante, latencia media y contadores
+        """
+        with self.lock:
+            return {
+                'tasa': self.tasa,
+                'pausa_restante': max(0.0, self.pausa_hasta - time.monotonic()),
+                'latencia_media': self.latencia_media,
+                **self.contadores
+            }
@@ -0,0 +1,332 @@
+'''Representación compacta de la pertenencia de las revistas a áreas y catálogos.
+
+Cada nombre de área o catálogo recibe un bit en un registro pequeño y cada revista guarda
+solo dos enteros (máscaras de bits) en columnas de tipo array, en lugar de dos listas de
+cadenas repetidas. Se puede convertir sin pérdidas al formato de revistas.json.'''
+from array import array
+import numpy as np
+import leer_csv
+
+# Las columnas usan enteros sin signo de 64 bits mientras el registro quepa en ellos
+BITS_POR_COLUMNA = 64
+
+class RegistroNombres:
+    """Asigna un bit a cada nombre de área o catálogo, en orden de registro."""
+
+    def __init__(self, nombres=()):
+        self.nombres = []
+        self.bits = {}
+        for nombre in nombres:
+            self.agregar(nombre)
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def __contains__(self, nombre):
+        return nombre in self.bits
+
+    def agregar(self, nombre):
+        """
+        Registra un nombre si no existe.
+
+        Args:
+            nombre (str): Nombre del área o catálogo
+
+        Returns:
+            int: Posición del bit asignado al nombre
+        """
+        if nombre not in self.bits:
+            self.bits[nombre] = len(self.nombres)
+            self.nombres.append(nombre)
+        return self.bits[nombre]
+
+    def mascara(self, nombres):
+        """
+        Calcula la máscara de un conjunto de nombres.
+
+        Args:
+            nombres (iterable): Nombres registrados
+
+        Returns:
+            int: Máscara con un bit encendido por nombre
+
+        Raises:
+            KeyError: Si algún nombre no está registrado
+        """
+        mascara = 0
+        for nombre in nombres:
+            mascara |= 1 << self.bits[nombre]
+        return mascara
+
+    def nombres_de(self, mascara):
+        """
+        Devuelve los nombres de una máscara, en orden de registro.
+
+        Args:
+            mascara (int): Máscara de bits
+
+        Returns:
+            list: Nombres cuyos bits están encendidos
+        """
+        nombres = []
+        bit = 0
+        while mascara:
+            if mascara & 1:
+                nombres.append(self.nombres[bit])
+            mascara >>= 1
+            bit += 1
+        return nombres
+
+def orden_consistente(listas):
+    """
+    Calcula un orden de nombres que respete el orden relativo dentro de cada lista.
+
+    Los empates se resuelven por orden de primera aparición.
+
+    Args:
+        listas (iterable): Listas de nombres
+
+    Returns:
+        list: Nombres en un orden compatible con todas las listas
+
+    Raises:
+        ValueError: Si las listas imponen órdenes contradictorios
+    """
+    aparicion = {}
+    siguientes = {}
+    entradas = {}
+    for lista in listas:
+        for nombre in lista:
+            if nombre not in aparicion:
+                aparicion[nombre] = len(aparicion)
+                siguientes[nombre] = set()
+                entradas[nombre] = 0
+        for anterior, nombre in zip(lista, lista[1:]):
+            if nombre not in siguientes[anterior]:
+                siguientes[anterior].add(nombre)
+                entradas[nombre] += 1
+
+    # Orden topológico (Kahn) eligiendo siempre el nombre que apareció primero
+    disponibles = sorted((n for n, e in entradas.items() if e == 0), key=aparicion.get)
+    orden = []
+    while disponibles:
+        nombre = disponibles.pop(0)
+        orden.append(nombre)
+        for siguiente in siguientes[nombre]:
+            entradas[siguiente] -= 1
+            if entradas[siguiente] == 0:
+                disponibles.append(siguiente)
+        disponibles.sort(key=aparicion.get)
+
+    if len(orden) != len(aparicion):
+        raise ValueError("Las listas de nombres no tienen un orden común; la conversión no sería exacta")
+    return orden
+
+class MembresiaRevistas:
+    """
+    Pertenencia de cada revista a áreas y catálogos como máscaras de bits.
+
+    Las revistas se numeran en orden de inserción; las máscaras se guardan en dos
+    columnas paralelas (una para áreas y otra para catálogos).
+    """
+
+    def __init__(self, areas=None, catalogos=None):
+        self.areas = areas if areas is not None else RegistroNombres()
+        self.catalogos = catalogos if catalogos is not None else RegistroNombres()
+        self.titulos = []
+        self.indice = {}
+        self.mascaras_areas = array('Q')
+        self.mascaras_catalogos = array('Q')
+
+    def __len__(self):
+        return len(self.titulos)
+
+    def __contains__(self, titulo):
+        return titulo in self.indice
+
+    @classmethod
+    def desde_diccionario(cls, revistas, areas=None, catalogos=None):
+        """
+        Construye el modelo a partir de un diccionario con el formato de revistas.json.
+
+        Args:
+            revistas (dict): Título -> {"areas": [...], "catalogos": [...]}
+            areas (RegistroNombres): Registro de áreas; por defecto se deduce de las listas
+            catalogos (RegistroNombres): Registro de catálogos; por defecto se deduce de las listas
+
+        Returns:
+            MembresiaRevistas: Modelo compacto
+        """
+        if areas is None:
+            areas = RegistroNombres(orden_consistente(info["areas"] for info in revistas.values()))
+        if catalogos is None:
+            catalogos = RegistroNombres(orden_consistente(info["catalogos"] for info in revistas.values()))
+
+        modelo = cls(areas, catalogos)
+        for titulo, info in revistas.items():
+            modelo.agregar(titulo, info["areas"], info["catalogos"])
+        return modelo
+
+    @classmethod
+    def desde_csv(cls, carpeta_base, paralelo=False):
+        """
+        Construye el modelo leyendo los CSV con crear_diccionario_revistas.
+
+        Los bits se asignan en el orden de los archivos, el mismo que siguen las listas del JSON.
+
+        Args:
+            carpeta_base (str): Ruta a la carpeta base que contiene las subcarpetas 'areas' y 'catalogos'
+            paralelo (bool): Usar crear_diccionario_revistas_paralelo
+
+        Returns:
+            MembresiaRevistas: Modelo compacto
+        """
+        fuentes = leer_csv.listar_archivos_csv(carpeta_base)
+        areas = RegistroNombres(nombre for tipo, nombre, _ in fuentes if tipo == 'areas')
+        catalogos = RegistroNombres(nombre for tipo, nombre, _ in fuentes if tipo == 'catalogos')
+
+        if paralelo:
+            revistas = leer_csv.crear_diccionario_revistas_paralelo(carpeta_base)
+        else:
+            revistas = leer_csv.crear_diccionario_revistas(carpeta_base)
+        return cls.desde_diccionario(revistas, areas, catalogos)
+
+    def _ampliar_columnas(self):
+        # Más de 64 nombres no caben en 'Q'; se pasa a listas de enteros de Python
+        if len(self.areas) > BITS_POR_COLUMNA and isinstance(self.mascaras_areas, array):
+            self.mascaras_areas = list(self.mascaras_areas)
+        if len(self.catalogos) > BITS_POR_COLUMNA and isinstance(self.mascaras_catalogos, array):
+            self.mascaras_catalogos = list(self.mascaras_catalogos)
+
+    def agregar(self, titulo, areas=(), catalogos=()):
+        """
+        Agrega una revista o suma áreas y catálogos a una existente.
+
+        Args:
+            titulo (str): Título normalizado de la revista
+            areas (iterable): Nombres de áreas
+            catalogos (iterable): Nombres de catálogos
+        """
+        mascara_areas = 0
+        for nombre in areas:
+            mascara_areas |= 1 << self.areas.agregar(nombre)
+        mascara_catalogos = 0
+        for nombre in catalogos:
+            mascara_catalogos |= 1 << self.catalogos.agregar(nombre)
+        self._ampliar_columnas()
+
+        posicion = self.indice.get(titulo)
+        if posicion is None:
+            self.indice[titulo] = len(self.titulos)
+            self.titulos.append(titulo)
+            self.mascaras_areas.append(mascara_areas)
+            self.mascaras_catalogos.append(mascara_catalogos)
+        else:
+            self.mascaras_areas[posicion] |= mascara_areas
+            self.mascaras_catalogos[posicion] |= mascara_catalogos
+
+    def tiene_area(self, titulo, area):
+        """
+        Indica si una revista pertenece a un área, en tiempo constante.
+
+        Args:
+            titulo (str): Título normalizado de la revista
+            area (str): Nombre del área
+
+        Returns:
+            bool: True si la revista existe y pertenece al área
+        """
+        posicion = self.indice.get(titulo)
+        bit = self.areas.bits.get(area)
+        if posicion is None or bit is None:
+            return False
+        return bool(self.mascaras_areas[posicion] >> bit & 1)
+
+    def tiene_catalogo(self, titulo, catalogo):
+        """
+        Indica si una revista pertenece a un catálogo, en tiempo constante.
+
+        Args:
+            titulo (str): Título normalizado de la revista
+            catalogo (str): Nombre del catálogo
+
+        Returns:
+            bool: True si la revista existe y pertenece al catálogo
+        """
+        posicion = self.indice.get(titulo)
+        bit = self.catalogos.bits.get(catalogo)
+        if posicion is None or bit is None:
+            return False
+        return bool(self.mascaras_catalogos[posicion] >> bit & 1)
+
+    def _seleccion(self, columna, con, sin):
+        # Revistas con todos los bits de 'con' y ninguno de 'sin'
+        if isinstance(columna, array):
+            valores = np.frombuffer(columna, dtype=np.uint64)
+            con, sin = np.uint64(con), np.uint64(sin)
+            return ((valores & con) == con) & ((valores & sin) == 0)
+        return np.fromiter(((m & con) == con and not m & sin for m in columna), dtype=bool, count=len(columna))
+
+    def posiciones(self, areas=(), catalogos=(), sin_areas=(), sin_catalogos=()):
+        """
+        Posiciones de las revistas que cumplen un filtro de pertenencia.
+
+        Args:
+            areas (iterable): Áreas a las que debe pertenecer (todas)
+            catalogos (iterable): Catálogos a los que debe pertenecer (todos)
+            sin_areas (iterable): Áreas a las que no debe pertenecer
+            sin_catalogos (iterable): Catálogos a los que no debe pertenecer
+
+        Returns:
+            numpy.ndarray: Posiciones (en orden de inserción) de las revistas seleccionadas
+
+        Raises:
+            KeyError: Si algún nombre no está registrado
+        """
+        seleccion = self._seleccion(self.mascaras_areas, self.areas.mascara(areas), self.areas.mascara(sin_areas))
+        seleccion &= self._seleccion(self.mascaras_catalogos, self.catalogos.mascara(catalogos),
+                                     self.catalogos.mascara(sin_catalogos))
+        return np.flatnonzero(seleccion)
+
+    def filtrar(self, areas=(), catalogos=(), sin_areas=(), sin_catalogos=()):
+        """
+        Títulos de las revistas que cumplen un filtro de pertenencia.
+
+        Por ejemplo, "en SCOPUS y JCR pero no en CONACYT":
+        filtrar(catalogos=["SCOPUS_RADGRIDEXPORT", "JCR_RADGRIDEXPORT"], sin_catalogos=["CONACYT_RADGRIDEXPORT"])
+
+        Args:
+            areas (iterable): Áreas a las que debe pertenecer (todas)
+            catalogos (iterable): Catálogos a los que debe pertenecer (todos)
+            sin_areas (iterable): Áreas a las que no debe pertenecer
+            sin_catalogos (iterable): Catálogos a los que no debe pertenecer
+
+        Returns:
+            list: Títulos seleccionados, en orden de inserción
+        """
+        return [self.titulos[i] for i in self.posiciones(areas, catalogos, sin_areas, sin_catalogos).tolist()]
+
+    def info(self, titulo):
+        """
+        Devuelve la entrada de una revista con el formato de revistas.json.
+
+        Args:
+            titulo (str): Título normalizado de la revista
+
+        Returns:
+            dict: {"areas": [...], "catalogos": [...]}, o None si no existe
+        """
+        posicion = self.indice.get(titulo)
+        if posicion is None:
+            return None
+        return {"areas": self.areas.nombres_de(self.mascaras_areas[posicion]),
+                "catalogos": self.catalogos.nombres_de(self.mascaras_catalogos[posicion])}
+
+    def a_diccionario(self):
+        """
+        Convierte el modelo al formato de revistas.json.
+
+        Returns:
+            dict: Título -> {"areas": [...], "catalogos": [...]}, en orden de inserción
+        """
+        return {titulo: self.info(titulo) for titulo in self.titulos}
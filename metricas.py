@@ -0,0 +1,271 @@
+'''Métricas del web scrapper: histogramas de tiempo por etapa y contadores.
+
+Cada etapa (espera en el limitador, petición HTTP, lectura de la caché, análisis del HTML,
+extracción) registra su duración en un histograma de cubetas fijas, y los eventos (códigos
+HTTP, reintentos, aciertos de caché) en contadores. Las métricas se escriben cada cierto
+tiempo en JSON y en el formato de texto de Prometheus, y al terminar se muestra una tabla.
+
+Los procesos del pool de análisis tienen sus propias métricas: llamar_con_metricas las
+devuelve junto con el resultado para sumarlas a las del proceso principal.'''
+import bisect
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# Límites superiores de las cubetas, en segundos (los de Prometheus más algunos pequeños)
+LIMITES = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, math.inf)
+ARCHIVO_METRICAS = "scraping_metricas"
+PREFIJO_PROMETHEUS = "scraper_"
+
+class Histograma:
+    """Cuenta de observaciones por cubeta, con suma y máximo."""
+
+    def __init__(self):
+        self.cubetas = [0] * len(LIMITES)
+        self.cuenta = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+
+    def observar(self, segundos):
+        self.cubetas[bisect.bisect_left(LIMITES, segundos)] += 1
+        self.cuenta += 1
+        self.suma += segundos
+        self.maximo = max(self.maximo, segundos)
+
+    def combinar(self, otro):
+        for i, valor in enumerate(otro.cubetas):
+            self.cubetas[i] += valor
+        self.cuenta += otro.cuenta
+        self.suma += otro.suma
+        self.maximo = max(self.maximo, otro.maximo)
+
+    def percentil(self, p):
+        """
+        Estima un percentil interpolando dentro de su cubeta.
+
+        Args:
+            p (float): Percentil entre 0 y 100
+
+        Returns:
+            float: Segundos
+        """
+        if self.cuenta == 0:
+            return 0.0
+        objetivo = self.cuenta * p / 100
+        acumulado = 0
+        for i, valor in enumerate(self.cubetas):
+            if valor and acumulado + valor >= objetivo:
+                inferior = LIMITES[i - 1] if i else 0.0
+                superior = min(LIMITES[i], self.maximo)
+                return inferior + (superior - inferior) * (objetivo - acumulado) / valor
+            acumulado += valor
+        return self.maximo
+
+class Metricas:
+    """
+    Histogramas y contadores con etiquetas, seguros entre hilos.
+
+    Las claves son (nombre, etiquetas), con las etiquetas como tupla ordenada de pares.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histogramas = {}
+        self.contadores = {}
+        self.inicio = time.time()
+
+    @staticmethod
+    def _clave(nombre, etiquetas):
+        return nombre, tuple(sorted((k, str(v)) for k, v in etiquetas.items()))
+
+    def observar(self, nombre, segundos, **etiquetas):
+        """Registra la duración de una etapa"""
+        clave = self._clave(nombre, etiquetas)
+        with self.lock:
+            if clave not in self.histogramas:
+                self.histogramas[clave] = Histograma()
+            self.histogramas[clave].observar(segundos)
+
+    def incrementar(self, nombre, valor=1, **etiquetas):
+        """Suma valor a un contador"""
+        clave = self._clave(nombre, etiquetas)
+        with self.lock:
+            self.contadores[clave] = self.contadores.get(clave, 0) + valor
+
+    @contextmanager
+    def medir(self, nombre, **etiquetas):
+        """Mide la duración del bloque (también si termina con una excepción)"""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nombre, time.perf_counter() - inicio, **etiquetas)
+
+    def extraer(self):
+        """
+        Devuelve las métricas acumuladas y las reinicia (para enviarlas desde otro proceso).
+
+        Returns:
+            tuple: (histogramas, contadores)
+        """
+        with self.lock:
+            parcial = self.histogramas, self.contadores
+            self.histogramas, self.contadores = {}, {}
+        return parcial
+
+    def combinar(self, parcial):
+        """Suma las métricas devueltas por extraer en otro proceso"""
+        histogramas, contadores = parcial
+        with self.lock:
+            for clave, histograma in histogramas.items():
+                if clave not in self.histogramas:
+                    self.histogramas[clave] = Histograma()
+                self.histogramas[clave].combinar(histograma)
+            for clave, valor in contadores.items():
+                self.contadores[clave] = self.contadores.get(clave, 0) + valor
+
+    def contador(self, nombre, **etiquetas):
+        """Suma de un contador para todas las combinaciones de etiquetas que incluyen las dadas"""
+        filtro = set(self._clave(nombre, etiquetas)[1])
+        with self.lock:
+            return sum(valor for (n, claves), valor in self.contadores.items() if n == nombre and filtro <= set(claves))
+
+    def proporcion_aciertos(self, nombre):
+        """Aciertos / (aciertos + fallos) de un contador con la etiqueta resultado, o None sin datos"""
+        aciertos = self.contador(nombre, resultado="acierto")
+        total = aciertos + self.contador(nombre, resultado="fallo")
+        return aciertos / total if total else None
+
+    def a_diccionario(self):
+        """Métricas como diccionario serializable en JSON"""
+        with self.lock:
+            histogramas = [{
+                "nombre": nombre, "etiquetas": dict(etiquetas), "cuenta": h.cuenta, "suma": h.suma,
+                "maximo": h.maximo, "p50": h.percentil(50), "p95": h.percentil(95), "p99": h.percentil(99),
+                "cubetas": {("+Inf" if math.isinf(limite) else limite): valor for limite, valor in zip(LIMITES, h.cubetas)},
+            } for (nombre, etiquetas), h in sorted(self.histogramas.items())]
+            contadores = [{"nombre": nombre, "etiquetas": dict(etiquetas), "valor": valor}
+                          for (nombre, etiquetas), valor in sorted(self.contadores.items())]
+        return {
+            "inicio": self.inicio,
+            "segundos": time.time() - self.inicio,
+            "histogramas": histogramas,
+            "contadores": contadores,
+            "proporcion_aciertos_cache": {
+                "paginas": self.proporcion_aciertos("cache_paginas"),
+                "resultados": self.proporcion_aciertos("cache_resultados"),
+            },
+            # Revalidaciones de páginas caducadas que el servidor respondió con 304
+            "proporcion_304": self.proporcion_aciertos("revalidaciones"),
+        }
+
+    def a_prometheus(self):
+        """Métricas en el formato de texto de Prometheus"""
+        def etiquetas_texto(etiquetas, extra=()):
+            pares = list(etiquetas) + list(extra)
+            if not pares:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pares) + "}"
+
+        lineas = []
+        with self.lock:
+            vistos = set()
+            for (nombre, etiquetas), h in sorted(self.histogramas.items()):
+                metrica = f"{PREFIJO_PROMETHEUS}{nombre}_segundos"
+                if metrica not in vistos:
+                    vistos.add(metrica)
+                    lineas.append(f"# TYPE {metrica} histogram")
+                acumulado = 0
+                for limite, valor in zip(LIMITES, h.cubetas):
+                    acumulado += valor
+                    le = "+Inf" if math.isinf(limite) else repr(limite)
+                    lineas.append(f"{metrica}_bucket{etiquetas_texto(etiquetas, [('le', le)])} {acumulado}")
+                lineas.append(f"{metrica}_sum{etiquetas_texto(etiquetas)} {h.suma}")
+                lineas.append(f"{metrica}_count{etiquetas_texto(etiquetas)} {h.cuenta}")
+            for (nombre, etiquetas), valor in sorted(self.contadores.items()):
+                metrica = f"{PREFIJO_PROMETHEUS}{nombre}_total"
+                if metrica not in vistos:
+                    vistos.add(metrica)
+                    lineas.append(f"# TYPE {metrica} counter")
+                lineas.append(f"{metrica}{etiquetas_texto(etiquetas)} {valor}")
+        return "\n".join(lineas) + "\n"
+
+    def tabla_resumen(self):
+        """Tabla de texto con el tiempo de cada etapa y los contadores"""
+        filas = [("Etapa", "n", "total s", "media ms", "p50 ms", "p95 ms", "máx ms")]
+        with self.lock:
+            for (nombre, etiquetas), h in sorted(self.histogramas.items()):
+                etiqueta = nombre + "".join(f" {k}={v}" for k, v in etiquetas)
+                filas.append((etiqueta, str(h.cuenta), f"{h.suma:.2f}", f"{h.suma / max(1, h.cuenta) * 1000:.1f}",
+                              f"{h.percentil(50) * 1000:.1f}", f"{h.percentil(95) * 1000:.1f}", f"{h.maximo * 1000:.1f}"))
+            contadores = sorted(self.contadores.items())
+        anchos = [max(len(fila[i]) for fila in filas) for i in range(len(filas[0]))]
+        lineas = ["  ".join(valor.ljust(anchos[0]) if i == 0 else valor.rjust(anchos[i]) for i, valor in enumerate(fila))
+                  for fila in filas]
+        for (nombre, etiquetas), valor in contadores:
+            lineas.append(f"{nombre}{''.join(f' {k}={v}' for k, v in etiquetas)}: {valor}")
+        for nombre in ("cache_paginas", "cache_resultados"):
+            proporcion = self.proporcion_aciertos(nombre)
+            if proporcion is not None:
+                lineas.append(f"Aciertos de {nombre}: {proporcion:.1%}")
+        proporcion = self.proporcion_aciertos("revalidaciones")
+        if proporcion is not None:
+            lineas.append(f"Revalidaciones respondidas con 304 (sin cambios): {proporcion:.1%} "
+                          f"de {self.contador('revalidaciones')}")
+        return "\n".join(lineas)
+
+    def guardar(self, ruta_base=ARCHIVO_METRICAS):
+        """Escribe ruta_base.json y ruta_base.prom, cada uno de forma atómica"""
+        for extension, contenido in ((".json", json.dumps(self.a_diccionario(), ensure_ascii=False, indent=2)),
+                                     (".prom", self.a_prometheus())):
+            ruta = ruta_base + extension
+            descriptor, temporal = tempfile.mkstemp(prefix=".tmp_", suffix=extension,
+                                                    dir=os.path.dirname(os.path.abspath(ruta)))
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as f:
+                f.write(contenido)
+            os.replace(temporal, ruta)
+
+class EscritorPeriodico:
+    """Hilo que guarda las métricas cada intervalo segundos, y una última vez al detenerse."""
+
+    def __init__(self, metricas, ruta_base=ARCHIVO_METRICAS, intervalo=10.0):
+        self.metricas = metricas
+        self.ruta_base = ruta_base
+        self.intervalo = intervalo
+        self.detener_evento = threading.Event()
+        self.hilo = threading.Thread(target=self._ejecutar, daemon=True)
+
+    def _ejecutar(self):
+        while not self.detener_evento.wait(self.intervalo):
+            self.metricas.guardar(self.ruta_base)
+
+    def iniciar(self):
+        self.hilo.start()
+        return self
+
+    def detener(self):
+        self.detener_evento.set()
+        self.hilo.join()
+        self.metricas.guardar(self.ruta_base)
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *excepcion):
+        self.detener()
+
+# Métricas del proceso; en los procesos del pool se envían con llamar_con_metricas
+metricas = Metricas()
+
+def reiniciar():
+    """Descarta las métricas heredadas (inicializador de los procesos del pool)"""
+    metricas.extraer()
+
+def llamar_con_metricas(funcion, *args):
+    """Ejecuta funcion(*args) y devuelve (resultado, métricas que registró este proceso)"""
+    resultado = funcion(*args)
+    return resultado, metricas.extraer()
@@ -0,0 +1,205 @@
+'''Tabla persistente que resuelve títulos e ISSN a su identificador de revista en SCIMAGO.
+
+El identificador (el mismo que aparece en el widget, journal_img.php?id=...) no cambia, así
+que una revista ya resuelta va directo a su página sin pasar por la búsqueda. Los títulos
+que no se encontraron se guardan como ausentes durante un tiempo (TTL) para no buscarlos
+otra vez en cada ejecución.'''
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+import leer_csv
+
+ARCHIVO_RESOLUCIONES = "resoluciones.sqlite"
+# Un título no encontrado se vuelve a buscar pasada una semana
+TTL_AUSENTES = 7 * 24 * 3600
+
+def normalizar_issn(issn):
+    """Deja solo los dígitos y la X final de un ISSN ('1553-2712' -> '15532712')"""
+    return re.sub(r'[^0-9X]', '', str(issn).upper())
+
+def separar_issn(texto):
+    """
+    Separa los ISSN de un campo como el de SCIMAGO ('15532712, 10696563').
+
+    Returns:
+        list: ISSN normalizados de 8 caracteres
+    """
+    return [issn for issn in (normalizar_issn(parte) for parte in re.split(r'[,;\s]+', texto or '')) if len(issn) == 8]
+
+def id_de_enlace(enlace):
+    """
+    Obtiene el identificador de SCIMAGO del enlace de una revista.
+
+    Args:
+        enlace (str): URL relativa, p. ej. 'journalsearch.php?q=15185&tip=sid&clean=0'
+
+    Returns:
+        str: Identificador, o None si el enlace no es de una revista
+    """
+    parametros = parse_qs(urlparse(enlace).query)
+    if parametros.get('tip', [''])[0] != 'sid' or not parametros.get('q'):
+        return None
+    return parametros['q'][0].strip()
+
+def enlace_de_id(id_scimago):
+    """Construye el enlace relativo de la página de una revista a partir de su identificador"""
+    return f"journalsearch.php?q={id_scimago}&tip=sid&clean=0"
+
+class MapaResoluciones:
+    """
+    Títulos normalizados e ISSN -> identificador de SCIMAGO, en un archivo SQLite.
+
+    Igual que la caché, cada hilo usa su propia conexión y la base está en modo WAL.
+    """
+
+    def __init__(self, ruta=ARCHIVO_RESOLUCIONES, ttl_ausentes=TTL_AUSENTES):
+        """
+        Args:
+            ruta (str): Archivo de la base de datos
+            ttl_ausentes (float): Segundos que se recuerda que un título no se encontró
+        """
+        self.ruta = ruta
+        self.ttl_ausentes = ttl_ausentes
+        self.local = threading.local()
+        self._conexion().executescript("""
+            CREATE TABLE IF NOT EXISTS resoluciones (
+                tipo TEXT NOT NULL,
+                clave TEXT NOT NULL,
+                id_scimago TEXT,
+                enlace TEXT,
+                actualizado REAL NOT NULL,
+                PRIMARY KEY (tipo, clave)
+            );
+        """)
+
+    def _conexion(self):
+        conexion = getattr(self.local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=60, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self.local.conexion = conexion
+        return conexion
+
+    def _claves(self, titulo=None, issn=()):
+        claves = []
+        if titulo:
+            claves.append(('titulo', leer_csv.plegar_texto(titulo)))
+        claves.extend(('issn', normalizar_issn(i)) for i in issn)
+        return claves
+
+    def consultar(self, titulo=None, issn=()):
+        """
+        Busca la resolución de una revista por título y/o ISSN.
+
+        Una resolución positiva por cualquiera de las claves gana a una ausencia.
+
+        Args:
+            titulo (str): Título de la revista
+            issn (iterable): ISSN de la revista
+
+        Returns:
+            tuple: (id_scimago, enlace) si se conoce; (None, None) si se sabe que no está
+                (y la ausencia sigue vigente); None si no hay información
+        """
+        ausente = False
+        conexion = self._conexion()
+        for tipo, clave in self._claves(titulo, issn):
+            fila = conexion.execute("SELECT id_scimago, enlace, actualizado FROM resoluciones WHERE tipo = ? AND clave = ?",
+                                    (tipo, clave)).fetchone()
+            if fila is None:
+                continue
+            id_scimago, enlace, actualizado = fila
+            if id_scimago is not None:
+                return id_scimago, enlace or enlace_de_id(id_scimago)
+            if self.ttl_ausentes is None or time.time() - actualizado <= self.ttl_ausentes:
+                ausente = True
+        return (None, None) if ausente else None
+
+    def registrar(self, enlace, titulo=None, issn=()):
+        """
+        Registra la página de una revista para su título y sus ISSN.
+
+        Args:
+            enlace (str): Enlace relativo de la revista en SCIMAGO
+            titulo (str): Título de la revista
+            issn (iterable): ISSN de la revista
+        """
+        id_scimago = id_de_enlace(enlace)
+        if id_scimago is None:
+            return
+        ahora = time.time()
+        self._conexion().executemany("INSERT OR REPLACE INTO resoluciones VALUES (?, ?, ?, ?, ?)",
+                                     [(tipo, clave, id_scimago, enlace, ahora) for tipo, clave in self._claves(titulo, issn)])
+
+    def registrar_ausente(self, titulo):
+        """Registra que un título no se encontró en SCIMAGO (sin pisar una resolución positiva)"""
+        tipo, clave = self._claves(titulo)[0]
+        self._conexion().execute(
+            "INSERT INTO resoluciones VALUES (?, ?, NULL, NULL, ?) ON CONFLICT(tipo, clave) DO UPDATE SET "
+            "actualizado = excluded.actualizado WHERE id_scimago IS NULL", (tipo, clave, time.time()))
+
+    def olvidar_ausentes(self):
+        """
+        Elimina todas las ausencias para que esos títulos se vuelvan a buscar.
+
+        Returns:
+            int: Número de entradas eliminadas
+        """
+        return self._conexion().execute("DELETE FROM resoluciones WHERE id_scimago IS NULL").rowcount
+
+    def vaciar(self):
+        """Elimina todas las resoluciones (las revistas se vuelven a buscar)"""
+        return self._conexion().execute("DELETE FROM resoluciones").rowcount
+
+    def estadisticas(self):
+        """Número de títulos e ISSN resueltos y de títulos ausentes"""
+        conexion = self._conexion()
+        cuenta = dict(conexion.execute(
+            "SELECT CASE WHEN id_scimago IS NULL THEN 'ausentes' ELSE tipo END, COUNT(*) FROM resoluciones GROUP BY 1"))
+        return {'titulos': cuenta.get('titulo', 0), 'issn': cuenta.get('issn', 0), 'ausentes': cuenta.get('ausentes', 0)}
+
+_mapas = {}
+_mapas_lock = threading.Lock()
+
+def abrir_mapa(ruta=ARCHIVO_RESOLUCIONES):
+    """Devuelve el mapa de resoluciones de una ruta, reutilizando el mismo objeto en todo el proceso"""
+    with _mapas_lock:
+        if ruta not in _mapas:
+            _mapas[ruta] = MapaResoluciones(ruta)
+        return _mapas[ruta]
+
+def main():
+    parser = argparse.ArgumentParser(description="Tabla de resolución de títulos e ISSN a revistas de SCIMAGO")
+    parser.add_argument("--mapa", default=ARCHIVO_RESOLUCIONES, help="Archivo SQLite de la tabla")
+    sub = parser.add_subparsers(dest="accion", required=True)
+    consultar = sub.add_parser("consultar", help="Consultar un título o un ISSN")
+    consultar.add_argument("texto", help="Título o ISSN")
+    sub.add_parser("estadisticas", help="Mostrar cuántas entradas hay")
+    sub.add_parser("olvidar-ausentes", help="Volver a buscar los títulos que no se encontraron")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.mapa):
+        print(f"No existe {args.mapa}")
+        return
+    mapa = MapaResoluciones(args.mapa)
+    if args.accion == "consultar":
+        issn = separar_issn(args.texto)
+        resolucion = mapa.consultar(issn=issn) if issn else mapa.consultar(titulo=args.texto)
+        if resolucion is None:
+            print("Sin información")
+        elif resolucion[0] is None:
+            print("No está en SCIMAGO (ausencia vigente)")
+        else:
+            print(f"Identificador {resolucion[0]}: {resolucion[1]}")
+    elif args.accion == "olvidar-ausentes":
+        print(f"{mapa.olvidar_ausentes()} ausencias eliminadas")
+    else:
+        print(mapa.estadisticas())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,463 @@
+'''API HTTP local (JSON) sobre las revistas, para el front-end.
+
+Carga revistas.json y el catálogo de SCIMAGO una sola vez al iniciar, con un índice invertido
+por catálogo y área (leer_csv.crear_indice_invertido) y el índice de búsqueda de títulos
+(indice_busqueda.py). Así cada vista del front-end pide unos kilobytes en lugar de los
+archivos completos. Las respuestas más pedidas se guardan ya serializadas (y comprimidas) en
+una caché LRU. El servidor atiende cada conexión en un hilo y las mantiene abiertas entre
+peticiones (HTTP/1.1).
+
+Rutas:
+    GET /catalogos, /areas                  Nombres con su número de revistas
+    GET /catalogos/NOMBRE?area=&pagina=     Revistas de un catálogo (opcionalmente también de un área)
+    GET /areas/NOMBRE?catalogo=&pagina=     Revistas de un área (opcionalmente también de un catálogo)
+    GET /buscar?q=TEXTO&limite=             Búsqueda de títulos tolerante a errores de escritura
+    GET /revistas/TITULO                    Áreas, catálogos y datos de SCIMAGO de una revista
+    GET /facetas/FACETA?catalogos=&areas=   Revistas por valor de una faceta con filtros (facetas.py)
+    GET /estadisticas                       Tamaño de los datos y aciertos de la caché
+    GET /metricas                           Métricas en formato de Prometheus
+
+Con el subcomando carga se mide el servidor con varios clientes concurrentes.'''
+import argparse
+import gzip
+import http.client
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urlsplit
+import leer_csv
+import bitacora
+import indice_busqueda
+import facetas
+from metricas import Histograma, metricas
+
+PUERTO = 8000
+POR_PAGINA = 50
+MAXIMO_POR_PAGINA = 500
+CAPACIDAD_CACHE = 2048
+# Las respuestas más pequeñas se envían sin comprimir (gzip no compensa)
+MINIMO_GZIP = 1024
+
+class ErrorConsulta(Exception):
+    """Petición que no se puede responder; lleva el código HTTP."""
+
+    def __init__(self, codigo, mensaje):
+        super().__init__(mensaje)
+        self.codigo = codigo
+
+class CacheLRU:
+    """Caché de tamaño fijo que descarta la entrada usada hace más tiempo, segura entre hilos."""
+
+    def __init__(self, capacidad=CAPACIDAD_CACHE):
+        self.capacidad = capacidad
+        self.entradas = OrderedDict()
+        self.lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+    def obtener(self, clave):
+        """Devuelve el valor guardado (y lo marca como reciente), o None"""
+        with self.lock:
+            valor = self.entradas.get(clave)
+            if valor is None:
+                self.fallos += 1
+                return None
+            self.entradas.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def guardar(self, clave, valor):
+        with self.lock:
+            self.entradas[clave] = valor
+            self.entradas.move_to_end(clave)
+            while len(self.entradas) > self.capacidad:
+                self.entradas.popitem(last=False)
+                self.expulsiones += 1
+
+    def estadisticas(self):
+        with self.lock:
+            total = self.aciertos + self.fallos
+            return {"entradas": len(self.entradas), "capacidad": self.capacidad, "aciertos": self.aciertos,
+                    "fallos": self.fallos, "expulsiones": self.expulsiones,
+                    "proporcion_aciertos": self.aciertos / total if total else None}
+
+class Respuesta:
+    """Cuerpo JSON ya serializado; la versión gzip se calcula la primera vez que se pide."""
+
+    def __init__(self, datos):
+        self.cuerpo = json.dumps(datos, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self._comprimido = None
+
+    def comprimido(self):
+        if self._comprimido is None:
+            self._comprimido = gzip.compress(self.cuerpo, compresslevel=6)
+        return self._comprimido
+
+class DatosRevistas:
+    """Revistas, catálogo de SCIMAGO e índices en memoria; solo lectura tras cargarse."""
+
+    def __init__(self, revistas, catalogo, tabla_facetas=None):
+        """
+        Args:
+            revistas (dict): Diccionario con el formato de revistas.json
+            catalogo (Mapping): Catálogo de SCIMAGO {titulo: datos}
+            tabla_facetas (facetas.Facetas): Facetas precalculadas; por defecto se construyen
+        """
+        self.revistas = revistas
+        self.catalogo = catalogo
+        self.indice = leer_csv.crear_indice_invertido(revistas)
+        self.busqueda = indice_busqueda.IndiceBusqueda.construir(list(revistas) + list(catalogo))
+        self.facetas = tabla_facetas or facetas.Facetas.construir(revistas, catalogo)
+
+    @classmethod
+    def cargar(cls, ruta_revistas, ruta_catalogo, ruta_facetas=None):
+        """
+        Lee revistas.json y el catálogo (JSON o catálogo mapeado); los que no existan quedan vacíos.
+
+        Las facetas se leen de ruta_facetas (generado por `facetas.py construir`) si existe, es de
+        esta versión y no es anterior a revistas.json ni al catálogo; si no, se construyen.
+        """
+        try:
+            revistas = dict(leer_csv.iterar_json(ruta_revistas))
+        except FileNotFoundError:
+            print(f"No se encontró {ruta_revistas}, se omite")
+            revistas = {}
+        tabla_facetas = None
+        if ruta_facetas:
+            try:
+                fuentes = [os.path.getmtime(ruta) for ruta in (ruta_revistas, ruta_catalogo) if os.path.exists(ruta)]
+                if os.path.getmtime(ruta_facetas) < max(fuentes, default=0):
+                    raise ValueError(f"{ruta_facetas} es anterior a {ruta_revistas} o {ruta_catalogo}")
+                tabla_facetas = facetas.Facetas.cargar(ruta_facetas)
+            except (FileNotFoundError, ValueError) as e:
+                print(f"Construyendo las facetas ({e})")
+        return cls(revistas, bitacora.cargar_catalogo(ruta_catalogo), tabla_facetas)
+
+    def nombres(self, tipo):
+        return [{"nombre": nombre, "total": entrada["total"]} for nombre, entrada in self.indice[tipo].items()]
+
+    def resumen(self, titulo):
+        """Lo que se muestra de una revista en un listado"""
+        datos = self.catalogo.get(titulo) or {}
+        return {"titulo": titulo, "h_index": datos.get("H-Index"), "en_scimago": titulo in self.catalogo}
+
+    def listar(self, tipo, nombre, filtro_tipo=None, filtro=None, pagina=1, por_pagina=POR_PAGINA):
+        """
+        Página de las revistas de un catálogo o un área, en orden alfabético.
+
+        Args:
+            tipo (str): "catalogos" o "areas"
+            nombre (str): Nombre del catálogo o área
+            filtro_tipo (str): Tipo del filtro ("areas" o "catalogos")
+            filtro (str): Nombre con el que intersectar la lista (p. ej. "ING ∩ SCOPUS")
+            pagina (int): Número de página, desde 1
+            por_pagina (int): Revistas por página
+
+        Raises:
+            ErrorConsulta: Si el catálogo o el área no existen
+        """
+        for t, n in ((tipo, nombre), (filtro_tipo, filtro)):
+            if n is not None and n not in self.indice[t]:
+                raise ErrorConsulta(404, f"No existe {t[:-1]} {n}")
+        numeros = self.indice[tipo][nombre]["revistas"]
+        if filtro is not None:
+            numeros = leer_csv.interseccion_ordenada(numeros, self.indice[filtro_tipo][filtro]["revistas"])
+        inicio = (pagina - 1) * por_pagina
+        titulos = self.indice["titulos"]
+        return {"nombre": nombre, "filtro": filtro, "total": len(numeros), "pagina": pagina, "por_pagina": por_pagina,
+                "paginas": -(-len(numeros) // por_pagina),
+                "revistas": [self.resumen(titulos[n]) for n in numeros[inicio:inicio + por_pagina]]}
+
+    def buscar(self, consulta, limite):
+        return {"consulta": consulta, "resultados": [dict(self.resumen(titulo), puntuacion=puntuacion)
+                                                     for titulo, puntuacion in self.busqueda.buscar(consulta, limite)]}
+
+    def contar(self, faceta, filtros):
+        """
+        Revistas por valor de una faceta entre las que cumplen los filtros.
+
+        Raises:
+            ErrorConsulta: Si la faceta o algún filtro no existen
+        """
+        if faceta not in facetas.FACETAS or not set(filtros) <= set(facetas.FACETAS):
+            raise ErrorConsulta(404, f"Las facetas son {', '.join(facetas.FACETAS)}")
+        try:
+            return {"faceta": faceta, "filtros": filtros, "total": self.facetas.total(filtros),
+                    "valores": self.facetas.contar(faceta, filtros)}
+        except KeyError as e:
+            raise ErrorConsulta(404, f"No existe el valor {e}")
+
+    def detalle(self, titulo):
+        """
+        Todo lo que se sabe de una revista.
+
+        Raises:
+            ErrorConsulta: Si el título no está en revistas.json ni en el catálogo
+        """
+        if titulo not in self.revistas and titulo not in self.catalogo:
+            titulo = titulo.lower()
+        if titulo not in self.revistas and titulo not in self.catalogo:
+            raise ErrorConsulta(404, f"No existe la revista {titulo}")
+        info = self.revistas.get(titulo, {})
+        return {"titulo": titulo, "areas": info.get("areas", []), "catalogos": info.get("catalogos", []),
+                "scimago": self.catalogo.get(titulo)}
+
+def entero(parametros, nombre, defecto, minimo=1, maximo=None):
+    """Lee un parámetro entero de la consulta, dentro de [minimo, maximo]"""
+    try:
+        valor = int(parametros.get(nombre, defecto))
+    except ValueError:
+        raise ErrorConsulta(400, f"{nombre} debe ser un número entero")
+    if valor < minimo or maximo is not None and valor > maximo:
+        raise ErrorConsulta(400, f"{nombre} debe estar entre {minimo} y {maximo or 'infinito'}")
+    return valor
+
+def responder(datos, ruta, pares, servidor):
+    """
+    Resuelve una ruta de la API.
+
+    Args:
+        datos (DatosRevistas): Datos cargados
+        ruta (str): Ruta de la petición, sin la consulta
+        pares (list): Parámetros de la consulta como pares (nombre, valor); un nombre puede repetirse
+        servidor (ServidorAPI): Servidor (para las estadísticas de la caché)
+
+    Returns:
+        object: Datos serializables en JSON
+
+    Raises:
+        ErrorConsulta: Ruta o parámetros no válidos
+    """
+    # Los títulos pueden llevar "/": solo se separa el primer segmento
+    partes = [unquote(parte) for parte in ruta.strip('/').split('/', 1)] if ruta.strip('/') else []
+    parametros = dict(pares)
+    if partes in (["catalogos"], ["areas"]):
+        return datos.nombres(partes[0])
+    if len(partes) == 2 and partes[0] in ("catalogos", "areas"):
+        tipo = partes[0]
+        filtro_tipo = "areas" if tipo == "catalogos" else "catalogos"
+        return datos.listar(tipo, partes[1], filtro_tipo, parametros.get(filtro_tipo[:-1]),
+                            entero(parametros, "pagina", 1),
+                            entero(parametros, "por_pagina", POR_PAGINA, maximo=MAXIMO_POR_PAGINA))
+    if partes == ["buscar"]:
+        if not parametros.get("q"):
+            raise ErrorConsulta(400, "Falta el parámetro q")
+        return datos.buscar(parametros["q"], entero(parametros, "limite", 10, maximo=100))
+    if len(partes) == 2 and partes[0] == "revistas":
+        return datos.detalle(partes[1])
+    if partes == ["facetas"]:
+        return {faceta: len(datos.facetas.nombres[faceta]) for faceta in facetas.FACETAS}
+    if len(partes) == 2 and partes[0] == "facetas":
+        return datos.contar(partes[1], facetas.leer_filtros(f"{nombre}={valor}" for nombre, valor in pares))
+    if partes == ["estadisticas"]:
+        return {"revistas": len(datos.revistas), "catalogo": len(datos.catalogo),
+                "catalogos": len(datos.indice["catalogos"]), "areas": len(datos.indice["areas"]),
+                "cache": servidor.cache.estadisticas()}
+    raise ErrorConsulta(404, f"Ruta desconocida: {ruta}")
+
+class ManejadorAPI(BaseHTTPRequestHandler):
+    """Atiende las peticiones GET; la conexión sigue abierta entre peticiones (HTTP/1.1)."""
+
+    protocol_version = "HTTP/1.1"
+    # Cabeceras y cuerpo salen en dos escrituras: con Nagle, cada respuesta de una conexión
+    # persistente esperaría el ACK retardado del cliente (~40 ms)
+    disable_nagle_algorithm = True
+    server_version = "RevistasAPI/1.0"
+
+    def do_GET(self):
+        inicio = time.perf_counter()
+        partes = urlsplit(self.path)
+        ruta = partes.path.rstrip('/') or '/'
+        if ruta == "/metricas":
+            self.enviar(200, metricas.a_prometheus().encode('utf-8'), "text/plain; version=0.0.4")
+            return
+        pares = sorted(parse_qsl(partes.query))
+        # Misma respuesta para los mismos parámetros aunque vengan en otro orden
+        clave = ruta + "?" + urlencode(pares)
+        respuesta = self.server.cache.obtener(clave) if ruta != "/estadisticas" else None
+        codigo = 200
+        if respuesta is None:
+            try:
+                respuesta = Respuesta(responder(self.server.datos, ruta, pares, self.server))
+                if ruta != "/estadisticas":
+                    self.server.cache.guardar(clave, respuesta)
+            except ErrorConsulta as e:
+                codigo, respuesta = e.codigo, Respuesta({"error": str(e)})
+        cuerpo, codificacion = respuesta.cuerpo, None
+        if len(cuerpo) >= MINIMO_GZIP and "gzip" in self.headers.get("Accept-Encoding", ""):
+            cuerpo, codificacion = respuesta.comprimido(), "gzip"
+        self.enviar(codigo, cuerpo, "application/json; charset=utf-8", codificacion)
+        metricas.observar("api", time.perf_counter() - inicio, ruta=ruta.split('/')[1] or 'raiz')
+        metricas.incrementar("api_respuestas", codigo=codigo)
+
+    def enviar(self, codigo, cuerpo, tipo, codificacion=None):
+        self.send_response(codigo)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.send_header("Vary", "Accept-Encoding")
+        # El front-end puede servirse desde otro origen
+        self.send_header("Access-Control-Allow-Origin", "*")
+        if codificacion:
+            self.send_header("Content-Encoding", codificacion)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *args):
+        if self.server.registrar:
+            super().log_message(formato, *args)
+
+class ServidorAPI(ThreadingHTTPServer):
+    """Servidor con un hilo por conexión y los datos y la caché compartidos."""
+
+    daemon_threads = True
+    # Con la cola por defecto (5), muchos clientes que conectan a la vez esperan el reintento de SYN (1 s)
+    request_queue_size = 128
+
+    def __init__(self, direccion, datos, capacidad_cache=CAPACIDAD_CACHE, registrar=False):
+        super().__init__(direccion, ManejadorAPI)
+        self.datos = datos
+        self.cache = CacheLRU(capacidad_cache)
+        self.registrar = registrar
+
+def prueba_carga(url, clientes=16, peticiones=2000, semilla=0):
+    """
+    Mide el servidor con varios clientes concurrentes.
+
+    Cada cliente usa una sola conexión persistente (con gzip) y pide una mezcla de vistas:
+    listas de catálogos y áreas, páginas de un catálogo o un área (a veces filtradas),
+    búsquedas y detalles de revistas, elegidas al azar entre los datos del propio servidor.
+
+    Args:
+        url (str): URL del servidor, p. ej. http://127.0.0.1:8000
+        clientes (int): Clientes (hilos) simultáneos
+        peticiones (int): Peticiones en total
+        semilla (int): Semilla para que la mezcla sea la misma en cada prueba
+
+    Returns:
+        dict: Peticiones por segundo, latencias, bytes recibidos, errores y estadísticas de la caché
+    """
+    direccion = urlsplit(url)
+
+    def pedir(conexion, ruta):
+        conexion.request("GET", ruta, headers={"Accept-Encoding": "gzip"})
+        respuesta = conexion.getresponse()
+        cuerpo = respuesta.read()
+        if respuesta.getheader("Content-Encoding") == "gzip":
+            return respuesta.status, len(cuerpo), gzip.decompress(cuerpo)
+        return respuesta.status, len(cuerpo), cuerpo
+
+    conexion = http.client.HTTPConnection(direccion.hostname, direccion.port, timeout=30)
+    catalogos = [c["nombre"] for c in json.loads(pedir(conexion, "/catalogos")[2])]
+    areas = [a["nombre"] for a in json.loads(pedir(conexion, "/areas")[2])]
+    titulos = [r["titulo"] for nombre in catalogos[:3]
+               for r in json.loads(pedir(conexion, f"/catalogos/{quote(nombre, safe='')}?por_pagina={MAXIMO_POR_PAGINA}")[2])["revistas"]]
+    conexion.close()
+    if not catalogos or not areas or not titulos:
+        raise ValueError(f"El servidor de {url} no tiene revistas")
+
+    generador = random.Random(semilla)
+    rutas = []
+    for _ in range(peticiones):
+        tipo = generador.random()
+        if tipo < 0.05:
+            rutas.append(generador.choice(["/catalogos", "/areas"]))
+        elif tipo < 0.45:
+            ruta = f"/catalogos/{quote(generador.choice(catalogos), safe='')}?pagina={generador.randint(1, 5)}"
+            rutas.append(ruta + (f"&area={quote(generador.choice(areas), safe='')}" if generador.random() < 0.3 else ""))
+        elif tipo < 0.65:
+            rutas.append(f"/areas/{quote(generador.choice(areas), safe='')}?pagina={generador.randint(1, 5)}")
+        elif tipo < 0.85:
+            titulo = generador.choice(titulos)
+            rutas.append(f"/buscar?q={quote(titulo[:generador.randint(4, max(4, len(titulo)))])}")
+        else:
+            rutas.append(f"/revistas/{quote(generador.choice(titulos), safe='')}")
+
+    latencias = Histograma()
+    lock = threading.Lock()
+    totales = {"bytes": 0, "errores": 0}
+    siguiente = iter(rutas)
+
+    def cliente():
+        conexion = http.client.HTTPConnection(direccion.hostname, direccion.port, timeout=30)
+        propias, recibidos, errores = Histograma(), 0, 0
+        while True:
+            with lock:
+                ruta = next(siguiente, None)
+            if ruta is None:
+                break
+            inicio = time.perf_counter()
+            try:
+                estado, tamano, _ = pedir(conexion, ruta)
+                recibidos += tamano
+                errores += estado >= 500
+            except (OSError, http.client.HTTPException):
+                errores += 1
+                conexion.close()
+            propias.observar(time.perf_counter() - inicio)
+        conexion.close()
+        with lock:
+            latencias.combinar(propias)
+            totales["bytes"] += recibidos
+            totales["errores"] += errores
+
+    hilos = [threading.Thread(target=cliente) for _ in range(clientes)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    conexion = http.client.HTTPConnection(direccion.hostname, direccion.port, timeout=30)
+    cache = json.loads(pedir(conexion, "/estadisticas")[2])["cache"]
+    conexion.close()
+    return {"peticiones": peticiones, "clientes": clientes, "segundos": duracion,
+            "peticiones_por_segundo": peticiones / duracion,
+            "p50_ms": latencias.percentil(50) * 1000, "p95_ms": latencias.percentil(95) * 1000,
+            "p99_ms": latencias.percentil(99) * 1000, "maximo_ms": latencias.maximo * 1000,
+            "kb_por_respuesta": totales["bytes"] / peticiones / 1024, "errores": totales["errores"], "cache": cache}
+
+def main():
+    parser = argparse.ArgumentParser(description="API HTTP local sobre las revistas")
+    sub = parser.add_subparsers(dest="accion", required=True)
+    servir = sub.add_parser("servir", help="Iniciar el servidor")
+    servir.add_argument("--revistas", default="revistas.json", help="JSON generado por leer_csv.py")
+    servir.add_argument("--catalogo", default="revistas_scimago.json",
+                        help="Catálogo de SCIMAGO: JSON o catálogo mapeado (.catalogo)")
+    servir.add_argument("--facetas", default=facetas.ARCHIVO_FACETAS,
+                        help="Facetas generadas por facetas.py construir (si no existe o está desactualizado "
+                             "se construyen al iniciar)")
+    servir.add_argument("--host", default="127.0.0.1", help="Dirección en la que escuchar")
+    servir.add_argument("--puerto", type=int, default=PUERTO, help="Puerto")
+    servir.add_argument("--cache", type=int, default=CAPACIDAD_CACHE, help="Respuestas que guarda la caché LRU")
+    servir.add_argument("--registrar", action="store_true", help="Mostrar cada petición")
+    carga = sub.add_parser("carga", help="Medir un servidor en marcha con varios clientes concurrentes")
+    carga.add_argument("--url", default=f"http://127.0.0.1:{PUERTO}", help="URL del servidor")
+    carga.add_argument("--clientes", type=int, default=16, help="Clientes simultáneos")
+    carga.add_argument("--peticiones", type=int, default=2000, help="Peticiones en total")
+    args = parser.parse_args()
+
+    if args.accion == "carga":
+        print(json.dumps(prueba_carga(args.url, args.clientes, args.peticiones), ensure_ascii=False, indent=2))
+        return
+
+    inicio = time.perf_counter()
+    datos = DatosRevistas.cargar(args.revistas, args.catalogo, args.facetas)
+    print(f"{len(datos.revistas)} revistas y {len(datos.catalogo)} del catálogo cargadas en "
+          f"{time.perf_counter() - inicio:.2f} s")
+    servidor = ServidorAPI((args.host, args.puerto), datos, args.cache, args.registrar)
+    print(f"Escuchando en http://{args.host}:{servidor.server_port}/ (Ctrl+C para terminar)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+'''Paridad del análisis de HTML sobre las páginas grabadas en datos/fixtures/html.
+
+Cada página se analiza con el análisis rápido (subárboles, con el analizador más rápido
+instalado), con html.parser y subárboles (lo que se usa si no está lxml) y con el análisis
+completo de html.parser; con los tres se debe extraer el enlace o el registro de indice.json.'''
+import os
+import pytest
+import analizador_html
+import benchmark
+
+PAGINAS = list(analizador_html.paginas_de_fixtures(benchmark.cargar_fixtures()))
+
+VARIANTES = {
+    'rapido': lambda contenido, objetivo: analizador_html.analizar(contenido, objetivo),
+    'html.parser con subárboles': lambda contenido, objetivo: analizador_html.analizar(contenido, objetivo, "html.parser"),
+    'html.parser completo': lambda contenido, objetivo: analizador_html.analizar(contenido, None, "html.parser"),
+}
+
+@pytest.fixture(scope="module")
+def scrapper(tmp_path_factory):
+    """El scrapper, importado desde una carpeta temporal para que su scraping.log no quede en el repositorio"""
+    directorio = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("scrapper"))
+    try:
+        import web_scrapper_mejorado
+    finally:
+        os.chdir(directorio)
+    return web_scrapper_mejorado
+
+def objetivo_de(archivo):
+    """'busqueda' o 'revista' según el nombre del archivo grabado"""
+    return 'busqueda' if archivo.startswith('busqueda_') else 'revista'
+
+def extraer(scrapper, soup, objetivo, titulo):
+    """Enlace (búsqueda) o registro (revista) que extrae el scrapper de un soup"""
+    if objetivo == 'busqueda':
+        return scrapper.buscar_enlace_en_soup(soup, titulo)
+    datos = {}
+    scrapper.extraer_datos_de_soup(soup, titulo, datos)
+    return datos.get(titulo)
+
+def test_hay_paginas_de_los_dos_tipos():
+    assert {objetivo_de(archivo) for archivo, *_ in PAGINAS} == {'busqueda', 'revista'}
+
+@pytest.mark.parametrize("variante", VARIANTES)
+@pytest.mark.parametrize("archivo, contenido, titulo, esperado", PAGINAS, ids=[pagina[0] for pagina in PAGINAS])
+def test_extrae_lo_del_indice(scrapper, variante, archivo, contenido, titulo, esperado):
+    objetivo = objetivo_de(archivo)
+    soup = VARIANTES[variante](contenido, objetivo)
+    assert extraer(scrapper, soup, objetivo, titulo) == esperado
+
+@pytest.mark.parametrize("archivo, contenido", [pagina[:2] for pagina in PAGINAS], ids=[pagina[0] for pagina in PAGINAS])
+def test_subarboles_descartan_el_resto(archivo, contenido):
+    completo = analizador_html.analizar(contenido, None, "html.parser")
+    rapido = analizador_html.analizar(contenido, objetivo_de(archivo))
+    assert completo.find('div', class_='footer') is not None and completo.find('script') is not None
+    assert rapido.find('div', class_='footer') is None and rapido.find('script') is None
+    assert len(list(rapido.descendants)) < len(list(completo.descendants))
+
+def test_verificar_paridad(scrapper):
+    revisadas, diferentes = analizador_html.verificar_paridad(PAGINAS, scrapper.buscar_enlace_en_soup,
+                                                              scrapper.extraer_datos_de_soup)
+    assert revisadas == len(PAGINAS)
+    assert diferentes == []
@@ -0,0 +1,415 @@
+''' Versión asíncrona (asyncio) del web scrapper de SCIMAGO.
+
+Sigue el mismo flujo que web_scrapper_mejorado (búsqueda -> página de la revista), usa la
+misma caché y guarda el mismo JSON, pero cada revista pendiente es una corrutina en lugar
+de un hilo: miles de revistas en curso cuestan poco y nadie bloquea un hilo durmiendo.
+
+El bucle de eventos solo espera: la caché SQLite y el mapa de resoluciones se consultan en
+hilos (asyncio.to_thread) y el HTML se analiza en un pool de procesos, como en ejecutar_pipeline.'''
+import argparse
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import aiohttp
+import cache_http
+import resolucion
+import bitacora
+import actualizacion
+import web_scrapper_mejorado as scrapper
+from web_scrapper_mejorado import contador
+from limitador import LimitadorAdaptativo, CODIGOS_SATURACION
+from metricas import metricas, EscritorPeriodico, ARCHIVO_METRICAS, llamar_con_metricas, reiniciar
+
+REINTENTOS = 3
+
+class ClienteAsync:
+    """
+    Agrupa la sesión HTTP, el limitador global, la caché y el pool de análisis que comparten
+    todas las corrutinas.
+
+    Una corrutina solo reserva turno en el limitador cuando tiene una conexión libre, así las
+    reservas pendientes nunca superan el número de conexiones y un cambio de tasa se aplica enseguida.
+    """
+
+    def __init__(self, sesion, limitador, conexiones, cache=cache_http.ARCHIVO_CACHE, presupuesto=None, pool=None):
+        self.sesion = sesion
+        self.limitador = limitador
+        self.conexiones = asyncio.Semaphore(conexiones)
+        self.cache = cache
+        # Cada petición reserva una unidad (actualizacion.Presupuesto)
+        self.presupuesto = presupuesto
+        # ProcessPoolExecutor del análisis; None para analizar en un hilo
+        self.pool = pool
+
+    async def descargar(self, url, validadores=None):
+        """Realiza una petición HTTP asíncrona y devuelve (contenido en bytes, cabeceras), o None si falla
+
+        Con validadores la petición es condicional; una respuesta 304 devuelve (None, cabeceras).
+        """
+        for intento in range(REINTENTOS + 1):
+            async with self.conexiones:
+                # Mismo limitador que la versión con hilos; aquí la espera no ocupa un hilo
+                try:
+                    with metricas.medir('espera_limitador'):
+                        await asyncio.sleep(self.limitador.reservar())
+                except asyncio.CancelledError:
+                    # Precarga cancelada antes de su turno: la ficha queda para otra petición
+                    self.limitador.devolver()
+                    metricas.incrementar('http_canceladas')
+                    raise
+                if self.presupuesto is not None:
+                    try:
+                        self.presupuesto.reservar()
+                    except actualizacion.PresupuestoAgotado:
+                        # La revista en curso queda para la siguiente ejecución; el turno no se usó
+                        self.limitador.devolver()
+                        raise
+                inicio = time.monotonic()
+                try:
+                    async with self.sesion.get(url, headers={**scrapper.CABECERAS, **(validadores or {})}) as response:
+                        contenido = await response.read()
+                        metricas.observar('peticion_http', time.monotonic() - inicio)
+                        metricas.incrementar('http_respuestas', estado=response.status)
+                        self.limitador.registrar(response.status, time.monotonic() - inicio,
+                                                 response.headers.get("Retry-After"))
+                        if response.status in CODIGOS_SATURACION and intento < REINTENTOS:
+                            metricas.incrementar('http_reintentos')
+                            logging.warning(f"Respuesta {response.status} para {url}, reintento {intento + 1}")
+                            continue
+                        if response.status == 304:
+                            return None, dict(response.headers)
+                        if response.status >= 400:
+                            # Ya se registró con su código: no pasa por la rama de error de red
+                            logging.error(f"Error al solicitar {url}:\n  {response.status} {response.reason}")
+                            return None
+                        return contenido, dict(response.headers)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    metricas.observar('peticion_http', time.monotonic() - inicio)
+                    metricas.incrementar('http_respuestas', estado='error_red')
+                    self.limitador.registrar(None)
+                    logging.error(f"Error al solicitar {url}:\n  {e}")
+                    return None
+        return None
+
+    async def obtener_pagina(self, url):
+        """
+        Obtiene los bytes de una URL usando la misma caché que la versión con hilos.
+
+        Igual que obtener_respuesta, una página caducada se revalida con una petición condicional.
+
+        Returns:
+            tuple: (bytes o None, 'acierto' | 'revalidada' | 'fallo')
+        """
+        inicio = time.perf_counter()
+        almacen = cache_http.abrir_cache(self.cache)
+        with metricas.medir('cache_lectura'):
+            respuesta = await asyncio.to_thread(almacen.leer_respuesta, url)
+        resultado = 'acierto' if respuesta is not None else 'fallo'
+        metricas.incrementar('cache_paginas', resultado=resultado)
+        if respuesta is None:
+            caducada = await asyncio.to_thread(almacen.leer_caducada, url)
+            validadores = cache_http.validadores(caducada[1]) if caducada else {}
+            respuesta = await self.descargar(url, validadores)
+            if respuesta is None:
+                return None, resultado
+            if respuesta[0] is None:
+                metricas.incrementar('revalidaciones', resultado='acierto')
+                await asyncio.to_thread(almacen.renovar, url, respuesta[1], caducada[2])
+                respuesta, resultado = caducada[:2], 'revalidada'
+            else:
+                if validadores:
+                    metricas.incrementar('revalidaciones', resultado='fallo')
+                with metricas.medir('cache_escritura'):
+                    await asyncio.to_thread(almacen.guardar, url, *respuesta)
+        metricas.observar('obtener_pagina', time.perf_counter() - inicio, resultado=resultado)
+        return respuesta[0], resultado
+
+    async def analizar(self, funcion, *args):
+        """
+        Ejecuta un análisis (scrapper.enlace_de_pagina, revista_de_pagina) sin bloquear el bucle.
+
+        Con pool se envía a los procesos de análisis y sus métricas se suman a las de este proceso;
+        sin pool se ejecuta en un hilo.
+        """
+        if self.pool is None:
+            return await asyncio.to_thread(funcion, *args)
+        inicio = time.perf_counter()
+        try:
+            resultado, parcial = await asyncio.get_running_loop().run_in_executor(
+                self.pool, llamar_con_metricas, funcion, *args)
+        finally:
+            metricas.observar('analisis_pool', time.perf_counter() - inicio, funcion=funcion.__name__)
+        metricas.combinar(parcial)
+        return resultado
+
+async def extraer_enlace_async(cliente, url_busqueda, titulo, max_paginas=3, precargar=False):
+    """Equivalente asíncrono de extraer_enlace_optimizado"""
+    mapa = resolucion.abrir_mapa()
+    conocida = await asyncio.to_thread(mapa.consultar, titulo)
+    if conocida is not None:
+        scrapper.registrar_paginas_busqueda(0)
+        return conocida[1]
+
+    guardado = await asyncio.to_thread(scrapper.leer_resultado, url_busqueda, 'enlace', cliente.cache)
+    if guardado is not None:
+        scrapper.registrar_paginas_busqueda(0)
+        if guardado[0]:
+            await asyncio.to_thread(mapa.registrar, guardado[0], titulo)
+        return guardado[0]
+
+    completo = True
+    revisadas = 0
+    siguiente = None  # Tarea que precarga los bytes de la página siguiente
+    try:
+        for pagina in range(1, max_paginas + 1):
+            url_con_pagina = scrapper.url_pagina_busqueda(url_busqueda, pagina)
+            logging.info(f"Buscando '{titulo}' en página {pagina}")
+            if siguiente is not None:
+                contenido, _ = await siguiente
+                siguiente = None
+            else:
+                contenido, origen = await cliente.obtener_pagina(url_con_pagina)
+                if origen == 'revalidada' and pagina == 1:
+                    # 304: el enlace extraído de esta misma búsqueda se renovó con ella
+                    guardado = await asyncio.to_thread(scrapper.resultado_revalidado, url_busqueda, 'enlace',
+                                                       cliente.cache)
+                    if guardado is not None and guardado[0]:
+                        await asyncio.to_thread(mapa.registrar, guardado[0], titulo)
+                        return guardado[0]
+            if precargar and pagina < max_paginas:
+                siguiente = asyncio.create_task(cliente.obtener_pagina(
+                    scrapper.url_pagina_busqueda(url_busqueda, pagina + 1)))
+            if contenido is None:
+                completo = False
+                continue
+            revisadas += 1
+            url_extraida, num_resultados = await cliente.analizar(scrapper.enlace_de_pagina, contenido, titulo, pagina)
+            if url_extraida:
+                await asyncio.to_thread(scrapper.guardar_resultado, url_busqueda, 'enlace', url_extraida,
+                                        cliente.cache)
+                await asyncio.to_thread(mapa.registrar, url_extraida, titulo)
+                return url_extraida
+            if num_resultados is None:
+                completo = False
+            elif num_resultados == 0:
+                break
+    finally:
+        # Cancelar la precarga aunque esté esperando turno en el limitador
+        if siguiente is not None:
+            siguiente.cancel()
+            # Esperar a que termine y recoger su excepción (p. ej. PresupuestoAgotado): asyncio.wait no
+            # la relanza sobre el resultado de este bloque y sí deja pasar una cancelación de esta corrutina
+            await asyncio.wait([siguiente])
+            if not siguiente.cancelled() and siguiente.exception() is not None:
+                logging.debug(f"Precarga descartada para '{titulo}': {siguiente.exception()!r}")
+        if revisadas:
+            scrapper.registrar_paginas_busqueda(revisadas)
+    if completo:
+        await asyncio.to_thread(scrapper.guardar_resultado, url_busqueda, 'enlace', None, cliente.cache)
+        await asyncio.to_thread(mapa.registrar_ausente, titulo)
+    return None
+
+async def procesar_revista_async(cliente, registro, titulo, url_base, url_busqueda, precargar=False, alias=()):
+    """
+    Procesa una revista individual; equivalente asíncrono de procesar_revista.
+    
+    El resultado se anota también para cada variante del título (alias).
+    """
+    titulos = (titulo, *alias)
+    try:
+        # Buscar la revista
+        nueva_palabra = url_busqueda + titulo.replace(" ", "+").lower()
+        logging.info(f"Buscando enlace para: {titulo}")
+        with metricas.medir('extraer_enlace_optimizado'):
+            palabra_clave = await extraer_enlace_async(cliente, nueva_palabra, titulo, precargar=precargar)
+
+        if palabra_clave is None:
+            contador['procesados'] += 1
+            contador['no_encontrados'] += len(titulos)
+            for nombre in titulos:
+                registro.agregar(nombre, 'no_encontrada')
+            logging.warning(f"[{contador['procesados']}/{contador['total']}] No se encontró: {titulo}")
+            return None
+
+        # Si encontramos la revista, extraer datos detallados
+        busqueda_maxima = url_base + palabra_clave
+        datos = {}
+        logging.info(f"Extrayendo datos de {titulo} en {busqueda_maxima}")
+        with metricas.medir('extraer_datos_finales'):
+            guardado = await asyncio.to_thread(scrapper.leer_resultado, busqueda_maxima, 'revista', cliente.cache)
+            if guardado is None:
+                contenido, origen = await cliente.obtener_pagina(busqueda_maxima)
+                if origen == 'revalidada':
+                    # 304: el registro extraído de esta misma página se renovó con ella
+                    guardado = await asyncio.to_thread(scrapper.resultado_revalidado, busqueda_maxima, 'revista',
+                                                       cliente.cache)
+            if guardado is not None:
+                datos[titulo] = guardado[0]
+            elif contenido is not None:
+                completo, datos[titulo] = await cliente.analizar(scrapper.revista_de_pagina, contenido, titulo)
+                if completo:
+                    await asyncio.to_thread(scrapper.guardar_resultado, busqueda_maxima, 'revista', datos[titulo],
+                                            cliente.cache)
+            else:
+                datos[titulo] = {}
+                logging.error(f"No se pudo obtener datos para {titulo}")
+        issn = resolucion.separar_issn(datos[titulo].get("ISSN"))
+        if issn:
+            await asyncio.to_thread(resolucion.abrir_mapa().registrar, palabra_clave, issn=issn)
+        # El sello de la revista lleva la hora en que se obtuvo su página, aunque saliera de la caché
+        obtenido = await asyncio.to_thread(scrapper.pagina_obtenida, busqueda_maxima, cliente.cache)
+
+        # Un solo hilo de eventos: no hace falta lock para anotar en la bitácora
+        contador['procesados'] += 1
+        contador['encontrados'] += len(titulos)
+        for nombre in titulos:
+            registro.agregar(nombre, 'encontrada', datos[titulo], obtenido)
+        logging.info(f"[{contador['procesados']}/{contador['total']}] Procesado: {titulo}")
+        return datos
+    except actualizacion.PresupuestoAgotado:
+        # Sin anotarla en la bitácora: se retoma en la siguiente ejecución
+        logging.info(f"Presupuesto agotado: {titulo} queda para la siguiente ejecución")
+        return None
+    except Exception as e:
+        contador['procesados'] += 1
+        for nombre in titulos:
+            registro.agregar(nombre, 'error', e)
+        logging.error(f"[{contador['procesados']}/{contador['total']}] Error procesando {titulo}: {e}")
+        return None
+
+async def ejecutar(titulos, url_base, registro, concurrencia=1000, conexiones=10, peticiones_por_segundo=2.0,
+                   tasa_maxima=10.0, cache=cache_http.ARCHIVO_CACHE, timeout=10, precargar=False, presupuesto=None,
+                   alias=None, procesos_analisis=None):
+    """
+    Procesa todas las revistas con corrutinas.
+
+    Args:
+        titulos (list): Títulos pendientes
+        url_base (str): URL base de SCIMAGO (o de un servidor local de prueba), terminada en '/'
+        registro (Bitacora): Bitácora donde se anota cada revista terminada
+        concurrencia (int): Revistas en curso al mismo tiempo
+        conexiones (int): Conexiones HTTP simultáneas
+        peticiones_por_segundo (float): Tasa global inicial; el limitador la ajusta según las respuestas
+        tasa_maxima (float): Tasa máxima que puede alcanzar el limitador (presupuesto de cortesía)
+        cache (str): Archivo SQLite (o carpeta, formato anterior) de la caché HTML
+        timeout (int): Tiempo máximo por petición, en segundos
+        precargar (bool): Pedir la siguiente página de búsqueda mientras se revisa la actual
+        presupuesto (actualizacion.Presupuesto): Cada petición reserva una unidad; al agotarse no se
+            hacen más peticiones y las revistas sin terminar quedan para la siguiente ejecución
+        alias (dict): {titulo: [variantes]} que reciben el mismo resultado (scrapper.agrupar_pendientes)
+        procesos_analisis (int): Procesos de análisis; None para uno por núcleo, 0 para analizar en un hilo
+    """
+    alias = alias or {}
+    url_busqueda = url_base + "journalsearch.php?q=+"
+    limitador = LimitadorAdaptativo(tasa_inicial=peticiones_por_segundo, tasa_maxima=tasa_maxima)
+    semaforo = asyncio.Semaphore(concurrencia)
+    pool = ProcessPoolExecutor(procesos_analisis, initializer=reiniciar) if procesos_analisis != 0 else None
+    if pool is not None:
+        # Con fork los procesos se crean todos en el primer envío: hacerlo antes de que haya hilos
+        await asyncio.get_running_loop().run_in_executor(pool, scrapper.llamar, int)
+    # Abrir el mapa (y crear su tabla) aquí y no en la primera corrutina que lo consulte
+    await asyncio.to_thread(resolucion.abrir_mapa)
+    conector = aiohttp.TCPConnector(limit=conexiones)
+
+    try:
+        async with aiohttp.ClientSession(connector=conector, timeout=aiohttp.ClientTimeout(total=timeout)) as sesion:
+            cliente = ClienteAsync(sesion, limitador, conexiones, cache, presupuesto, pool)
+
+            async def con_limite(titulo):
+                async with semaforo:
+                    if presupuesto is not None and presupuesto.agotado():
+                        return
+                    await procesar_revista_async(cliente, registro, titulo, url_base, url_busqueda, precargar,
+                                                 alias.get(titulo, ()))
+
+            await asyncio.gather(*(con_limite(titulo) for titulo in titulos))
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description="Web scrapper asíncrono de SCIMAGO")
+    parser.add_argument("--url-base", default="https://www.scimagojr.com/",
+                        help="URL base del sitio (permite usar un servidor local de prueba)")
+    parser.add_argument("--concurrencia", type=int, default=1000, help="Revistas en curso al mismo tiempo")
+    parser.add_argument("--conexiones", type=int, default=10, help="Conexiones HTTP simultáneas")
+    parser.add_argument("--procesos-analisis", type=int, default=os.cpu_count(),
+                        help="Procesos que analizan el HTML (0 para analizar en un hilo)")
+    parser.add_argument("--peticiones-por-segundo", type=float, default=2.0,
+                        help="Tasa global inicial de peticiones (el limitador la ajusta sola)")
+    parser.add_argument("--tasa-maxima", type=float, default=10.0, help="Tasa máxima de peticiones por segundo")
+    parser.add_argument("--cache", default=cache_http.ARCHIVO_CACHE,
+                        help="Archivo SQLite de la caché HTML (una carpeta usa el formato anterior)")
+    parser.add_argument("--precargar-busqueda", action="store_true",
+                        help="Pedir la siguiente página de búsqueda mientras se revisa la actual")
+    parser.add_argument("--entrada", default="revistas.json", help="JSON con las revistas a buscar")
+    parser.add_argument("--salida", default=bitacora.ARCHIVO_CATALOGO,
+                        help="Catálogo de SCIMAGO: JSON o catálogo mapeado (.catalogo)")
+    parser.add_argument("--metricas", default=ARCHIVO_METRICAS,
+                        help="Ruta base de los archivos de métricas (se escriben RUTA.json y RUTA.prom)")
+    parser.add_argument("--intervalo-metricas", type=float, default=10.0,
+                        help="Segundos entre escrituras de las métricas")
+    parser.add_argument("--completar", action="store_true",
+                        help="Volver a buscar las revistas del catálogo a las que les falta algún campo")
+    parser.add_argument("--bitacora", default=bitacora.ARCHIVO_BITACORA,
+                        help="Bitácora JSONL de avance (permite continuar una ejecución interrumpida)")
+    parser.add_argument("--refrescar", action="store_true",
+                        help="Volver a procesar también las revistas del catálogo (las páginas caducadas "
+                             "se revalidan con peticiones condicionales)")
+    parser.add_argument("--frescura", type=float, default=cache_http.TTL_CACHE / 86400,
+                        help="Días que una página guardada se usa sin revalidarla")
+    parser.add_argument("--presupuesto-peticiones", type=int,
+                        help="Peticiones HTTP máximas de la ejecución (las revistas restantes quedan para la siguiente)")
+    parser.add_argument("--presupuesto-minutos", type=float, help="Duración máxima de la ejecución")
+    args = parser.parse_args()
+    cache_http.abrir_cache(args.cache).ttl = args.frescura * 86400
+
+    revistas = scrapper.leer_json_seguro(args.entrada)
+    catalogo = bitacora.cargar_catalogo(args.salida)
+    if not revistas:
+        logging.error("No se pudo cargar el archivo de revistas, terminando ejecución")
+        exit(1)
+
+    terminados = bitacora.titulos_terminados(args.bitacora)
+    ruta_sellos = actualizacion.ruta_sellos(args.salida)
+    sellos = actualizacion.cargar_sellos(ruta_sellos)
+    pendientes = actualizacion.planificar(revistas, catalogo, sellos, terminados, args.refrescar,
+                                          scrapper.registro_incompleto if args.completar else None)
+    logging.info(f"Plan: {actualizacion.resumen_plan(pendientes, catalogo, sellos)}")
+    pendientes, alias = scrapper.agrupar_pendientes(pendientes)
+    contador['total'] = len(pendientes)
+    logging.info(f"Total de revistas a procesar: {contador['total']}"
+                 + (f" (más {sum(map(len, alias.values()))} variantes de título)" if alias else ""))
+    if not pendientes:
+        logging.info("No hay revistas nuevas para procesar")
+    else:
+        presupuesto = None
+        if args.presupuesto_peticiones is not None or args.presupuesto_minutos is not None:
+            presupuesto = actualizacion.Presupuesto(args.presupuesto_peticiones,
+                                                    args.presupuesto_minutos and args.presupuesto_minutos * 60)
+        with bitacora.Bitacora(args.bitacora) as registro, \
+                EscritorPeriodico(metricas, args.metricas, args.intervalo_metricas):
+            asyncio.run(ejecutar(pendientes, args.url_base, registro, args.concurrencia, args.conexiones,
+                                 args.peticiones_por_segundo, args.tasa_maxima, args.cache,
+                                 precargar=args.precargar_busqueda, presupuesto=presupuesto, alias=alias,
+                                 procesos_analisis=args.procesos_analisis))
+        if presupuesto is not None and presupuesto.agotado():
+            logging.info(f"Presupuesto agotado ({presupuesto.usadas()} peticiones): "
+                         f"{contador['total'] - contador['procesados']} revistas quedan para la siguiente ejecución")
+        scrapper.resumen_paginas_busqueda()
+        scrapper.resumen_variantes(alias)
+        logging.info(f"Métricas por etapa ({args.metricas}.json, {args.metricas}.prom):\n{metricas.tabla_resumen()}")
+        logging.info(f"Proceso completado. Revistas encontradas: {contador['encontrados']}")
+        logging.info(f"Revistas no encontradas: {contador['no_encontrados']}")
+
+    # Incorporar la bitácora al catálogo (también la de una ejecución anterior sin compactar)
+    incorporadas = bitacora.compactar(args.bitacora, args.salida, catalogo, ruta_sellos)
+    if incorporadas:
+        logging.info(f"{incorporadas} revistas incorporadas a {args.salida}")
+    else:
+        logging.info("No se encontraron revistas nuevas")
+
+if __name__ == "__main__":
+    main()
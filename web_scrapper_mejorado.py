@@ -3,17 +3,27 @@ y la guardará en un nuevo archivo JSON - versión optimizada con multithreading
 # importar las librerías necesarias
 import json
 import requests
-from bs4 import BeautifulSoup
 import time
-import random
-import os
-import hashlib
 import logging
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+import argparse
+import os
+import queue
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import itertools
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 import leer_csv
+import cache_http
+import analizador_html
+import resolucion
+import bitacora
+import catalogo_mapeado
+import actualizacion
+from limitador import LimitadorAdaptativo, CODIGOS_SATURACION
+from metricas import metricas, EscritorPeriodico, ARCHIVO_METRICAS, llamar_con_metricas, reiniciar
 
 # Configurar logging
 logging.basicConfig(
@@ -25,11 +35,36 @@ logging.basicConfig(
     ]
 )
 
+# Limitador global: todas las peticiones de todos los hilos pasan por él
+limitador = LimitadorAdaptativo()
+# Presupuesto de la ejecución en curso (lo fija ejecutar_pipeline); cada petición reserva una unidad
+presupuesto_activo = None
+REINTENTOS_SATURACION = 3
+# Prioridades de la cola de descargas del pipeline (menor va antes)
+CONTINUACION, REVISTA_NUEVA, FIN = 0, 1, 2
+
+# Subir al cambiar lo que se extrae de las páginas: invalida solo los resultados guardados en la caché
+VERSION_EXTRACTOR = 3
+# Campos que extrae extraer_datos_de_soup; con --completar se vuelven a buscar los registros a los que les falta alguno
+CAMPOS_REGISTRO = ("Subject Area and Category", "Publisher", "H-Index", "Publication type", "ISSN", "Homepage", "Widget")
+
 # Variables compartidas con protección de concurrencia
-lock = threading.Lock()
 session_local = threading.local()
-resultados = {}
 contador = {'procesados': 0, 'total': 0, 'encontrados': 0, 'no_encontrados': 0}
+# Páginas de búsqueda revisadas por título (0 = resuelto sin buscar)
+paginas_por_titulo = Counter()
+lock_estadisticas = threading.Lock()
+
+# Cabeceras para emular navegador
+CABECERAS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/113.0.0.0 Safari/537.36"
+    ),
+    "Accept-Language": "es-ES,es;q=0.9",
+    "Referer": "https://www.scimagojr.com/"
+}
 
 # Crear las funciones necesarias para el web scrapper
 
@@ -44,6 +79,9 @@ def leer_json_seguro(archivo:str):
         dict: Contenido del archivo JSON como diccionario, o None si hubo un error.
     """
     try:
+        # Los archivos .ndjson/.jsonl se leen registro por registro
+        if leer_csv.formato_por_extension(archivo) == 'ndjson':
+            return dict(leer_csv.iterar_json(archivo))
         with open(archivo, 'r', encoding='utf-8') as f:
             return json.load(f)
     except (json.JSONDecodeError, FileNotFoundError) as e:
@@ -54,120 +92,388 @@ def get_session():
     """Obtiene una sesión HTTP para el hilo actual"""
     if not hasattr(session_local, "session"):
         session_local.session = requests.Session()
+        # Solo reintentos de conexión: los 429/5xx los reintenta get_soup a través del limitador
         retries = Retry(
             total=3,                   # hasta 3 reintentos
             backoff_factor=1,          # espera progresiva: 1s, 2s, 4s
-            status_forcelist=[429, 500, 502, 503, 504],
             allowed_methods=["GET"]
         )
         session_local.session.mount("https://", HTTPAdapter(max_retries=retries))
     return session_local.session
 
-def get_soup_with_cache(url, cache_dir="cache"):
-    """Obtiene el soup de una URL con caché para evitar peticiones repetidas"""
-    # Crear directorio de caché si no existe
-    if not os.path.exists(cache_dir):
-        os.makedirs(cache_dir)
-    
-    # Crear un nombre de archivo hash basado en la URL
-    url_hash = hashlib.md5(url.encode()).hexdigest()
-    cache_file = os.path.join(cache_dir, f"{url_hash}.html")
-    
-    # Si existe en caché, usar eso
-    if os.path.exists(cache_file):
-        with open(cache_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-        return BeautifulSoup(content, "html.parser")
-    
-    # Si no, hacer la petición y guardar en caché
-    soup = get_soup(url)
-    if soup:
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            f.write(str(soup))
-    return soup
+def leer_resultado(clave, tipo, cache=cache_http.ARCHIVO_CACHE):
+    """Devuelve (valor,) si hay un resultado de extracción guardado con la versión actual, o None"""
+    guardado = cache_http.abrir_cache(cache).leer_resultado(clave, tipo, VERSION_EXTRACTOR)
+    metricas.incrementar('cache_resultados', tipo=tipo, resultado='fallo' if guardado is None else 'acierto')
+    return guardado
 
-def get_soup(url):
-    """Realiza una petición HTTP y devuelve un objeto BeautifulSoup"""
+def resultado_revalidado(url, tipo, cache=cache_http.ARCHIVO_CACHE):
+    """Tras un 304, devuelve (valor,) si hay un resultado extraído de la copia guardada de la página, o None"""
+    guardado = cache_http.abrir_cache(cache).leer_resultado_de_pagina(url, tipo, VERSION_EXTRACTOR)
+    metricas.incrementar('cache_resultados', tipo=tipo, resultado='fallo' if guardado is None else 'acierto')
+    return guardado
+
+def pagina_obtenida(url, cache=cache_http.ARCHIVO_CACHE):
+    """Marca de tiempo en que se obtuvo del servidor la página de una URL (descarga o último 304), o None"""
+    return cache_http.abrir_cache(cache).obtenido(url)
+
+def guardar_resultado(clave, tipo, valor, cache=cache_http.ARCHIVO_CACHE):
+    """Guarda un resultado de extracción con la versión actual del extractor"""
+    cache_http.abrir_cache(cache).guardar_resultado(clave, tipo, VERSION_EXTRACTOR, valor)
+
+def obtener_pagina(url, cache=cache_http.ARCHIVO_CACHE, cancelado=None):
+    """Devuelve los bytes de una URL tal como llegaron, desde la caché o descargándolos
+    
+    Si el evento cancelado se activa mientras se espera turno, no se hace la petición.
+    """
+    return obtener_respuesta(url, cache, cancelado)[0]
+
+def obtener_respuesta(url, cache=cache_http.ARCHIVO_CACHE, cancelado=None):
+    """
+    Obtiene los bytes de una URL e indica de dónde salieron.
+    
+    Una página caducada se revalida con una petición condicional; si el servidor responde 304
+    se renueva en la caché y se devuelve la copia guardada.
+    
+    Returns:
+        tuple: (bytes o None, 'acierto' | 'revalidada' | 'fallo')
+    """
+    inicio = time.perf_counter()
+    almacen = cache_http.abrir_cache(cache)
+    with metricas.medir('cache_lectura'):
+        respuesta = almacen.leer_respuesta(url)
+    resultado = 'acierto' if respuesta is not None else 'fallo'
+    metricas.incrementar('cache_paginas', resultado=resultado)
+    if respuesta is None:
+        caducada = almacen.leer_caducada(url)
+        validadores = cache_http.validadores(caducada[1]) if caducada else {}
+        respuesta = descargar(url, cancelado, validadores)
+        if respuesta is not None and respuesta[0] is None:
+            metricas.incrementar('revalidaciones', resultado='acierto')
+            almacen.renovar(url, respuesta[1], caducada[2])
+            respuesta, resultado = caducada[:2], 'revalidada'
+        elif respuesta is not None:
+            if validadores:
+                metricas.incrementar('revalidaciones', resultado='fallo')
+            with metricas.medir('cache_escritura'):
+                almacen.guardar(url, *respuesta)
+    metricas.observar('obtener_pagina', time.perf_counter() - inicio, resultado=resultado)
+    return (respuesta[0] if respuesta is not None else None), resultado
+
+def get_soup_with_cache(url, cache=cache_http.ARCHIVO_CACHE, objetivo=None):
+    """Obtiene el soup de una URL con caché para evitar peticiones repetidas
+    
+    objetivo ('busqueda' o 'revista') limita el análisis a los subárboles que usa su extractor.
+    """
+    with metricas.medir('get_soup_with_cache'):
+        contenido = obtener_pagina(url, cache)
+        if contenido is None:
+            return None
+        return analizador_html.analizar(contenido, objetivo)
+
+def descargar(url, cancelado=None, validadores=None):
+    """Realiza una petición HTTP y devuelve (contenido en bytes, cabeceras), o None si falla o se canceló
+    
+    Con validadores (If-None-Match / If-Modified-Since) la petición es condicional; si la página
+    no cambió, el servidor responde 304 y se devuelve (None, cabeceras).
+    """
     # Obtener sesión para este hilo
     session = get_session()
     
-    # Cabeceras para emular navegador
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/113.0.0.0 Safari/537.36"
-        ),
-        "Accept-Language": "es-ES,es;q=0.9",
-        "Referer": "https://www.scimagojr.com/"
-    }
-    
-    try:
-        # Petición con timeout de 10 segundos
-        response = session.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
+    for intento in range(REINTENTOS_SATURACION + 1):
+        # Esperar turno en el limitador global (reemplaza las esperas aleatorias por hilo)
+        with metricas.medir('espera_limitador'):
+            turno = limitador.esperar(cancelado)
+        if not turno:
+            metricas.incrementar('http_canceladas')
+            return None
+        if presupuesto_activo is not None:
+            try:
+                presupuesto_activo.reservar()
+            except actualizacion.PresupuestoAgotado:
+                # La revista en curso queda para la siguiente ejecución; el turno no se usó
+                limitador.devolver()
+                raise
+        inicio = time.monotonic()
+        try:
+            # Petición con timeout de 10 segundos
+            response = session.get(url, headers={**CABECERAS, **(validadores or {})}, timeout=10)
+        except requests.exceptions.RequestException as e:
+            metricas.observar('peticion_http', time.monotonic() - inicio)
+            metricas.incrementar('http_respuestas', estado='error_red')
+            limitador.registrar(None)
+            logging.error(f"Error al solicitar {url}:\n  {e}")
+            return None
         
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error al solicitar {url}:\n  {e}")
-        return None
+        metricas.observar('peticion_http', time.monotonic() - inicio)
+        metricas.incrementar('http_respuestas', estado=response.status_code)
+        limitador.registrar(response.status_code, time.monotonic() - inicio, response.headers.get("Retry-After"))
+        if response.status_code in CODIGOS_SATURACION and intento < REINTENTOS_SATURACION:
+            metricas.incrementar('http_reintentos')
+            logging.warning(f"Respuesta {response.status_code} para {url}, reintento {intento + 1}")
+            continue
+        if response.status_code == 304:
+            return None, dict(response.headers)
+        
+        try:
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logging.error(f"Error al solicitar {url}:\n  {e}")
+            return None
+        break
     
-    # Añadir variación aleatoria al tiempo de espera
-    time.sleep(random.uniform(0.8, 1.8))
+    return response.content, dict(response.headers)
+
+def get_soup(url):
+    """Realiza una petición HTTP y devuelve un objeto BeautifulSoup"""
+    with metricas.medir('get_soup'):
+        respuesta = descargar(url)
+        if respuesta is None:
+            return None
+        return analizador_html.analizar(respuesta[0])
+
+def buscar_enlace_en_soup(soup, titulo, pagina=1):
+    """
+    Busca en una página de resultados de SCIMAGO el enlace de la revista con el título dado.
     
-    # Crear BeautifulSoup directamente con response
-    response = response.content
-    response = str(response, 'utf-8')
-    return BeautifulSoup(response, "html.parser")
+    Returns:
+        str: URL relativa de la revista, o None si no está en esta página
+    """
+    return revisar_pagina_busqueda(soup, titulo, pagina)[0]
 
-def extraer_enlace_optimizado(url_busqueda, titulo, max_paginas=3):
+def revisar_pagina_busqueda(soup, titulo, pagina=1):
     """
-    Extrae la URL de una revista en SCIMAGO, optimizado para búsqueda en múltiples páginas.
+    Recorre todos los resultados de una página de búsqueda.
+    
+    Gana la primera coincidencia exacta (sin distinguir mayúsculas); si no la hay, la primera
+    que coincide tras normalizar acentos y puntuación, y después la primera con la misma clave
+    canónica ("&" como "and", sin "the" inicial).
+    
+    Returns:
+        tuple: (URL relativa o None, número de resultados en la página o None si la página
+            no tiene la estructura esperada)
     """
-    for pagina in range(1, max_paginas+1):
-        # Añadir número de página si no es la primera
-        url_con_pagina = f"{url_busqueda}&page={pagina}" if pagina > 1 else url_busqueda
+    # Buscar el div exterior
+    div_exterior = soup.find('div', class_='journaldescription colblock')
+    if not div_exterior:
+        logging.warning(f"No se encontró div_exterior en página {pagina}")
+        return None, None
         
-        logging.info(f"Buscando '{titulo}' en página {pagina}")
-        soup = get_soup_with_cache(url_con_pagina)
-        
-        if not soup:
+    # Buscar el div interior
+    div_interior = div_exterior.find('div', class_='search_results')
+    if not div_interior:
+        logging.warning(f"No se encontró div_interior en página {pagina}")
+        return None, None
+    
+    titulo_minusculas = titulo.lower()
+    titulo_plegado = leer_csv.plegar_texto(titulo)
+    titulo_canonico = leer_csv.clave_canonica(titulo)
+    normalizada = canonica = None
+    num_resultados = 0
+    for enlace in div_interior.find_all('a'):
+        span = enlace.find('span', class_='jrnlname')
+        if not span:
             continue
+        num_resultados += 1
+        texto = span.text.strip()
+        if texto.lower() == titulo_minusculas:
+            return enlace['href'], num_resultados
+        if normalizada is None and leer_csv.plegar_texto(texto) == titulo_plegado:
+            normalizada = enlace['href']
+        elif canonica is None and leer_csv.clave_canonica(texto) == titulo_canonico:
+            canonica = enlace['href']
+    return normalizada or canonica, num_resultados
+
+def enlace_de_pagina(contenido, titulo, pagina=1):
+    """Analiza una página de búsqueda con revisar_pagina_busqueda (se ejecuta en el pool de procesos)"""
+    soup = analizador_html.analizar(contenido, 'busqueda')
+    with metricas.medir('extraccion', tipo='enlace'):
+        return revisar_pagina_busqueda(soup, titulo, pagina)
+
+def revista_de_pagina(contenido, nombre_revista):
+    """
+    Analiza la página de una revista (se ejecuta en el pool de procesos).
+    
+    Returns:
+        tuple: (True si la extracción se completó, registro de la revista)
+    """
+    datos = {}
+    soup = analizador_html.analizar(contenido, 'revista')
+    with metricas.medir('extraccion', tipo='revista'):
+        resultado = extraer_datos_de_soup(soup, nombre_revista, datos)
+    return resultado is not None, datos[nombre_revista]
+
+def llamar(funcion, *args):
+    """Ejecuta el análisis en el mismo hilo (cuando no hay pool de procesos)"""
+    return funcion(*args)
+
+def ejecutar_pasos(pasos, analizar=llamar):
+    """
+    Lleva hasta el final, en el hilo actual, un generador de pasos (pasos_enlace, pasos_revista...).
+    
+    Cada análisis que pide el generador se ejecuta con analizar(funcion, *args) y su resultado
+    (o su excepción) se le devuelve. El pipeline avanza los mismos generadores por etapas.
+    
+    Returns:
+        Lo que devuelve el generador
+    """
+    try:
+        pedido = next(pasos)
+        while True:
+            try:
+                resultado = analizar(*pedido)
+            except Exception as e:
+                pedido = pasos.throw(e)
+            else:
+                pedido = pasos.send(resultado)
+    except StopIteration as fin:
+        return fin.value
+
+def registrar_paginas_busqueda(paginas):
+    """Suma a las estadísticas las páginas de búsqueda que necesitó un título"""
+    with lock_estadisticas:
+        paginas_por_titulo[paginas] += 1
+
+def resumen_paginas_busqueda():
+    """Escribe en el log cuántas páginas de búsqueda necesitaron los títulos"""
+    if not paginas_por_titulo:
+        return
+    total = sum(paginas_por_titulo.values())
+    detalle = ", ".join(f"{paginas}: {veces}" for paginas, veces in sorted(paginas_por_titulo.items()))
+    media = sum(paginas * veces for paginas, veces in paginas_por_titulo.items()) / total
+    logging.info(f"Páginas de búsqueda por título (páginas: títulos) {detalle}; media {media:.2f}")
+
+def url_pagina_busqueda(url_busqueda, pagina):
+    """Añade el número de página a la URL de búsqueda si no es la primera"""
+    return f"{url_busqueda}&page={pagina}" if pagina > 1 else url_busqueda
+
+def extraer_enlace_optimizado(url_busqueda, titulo, max_paginas=3, analizar=llamar, precarga=None):
+    """
+    Extrae la URL de una revista en SCIMAGO, optimizado para búsqueda en múltiples páginas.
+    
+    analizar(funcion, *args) ejecuta el análisis del HTML; por defecto en el hilo actual.
+    Con precarga (un ThreadPoolExecutor) la página siguiente se pide mientras se revisa la
+    actual; si se encuentra la revista, la precarga se cancela.
+    """
+    return ejecutar_pasos(pasos_enlace(url_busqueda, titulo, max_paginas, precarga), analizar)
+
+def pasos_enlace(url_busqueda, titulo, max_paginas=3, precarga=None):
+    """
+    Pasos de extraer_enlace_optimizado: hace las descargas y pide cada análisis con yield.
+    
+    Cada yield entrega un análisis pendiente (funcion, *args) y recibe su resultado, así el hilo
+    que descarga no espera al análisis (ver ejecutar_pipeline).
+    
+    Returns:
+        str: Enlace de la revista, o None si no se encontró
+    """
+    # Revista ya resuelta (o que se sabe que no está) en una ejecución anterior: no hay búsqueda
+    mapa = resolucion.abrir_mapa()
+    conocida = mapa.consultar(titulo)
+    if conocida is not None:
+        registrar_paginas_busqueda(0)
+        return conocida[1]
+    
+    # Resultado ya extraído en una ejecución anterior: ni descarga ni análisis del HTML
+    guardado = leer_resultado(url_busqueda, 'enlace')
+    if guardado is not None:
+        registrar_paginas_busqueda(0)
+        if guardado[0]:
+            mapa.registrar(guardado[0], titulo)
+        return guardado[0]
+    
+    completo = True
+    revisadas = 0
+    siguiente = None  # (futuro, evento de cancelación) de la página precargada
+    try:
+        for pagina in range(1, max_paginas+1):
+            # Añadir número de página si no es la primera
+            url_con_pagina = url_pagina_busqueda(url_busqueda, pagina)
             
-        # Buscar el div exterior
-        div_exterior = soup.find('div', class_='journaldescription colblock')
-        if not div_exterior:
-            logging.warning(f"No se encontró div_exterior en página {pagina}")
-            continue
+            logging.info(f"Buscando '{titulo}' en página {pagina}")
+            if siguiente is not None:
+                contenido = siguiente[0].result()
+                siguiente = None
+            else:
+                contenido, origen = obtener_respuesta(url_con_pagina)
+                if origen == 'revalidada' and pagina == 1:
+                    # 304: el enlace extraído de esta misma búsqueda se renovó con ella
+                    guardado = resultado_revalidado(url_busqueda, 'enlace')
+                    if guardado is not None and guardado[0]:
+                        mapa.registrar(guardado[0], titulo)
+                        return guardado[0]
             
-        # Buscar el div interior
-        div_interior = div_exterior.find('div', class_='search_results')
-        if not div_interior:
-            logging.warning(f"No se encontró div_interior en página {pagina}")
-            continue
+            if precarga is not None and pagina < max_paginas:
+                cancelado = threading.Event()
+                siguiente = (precarga.submit(obtener_pagina, url_pagina_busqueda(url_busqueda, pagina + 1),
+                                             cancelado=cancelado), cancelado)
             
-        # Buscar enlace
-        enlace = div_interior.find('a')
-        if enlace is not None:
-            span = enlace.find('span', class_='jrnlname')
-            if span:
-                    texto = enlace.find('span', class_='jrnlname').text.strip()
-                    if texto.lower() == titulo.lower():
-                        url_extraida = enlace['href']
-                        return url_extraida
-        
+            if contenido is None:
+                completo = False
+                continue
+            
+            revisadas += 1
+            url_extraida, num_resultados = yield (enlace_de_pagina, contenido, titulo, pagina)
+            if url_extraida:
+                guardar_resultado(url_busqueda, 'enlace', url_extraida)
+                mapa.registrar(url_extraida, titulo)
+                return url_extraida
+            if num_resultados is None:
+                completo = False
+            elif num_resultados == 0:
+                # Página sin resultados: las siguientes también estarán vacías
+                break
+    finally:
+        if siguiente is not None:
+            siguiente[1].set()
+            siguiente[0].cancel()
+        if revisadas:
+            registrar_paginas_busqueda(revisadas)
+    
+    # Recordar que no está solo si se pudieron revisar todas las páginas
+    if completo:
+        guardar_resultado(url_busqueda, 'enlace', None)
+        mapa.registrar_ausente(titulo)
     return None
 
-def extraer_datos_finales(url_final, nombre_revista, datos_revista):
-    """Extrae los datos detallados de una revista"""
+def extraer_datos_finales(url_final, nombre_revista, datos_revista, analizar=llamar):
+    """Extrae los datos detallados de una revista; analizar como en extraer_enlace_optimizado"""
+    return ejecutar_pasos(pasos_revista(url_final, nombre_revista, datos_revista), analizar)
+
+def pasos_revista(url_final, nombre_revista, datos_revista):
+    """Pasos de extraer_datos_finales, como pasos_enlace; devuelve datos_revista o None"""
+    guardado = leer_resultado(url_final, 'revista')
+    if guardado is not None:
+        datos_revista[nombre_revista] = guardado[0]
+        return datos_revista
+    
+    contenido, origen = obtener_respuesta(url_final)
+    if origen == 'revalidada':
+        # 304: el registro extraído de esta misma página se renovó con ella, no hace falta analizarla
+        guardado = resultado_revalidado(url_final, 'revista')
+        if guardado is not None:
+            datos_revista[nombre_revista] = guardado[0]
+            return datos_revista
+    if contenido is None:
+        # Crear la entrada para la revista si no existe
+        if nombre_revista not in datos_revista:
+            datos_revista[nombre_revista] = {}
+        logging.error(f"No se pudo obtener datos para {nombre_revista}")
+        return None
+    
+    completo, registro = yield (revista_de_pagina, contenido, nombre_revista)
+    datos_revista[nombre_revista] = registro
+    if not completo:
+        return None
+    guardar_resultado(url_final, 'revista', registro)
+    return datos_revista
+
+def extraer_datos_de_soup(soup, nombre_revista, datos_revista):
+    """Extrae los datos detallados de una revista a partir del soup de su página"""
     # Crear la entrada para la revista si no existe
     if nombre_revista not in datos_revista:
         datos_revista[nombre_revista] = {}
         
-    soup = get_soup_with_cache(url_final)
-    if not soup:
-        logging.error(f"No se pudo obtener datos para {nombre_revista}")
-        return None
-        
     main_content = soup.find('div', class_='background')
     if main_content:
         segundo_div = main_content.find('div', class_='journalgrid')
@@ -245,144 +551,355 @@ def extraer_datos_finales(url_final, nombre_revista, datos_revista):
     
     return datos_revista
 
-def guardar_resultados_parciales(datos, num):
-    """Guarda los resultados obtenidos hasta el momento"""
-    if datos:
-        # Fusionar con datos existentes si el archivo ya existe
-        archivo_parcial = f"revistas_scimago_parcial_{num}.json"
-        datos_existentes = leer_json_seguro(archivo_parcial) or {}
-        datos_combinados = {**datos_existentes, **datos}
-        leer_csv.guardar_como_json(datos_combinados, archivo_parcial)
-        logging.info(f"Guardado parcial #{num} completado ({len(datos)} revistas)")
-
-def guardar_estado(ultimo_titulo):
-    """Guarda el último título procesado para poder continuar si se interrumpe"""
-    with open("ultimo_procesado.txt", "w", encoding='utf-8') as f:
-        f.write(ultimo_titulo)
-
-def cargar_estado():
-    """Carga el último título procesado"""
-    try:
-        with open("ultimo_procesado.txt", "r", encoding='utf-8') as f:
-            return f.read().strip()
-    except FileNotFoundError:
-        return None
+def registro_incompleto(datos):
+    """Indica si a un registro del catálogo le falta alguno de CAMPOS_REGISTRO"""
+    return any(campo not in datos for campo in CAMPOS_REGISTRO)
 
-def procesar_revista(titulo, url_base, url_busqueda):
-    """Procesa una revista individual en un hilo separado"""
+def procesar_revista(titulo, url_base, url_busqueda, analizar=llamar, precarga=None):
+    """
+    Obtiene (de la caché o de SCIMAGO) y analiza las páginas de una revista en el hilo actual.
+    
+    Devuelve lo mismo que pasos_procesar_revista, que es lo que usa el pipeline.
+    """
+    return ejecutar_pasos(pasos_procesar_revista(titulo, url_base, url_busqueda, precarga), analizar)
+
+def pasos_procesar_revista(titulo, url_base, url_busqueda, precarga=None):
+    """
+    Pasos de una revista: busca su enlace y extrae su registro, pidiendo cada análisis con yield.
+    
+    Returns:
+        tuple: (titulo, 'encontrada' | 'no_encontrada' | 'error' | 'pendiente', datos o mensaje de error,
+            marca de tiempo de la página de la revista o None); 'pendiente' si se agotó el presupuesto
+            antes de terminarla
+    """
     try:
-        # Añadir variación aleatoria al tiempo de espera para evitar patrones detectables
-        time.sleep(random.uniform(0.5, 1.0))
-        
-        # Buscar la revista
-        buscar_palabra = titulo.replace(" ", "+").lower()
-        nueva_palabra = url_busqueda + buscar_palabra
-        
-        # Extraer enlace de la página de búsqueda
-        logging.info(f"Buscando enlace para: {titulo}")
-        palabra_clave = extraer_enlace_optimizado(nueva_palabra, titulo)
-        
-        if palabra_clave is None:
-            with lock:
-                contador['procesados'] += 1
-                contador['no_encontrados'] += 1
-                logging.warning(f"[{contador['procesados']}/{contador['total']}] No se encontró: {titulo}")
-            return None
-        
-        # Si encontramos la revista, extraer datos detallados
-        busqueda_maxima = url_base + palabra_clave
-        datos = {}  # Crear un diccionario nuevo para cada revista
-        logging.info(f"Extrayendo datos de {titulo} en {busqueda_maxima}")
-        extraer_datos_finales(busqueda_maxima, titulo, datos)
-        
-        # Actualizar resultados y contador bajo protección de lock
-        with lock:
-            contador['procesados'] += 1
-            contador['encontrados'] += 1
-            # Fusionar los datos en el diccionario global
-            resultados.update(datos)
-            logging.info(f"[{contador['procesados']}/{contador['total']}] Procesado: {titulo}")
+        with metricas.medir('procesar_revista'):
+            # Buscar la revista
+            buscar_palabra = titulo.replace(" ", "+").lower()
+            nueva_palabra = url_busqueda + buscar_palabra
             
-            # Guardar estado actual
-            guardar_estado(titulo)
+            # Extraer enlace de la página de búsqueda
+            logging.info(f"Buscando enlace para: {titulo}")
+            with metricas.medir('extraer_enlace_optimizado'):
+                palabra_clave = yield from pasos_enlace(nueva_palabra, titulo, precarga=precarga)
+            if palabra_clave is None:
+                return titulo, 'no_encontrada', None, None
             
-            # Guardar resultados parciales cada 200 revistas
-            if contador['procesados'] % 200 == 0:
-                guardar_resultados_parciales(resultados, contador['procesados'])
-                
-        return datos
+            # Si encontramos la revista, extraer datos detallados
+            busqueda_maxima = url_base + palabra_clave
+            datos = {}  # Crear un diccionario nuevo para cada revista
+            logging.info(f"Extrayendo datos de {titulo} en {busqueda_maxima}")
+            with metricas.medir('extraer_datos_finales'):
+                yield from pasos_revista(busqueda_maxima, titulo, datos)
+            # Los ISSN de la revista también llevan directo a su página
+            issn = resolucion.separar_issn(datos[titulo].get("ISSN"))
+            if issn:
+                resolucion.abrir_mapa().registrar(palabra_clave, issn=issn)
+            # El sello de la revista lleva la hora en que se obtuvo su página, aunque saliera de la caché
+            return titulo, 'encontrada', datos, pagina_obtenida(busqueda_maxima)
+    except actualizacion.PresupuestoAgotado:
+        return titulo, 'pendiente', None, None
     except Exception as e:
-        with lock:
-            contador['procesados'] += 1
-            logging.error(f"[{contador['procesados']}/{contador['total']}] Error procesando {titulo}: {e}")
-        return None
+        return titulo, 'error', e, None
 
-if __name__ == "__main__":
-    url = "https://www.scimagojr.com/"
-    url_busqueda = "https://www.scimagojr.com/journalsearch.php?q=+"
+def registrar_resultado(bitacora, titulo, estado, datos, obtenido=None, alias=()):
+    """
+    Etapa de escritura: anota el resultado de una revista en la bitácora (solo la llama el hilo escritor).
+    
+    El mismo resultado se anota para cada variante del título (alias), que no se buscaron.
+    Una revista pendiente (presupuesto agotado a mitad) no se anota: se retoma en la siguiente ejecución.
+    """
+    if estado == 'pendiente':
+        logging.info(f"Presupuesto agotado: {titulo} queda para la siguiente ejecución")
+        return
+    contador['procesados'] += 1
+    titulos = (titulo, *alias)
+    if estado == 'no_encontrada':
+        contador['no_encontrados'] += len(titulos)
+        for nombre in titulos:
+            bitacora.agregar(nombre, estado)
+        logging.warning(f"[{contador['procesados']}/{contador['total']}] No se encontró: {titulo}")
+        return
+    if estado == 'error':
+        for nombre in titulos:
+            bitacora.agregar(nombre, estado, datos)
+        logging.error(f"[{contador['procesados']}/{contador['total']}] Error procesando {titulo}: {datos}")
+        return
+    
+    contador['encontrados'] += len(titulos)
+    # Una línea por revista: el costo de guardar el avance no crece con el número de revistas
+    for nombre in titulos:
+        bitacora.agregar(nombre, estado, datos[titulo], obtenido)
+    logging.info(f"[{contador['procesados']}/{contador['total']}] Procesado: {titulo}")
+
+def agrupar_pendientes(titulos):
+    """
+    Deja una búsqueda por revista: las variantes de un título (misma leer_csv.clave_canonica)
+    reciben el resultado de la primera.
+    
+    Se busca con una variante sin "&" si la hay (en la URL de búsqueda "&" corta la consulta).
+    
+    Returns:
+        tuple: (títulos a buscar en el orden original, {titulo buscado: [variantes]})
+    """
+    alias = {}
+    for variantes in leer_csv.agrupar_variantes(titulos).values():
+        elegido = min(variantes, key=lambda titulo: '&' in titulo)
+        alias[elegido] = [titulo for titulo in variantes if titulo != elegido]
+    return list(alias), {titulo: otros for titulo, otros in alias.items() if otros}
+
+def resumen_variantes(alias):
+    """Escribe en el log cuántas búsquedas y peticiones se evitaron al buscar una vez por revista"""
+    variantes = sum(len(otros) for otros in alias.values())
+    if not variantes or not contador['procesados']:
+        return
+    media = metricas.contador('http_respuestas') / contador['procesados']
+    logging.info(f"Variantes de título: {variantes} títulos usaron el resultado de otra variante; se evitaron "
+                 f"{variantes} búsquedas y unas {variantes * media:.0f} peticiones ({media:.2f} por revista en esta ejecución)")
+
+def ejecutar_pipeline(titulos, url_base, url_busqueda, bitacora, hilos_descarga=5, procesos_analisis=None, tamano_cola=100,
+                      precargar=False, escritor_metricas=None, presupuesto=None, alias=None):
+    """
+    Procesa las revistas en tres etapas conectadas por colas, sin que una etapa espere a la siguiente.
+    
+    - Hilos de descarga: leen de la caché o descargan las páginas (esperan red o disco, no CPU).
+      Cada revista es un generador (pasos_procesar_revista) que el hilo avanza hasta que pide un
+      análisis; la página queda en cola_paginas y el hilo sigue con otra descarga.
+    - Etapa de análisis: un hilo envía cada página de cola_paginas al pool de procesos. Al
+      terminar el análisis, la revista vuelve a la cola de descargas con el resultado (la
+      búsqueda puede necesitar otra página, o sigue la página de la revista) o, si ya terminó,
+      pasa a la cola de resultados.
+    - Un hilo escritor: anota cada resultado en la bitácora de avance.
+    
+    A lo sumo tamano_cola revistas están en curso a la vez, lo que acota todas las colas.
+    Si el escritor falla, no se toman más revistas, las que están en curso se descartan sin
+    dejar ningún hilo bloqueado y la excepción se relanza aquí.
+    
+    Args:
+        titulos (list): Títulos pendientes
+        url_base (str): URL base de SCIMAGO
+        url_busqueda (str): URL de búsqueda de SCIMAGO
+        bitacora (Bitacora): Bitácora donde el escritor anota cada revista terminada
+        hilos_descarga (int): Hilos de la etapa de descarga
+        procesos_analisis (int): Procesos de análisis; None para uno por núcleo, 0 para analizar en los hilos de descarga
+        tamano_cola (int): Revistas en curso a la vez y capacidad de la cola de páginas
+        precargar (bool): Pedir la siguiente página de búsqueda mientras se revisa la actual
+        escritor_metricas (EscritorPeriodico): Se inicia cuando ya existe el pool y se detiene al terminar
+        presupuesto (actualizacion.Presupuesto): Cada petición reserva una unidad; al agotarse no se
+            hacen más peticiones y las revistas sin terminar quedan para la siguiente ejecución
+        alias (dict): {titulo: [variantes]} que reciben el mismo resultado (agrupar_pendientes)
+    """
+    global presupuesto_activo
+    presupuesto_activo = presupuesto
+    alias = alias or {}
+    en_curso = threading.BoundedSemaphore(tamano_cola)
+    # Sin límite propio: nunca tienen más elementos que revistas en curso, y así el callback del
+    # pool, que devuelve revistas a la cola de descargas, no se bloquea nunca. Las revistas que
+    # vuelven de un análisis pasan antes que las nuevas: se terminan las empezadas (y, con
+    # presupuesto, no se gasta en empezar revistas que no se podrán terminar)
+    cola_descargas = queue.PriorityQueue()
+    orden = itertools.count()
+    
+    def encolar_descarga(tarea, prioridad=CONTINUACION):
+        cola_descargas.put((prioridad, next(orden), tarea))
+    cola_resultados = queue.Queue()
+    cola_paginas = queue.Queue(tamano_cola)
+    pool = ProcessPoolExecutor(procesos_analisis, initializer=reiniciar) if procesos_analisis != 0 else None
+    if pool is not None:
+        # Con fork los procesos se crean todos en el primer envío: hacerlo antes de arrancar los hilos
+        pool.submit(llamar, int).result()
+    if escritor_metricas is not None:
+        escritor_metricas.iniciar()
+    precarga = ThreadPoolExecutor(hilos_descarga) if precargar else None
+    # Si el escritor falla, las demás etapas dejan de trabajar y las revistas en curso se descartan
+    cancelado = threading.Event()
+    errores_escritor = []
+    
+    def descargador():
+        while (tarea := cola_descargas.get()[2]) is not None:
+            titulo, pasos, resultado, error = tarea
+            nueva = pasos is None
+            if nueva:
+                # Las revistas que no alcanzan el presupuesto quedan para la siguiente ejecución
+                if cancelado.is_set() or (presupuesto is not None and presupuesto.agotado()):
+                    en_curso.release()
+                    continue
+                if pool is None:
+                    cola_resultados.put(procesar_revista(titulo, url_base, url_busqueda, llamar, precarga))
+                    continue
+                pasos = pasos_procesar_revista(titulo, url_base, url_busqueda, precarga)
+            elif cancelado.is_set():
+                pasos.close()
+                en_curso.release()
+                continue
+            try:
+                if nueva:
+                    pedido = next(pasos)
+                elif error is not None:
+                    pedido = pasos.throw(error)
+                else:
+                    pedido = pasos.send(resultado)
+            except StopIteration as fin:
+                cola_resultados.put(fin.value)
+                continue
+            except Exception as e:
+                cola_resultados.put((titulo, 'error', e, None))
+                continue
+            cola_paginas.put((titulo, pasos, pedido))
+    
+    def analisis_terminado(titulo, pasos, funcion, inicio, futuro):
+        # Corre en el hilo del pool que recoge los resultados: solo encola, nunca espera
+        metricas.observar('analisis_pool', time.perf_counter() - inicio, funcion=funcion.__name__)
+        try:
+            resultado, parcial = futuro.result()
+        except Exception as e:
+            encolar_descarga((titulo, pasos, None, e))
+            return
+        metricas.combinar(parcial)
+        encolar_descarga((titulo, pasos, resultado, None))
+    
+    def analizador():
+        while (pagina := cola_paginas.get()) is not None:
+            titulo, pasos, (funcion, *args) = pagina
+            try:
+                futuro = pool.submit(llamar_con_metricas, funcion, *args)
+            except Exception as e:
+                encolar_descarga((titulo, pasos, None, e))
+                continue
+            futuro.add_done_callback(partial(analisis_terminado, titulo, pasos, funcion, time.perf_counter()))
+    
+    def escritor():
+        while (resultado := cola_resultados.get()) is not None:
+            try:
+                if not cancelado.is_set():
+                    registrar_resultado(bitacora, *resultado, alias=alias.get(resultado[0], ()))
+            except BaseException as e:
+                # Se siguen recibiendo resultados (sin anotarlos) hasta que terminen las revistas en curso
+                errores_escritor.append(e)
+                cancelado.set()
+            finally:
+                en_curso.release()
+    
+    hilos = [threading.Thread(target=descargador, daemon=True) for _ in range(hilos_descarga)]
+    hilo_analizador = threading.Thread(target=analizador, daemon=True)
+    hilo_escritor = threading.Thread(target=escritor, daemon=True)
+    try:
+        for hilo in hilos + [hilo_analizador, hilo_escritor]:
+            hilo.start()
+        # acquire se bloquea con tamano_cola revistas en curso: entran al ritmo que terminan otras
+        for titulo in titulos:
+            en_curso.acquire()
+            if cancelado.is_set():
+                en_curso.release()
+                break
+            encolar_descarga((titulo, None, None, None), REVISTA_NUEVA)
+        # Esperar a que terminen todas las revistas en curso
+        for _ in range(tamano_cola):
+            en_curso.acquire()
+        for _ in hilos:
+            encolar_descarga(None, FIN)
+        cola_paginas.put(None)
+        cola_resultados.put(None)
+        hilo_escritor.join()
+        if errores_escritor:
+            logging.error(f"El hilo escritor falló, se detuvo el procesamiento: {errores_escritor[0]!r}")
+            raise errores_escritor[0]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if precarga is not None:
+            precarga.shutdown()
+        if escritor_metricas is not None:
+            escritor_metricas.detener()
+        presupuesto_activo = None
+
+def main():
+    parser = argparse.ArgumentParser(description="Web scrapper de SCIMAGO")
+    parser.add_argument("--hilos-descarga", type=int, default=5, help="Hilos que descargan o leen de la caché")
+    parser.add_argument("--procesos-analisis", type=int, default=os.cpu_count(),
+                        help="Procesos que analizan el HTML (0 para analizar en los hilos de descarga)")
+    parser.add_argument("--tamano-cola", type=int, default=100, help="Revistas en curso a la vez (y capacidad de la cola de páginas por analizar)")
+    parser.add_argument("--precargar-busqueda", action="store_true",
+                        help="Pedir la siguiente página de búsqueda mientras se revisa la actual")
+    parser.add_argument("--url-base", default="https://www.scimagojr.com/",
+                        help="URL base del sitio (permite usar un servidor local de prueba)")
+    parser.add_argument("--salida", default=bitacora.ARCHIVO_CATALOGO,
+                        help=f"Catálogo de SCIMAGO: JSON o catálogo mapeado ({catalogo_mapeado.EXTENSION})")
+    parser.add_argument("--metricas", default=ARCHIVO_METRICAS,
+                        help="Ruta base de los archivos de métricas (se escriben RUTA.json y RUTA.prom)")
+    parser.add_argument("--intervalo-metricas", type=float, default=10.0,
+                        help="Segundos entre escrituras de las métricas")
+    parser.add_argument("--completar", action="store_true",
+                        help="Volver a buscar las revistas del catálogo a las que les falta algún campo "
+                             "(p. ej. las importadas con importar_scimago.py)")
+    parser.add_argument("--refrescar", action="store_true",
+                        help="Volver a procesar también las revistas del catálogo (las páginas caducadas "
+                             "se revalidan con peticiones condicionales)")
+    parser.add_argument("--frescura", type=float, default=cache_http.TTL_CACHE / 86400,
+                        help="Días que una página guardada se usa sin revalidarla")
+    parser.add_argument("--presupuesto-peticiones", type=int,
+                        help="Peticiones HTTP máximas de la ejecución (las revistas restantes quedan para la siguiente)")
+    parser.add_argument("--presupuesto-minutos", type=float, help="Duración máxima de la ejecución")
+    args = parser.parse_args()
+    cache_http.abrir_cache().ttl = args.frescura * 86400
+    
+    url = args.url_base
+    url_busqueda = url + "journalsearch.php?q=+"
     
     # Cargar datos existentes
     revistas = leer_json_seguro("revistas.json")  
-    catalogo = leer_json_seguro("revistas_scimago_final.json") or {}
+    catalogo = bitacora.cargar_catalogo(args.salida)
     
     # Verificar que se cargaron correctamente
     if not revistas:
         logging.error("No se pudo cargar el archivo de revistas, terminando ejecución")
         exit(1)
     
-    # Cargar el último título procesado si existe
-    ultimo_procesado = cargar_estado()
-    continuar_desde = False if ultimo_procesado else True
-    
-    # Filtrar revistas que ya están en el catálogo
-    revistas_pendientes = []
-    for titulo in revistas:
-        # Si hay último procesado y aún no lo hemos encontrado, seguir buscando
-        if ultimo_procesado and not continuar_desde:
-            if titulo == ultimo_procesado:
-                continuar_desde = True
-            continue
-        
-        # Si la revista ya está en el catálogo, saltarla
-        if titulo in catalogo:
-            logging.info(f"La revista {titulo} ya está en el JSON, saltando")
-            continue
-            
-        revistas_pendientes.append(titulo)
+    # Títulos que ya terminaron en una ejecución interrumpida
+    terminados = bitacora.titulos_terminados()
+    if terminados:
+        logging.info(f"Continuando: {len(terminados)} revistas ya están en la bitácora")
+    
+    # Títulos nuevos primero; con --refrescar, después las revistas del catálogo de la más antigua a la más reciente
+    ruta_sellos = actualizacion.ruta_sellos(args.salida)
+    sellos = actualizacion.cargar_sellos(ruta_sellos)
+    revistas_pendientes = actualizacion.planificar(revistas, catalogo, sellos, terminados, args.refrescar,
+                                                   registro_incompleto if args.completar else None)
+    logging.info(f"Plan: {actualizacion.resumen_plan(revistas_pendientes, catalogo, sellos)}")
+    # Una búsqueda por revista aunque aparezca con varias variantes del título
+    revistas_pendientes, alias = agrupar_pendientes(revistas_pendientes)
     
     # Inicializar contador
     contador['total'] = len(revistas_pendientes)
-    logging.info(f"Total de revistas a procesar: {contador['total']}")
+    logging.info(f"Total de revistas a procesar: {contador['total']}"
+                 + (f" (más {sum(map(len, alias.values()))} variantes de título)" if alias else ""))
     
-    # Si no hay revistas para procesar, terminar
     if contador['total'] == 0:
         logging.info("No hay revistas nuevas para procesar")
-        exit(0)
-    
-    # Número de trabajadores concurrentes (ajustar según necesidades)
-    num_trabajadores = 5  # Un buen punto de partida
-    
-    # Ejecutar con ThreadPoolExecutor
-    with ThreadPoolExecutor(max_workers=num_trabajadores) as executor:
-        # Crear futuros
-        futuros = {executor.submit(procesar_revista, titulo, url, url_busqueda): titulo 
-                   for titulo in revistas_pendientes}
-        
-        # Procesar resultados a medida que se completan
-        for futuro in as_completed(futuros):
-            titulo = futuros[futuro]
-            try:
-                # El resultado ya se guardó en el diccionario compartido
-                futuro.result()
-            except Exception as e:
-                logging.error(f"Error no capturado procesando {titulo}: {e}")
-    
-    # Guardar resultados finales
-    if resultados:
-        # Combinar con el catálogo existente
-        catalogo_actualizado = {**catalogo, **resultados}
-        leer_csv.guardar_como_json(catalogo_actualizado, "revistas_scimago_final.json")
+    else:
+        presupuesto = None
+        if args.presupuesto_peticiones is not None or args.presupuesto_minutos is not None:
+            presupuesto = actualizacion.Presupuesto(args.presupuesto_peticiones,
+                                                    args.presupuesto_minutos and args.presupuesto_minutos * 60)
+        with bitacora.Bitacora() as registro:
+            ejecutar_pipeline(revistas_pendientes, url, url_busqueda, registro, args.hilos_descarga,
+                              args.procesos_analisis, args.tamano_cola, args.precargar_busqueda,
+                              EscritorPeriodico(metricas, args.metricas, args.intervalo_metricas), presupuesto, alias)
+        if presupuesto is not None and presupuesto.agotado():
+            logging.info(f"Presupuesto agotado ({presupuesto.usadas()} peticiones): "
+                         f"{contador['total'] - contador['procesados']} revistas quedan para la siguiente ejecución")
+        resumen_paginas_busqueda()
+        resumen_variantes(alias)
+        logging.info(f"Métricas por etapa ({args.metricas}.json, {args.metricas}.prom):\n{metricas.tabla_resumen()}")
         logging.info(f"Proceso completado. Revistas encontradas: {contador['encontrados']}")
         logging.info(f"Revistas no encontradas: {contador['no_encontrados']}")
+    
+    # Incorporar la bitácora al catálogo (también la de una ejecución anterior sin compactar)
+    incorporadas = bitacora.compactar(salida=args.salida, catalogo=catalogo, sellos=ruta_sellos)
+    if incorporadas:
+        logging.info(f"{incorporadas} revistas incorporadas a {args.salida}")
     else:
-        logging.info("No se encontraron revistas nuevas")
\ No newline at end of file
+        logging.info("No se encontraron revistas nuevas")
+
+if __name__ == "__main__":
+    main()